@@ -0,0 +1,141 @@
+# DocumentIntelligence/action_log.py
+"""
+Buffered UserActionHistory logging.
+
+log_action() queues an unsaved UserActionHistory row and returns; the
+background thread of HistoryWriter collects rows and saves each batch with
+one bulk_create. Old rows are removed in bounded batches by
+prune_actions() (see the prune_action_history management command).
+
+Accounts live in the raw-SQL users table, but UserActionHistory.owner is a
+Django user: owner_for_email() maps a session email to the Django user with
+that email address. Sessions without one are not logged.
+"""
+
+import atexit
+import datetime
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import InterfaceError, OperationalError, close_old_connections
+from django.utils import timezone
+
+from .history_writer import HistoryWriter
+from .models import UserActionHistory
+
+
+class ActionLogger(HistoryWriter):
+    """HistoryWriter whose batches are UserActionHistory rows saved with bulk_create."""
+
+    thread_name = "action-logger"
+    transient_errors = (OperationalError, InterfaceError)
+
+    def log(self, owner, action, details=None):
+        """
+        Queue one action.
+
+        Args:
+            owner: User instance or user id
+            action: Short action name, e.g. "ocr" or "convert:pdf"
+            details: JSON-serialisable dict
+        """
+        owner_id = getattr(owner, "pk", owner)
+        # created_at is the time of the action, not of the flush
+        row = UserActionHistory(owner_id=owner_id, action=action, details=details, created_at=timezone.now())
+        return self._enqueue(row)
+
+    def _write(self, items):
+        # The background thread has no request cycle to drop a stale or broken connection
+        background = threading.current_thread() is self._thread
+        if background:
+            close_old_connections()
+        try:
+            UserActionHistory.objects.bulk_create(items, batch_size=self.batch_size)
+        finally:
+            if background:
+                close_old_connections()
+
+
+# =====================================================================
+# MODULE-LEVEL LOGGER
+# =====================================================================
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_logger():
+    """The process-wide logger, configured from settings.ACTION_LOG on first use."""
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                config = settings.ACTION_LOG
+                _logger = ActionLogger(
+                    batch_size=config["BATCH_SIZE"],
+                    flush_interval=config["FLUSH_INTERVAL"],
+                    max_retries=config["MAX_RETRIES"],
+                    synchronous=config["SYNCHRONOUS"],
+                )
+                atexit.register(_logger.close)
+    return _logger
+
+
+def set_logger(logger):
+    """Replace the process-wide logger. Returns the old one."""
+    global _logger
+    with _logger_lock:
+        previous, _logger = _logger, logger
+    return previous
+
+
+def owner_for_email(email):
+    """Id of the Django user that owns the actions of a session email (None if there is none)."""
+    user = get_user_model().objects.filter(email__iexact=email).order_by("pk").first()
+    if user is None:
+        print(f"[INFO] No user with email {email}, actions not logged")
+        return None
+    return user.pk
+
+
+def log_action(owner, action, details=None):
+    try:
+        return get_logger().log(owner, action, details)
+    except Exception as e:
+        print(f"[ERROR] log_action failed: {e}")
+        return False
+
+
+# =====================================================================
+# QUERIES AND RETENTION
+# =====================================================================
+
+def recent_actions(owner, limit=20):
+    """Latest actions of one user, newest first (served by the (owner, -created_at) index)."""
+    return list(UserActionHistory.objects.filter(owner=owner).order_by("-created_at")[:limit])
+
+
+def prune_actions(days=None, batch_size=5000):
+    """
+    Delete actions older than `days` (default settings.ACTION_LOG["RETENTION_DAYS"]).
+
+    Rows are deleted in batches of primary keys so no single statement holds
+    locks on a large part of the table.
+
+    Returns:
+        Number of rows deleted
+    """
+    days = settings.ACTION_LOG["RETENTION_DAYS"] if days is None else days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    expired = UserActionHistory.objects.filter(created_at__lt=cutoff).order_by()
+
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += UserActionHistory.objects.filter(pk__in=ids).delete()[0]
+
+    print(f"[SUCCESS] Pruned {deleted} actions older than {days} days")
+    return deleted
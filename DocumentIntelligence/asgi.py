@@ -3,6 +3,12 @@ ASGI config for DocumentIntelligence project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The upload views (OCR, classification, redaction, conversion) are async and
+hand their blocking work to the pools in executors.py, so one worker serves
+many uploads at once:
+
+    gunicorn DocumentIntelligence.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
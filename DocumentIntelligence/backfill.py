@@ -0,0 +1,240 @@
+# DocumentIntelligence/backfill.py
+"""
+Resumable reclassification of the documents table.
+
+Rows keep the document_type, confidence and meta (extracted fields) worked
+out when the file was uploaded, so improvements to classify_document_hybrid
+or the extractors never reach old history. The backfill runs classification
+and extraction again on the stored extracted_text (no OCR):
+
+- rows are streamed in id order through a server-side cursor (a named
+  cursor on Postgres), so the table is never loaded into memory;
+- batches are reclassified on a process pool;
+- changed rows are updated one batch per transaction, together with the
+  document_stats type counters and the checkpoint (the last id done) in
+  backfill_checkpoints, so an interrupted run resumes after the last
+  committed batch and never applies a batch twice.
+
+Only classification rows carry extracted fields in meta; OCR rows get a
+new type and confidence. The entity index is not touched.
+"""
+
+import json
+import time
+from collections import Counter, deque
+
+from . import db
+from .extraction import classify_text, extract_document_fields
+from .stats import BY_TYPE, increment_stats
+
+# Rows without text (conversions and the like) have nothing to reclassify
+SELECT_SQL = """
+    SELECT id, email, operation, document_type, confidence, meta, extracted_text
+    FROM documents
+    WHERE id > %s AND id <= %s AND extracted_text IS NOT NULL AND extracted_text <> ''
+    ORDER BY id
+"""
+
+UPDATE_SQL = "UPDATE documents SET document_type=%s, confidence=%s, meta=%s WHERE id=%s"
+
+CHECKPOINT_SQL = """
+    INSERT INTO backfill_checkpoints (name, last_id, rows_updated, updated_at)
+    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+    ON CONFLICT (name) DO UPDATE SET
+        last_id = excluded.last_id,
+        rows_updated = backfill_checkpoints.rows_updated + excluded.rows_updated,
+        updated_at = excluded.updated_at
+"""
+
+# Counters a reclassification emptied would otherwise show up as "0 documents"
+DELETE_EMPTY_COUNTER_SQL = "DELETE FROM document_stats WHERE email=%s AND dimension=%s AND key=%s AND count <= 0"
+
+
+# =====================================================================
+# CHECKPOINT
+# =====================================================================
+
+def get_checkpoint(name):
+    """(last id done, rows updated so far) for a backfill, or (0, 0) if it never ran."""
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT last_id, rows_updated FROM backfill_checkpoints WHERE name=%s", (name,))
+        row = cur.fetchone()
+    return tuple(row) if row else (0, 0)
+
+
+def reset_checkpoint(name):
+    """Forget a backfill's position so the next run starts from the first row."""
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM backfill_checkpoints WHERE name=%s", (name,))
+        con.commit()
+
+
+# =====================================================================
+# READ
+# =====================================================================
+
+def stream_rows(after_id, until_id, batch_size):
+    """
+    Rows with text after `after_id` up to `until_id`, in id order.
+
+    Yields:
+        Lists of at most `batch_size` rows (id, email, operation,
+        document_type, confidence, meta, extracted_text)
+    """
+    with db.connection() as con:
+        if db.get_pool().vendor == "postgresql":
+            # Named cursor: the server keeps the result set and sends batch_size rows at a time
+            cur = con.cursor(name="documents_backfill")
+            cur.itersize = batch_size
+            cur.execute(SELECT_SQL, (after_id, until_id))
+            while rows := cur.fetchmany(batch_size):
+                yield rows
+            cur.close()
+            return
+
+        # SQLite has no server-side cursors, and a read left open across the
+        # batch writes would lock the table: page by id instead
+        cur = con.cursor()
+        while True:
+            cur.execute(SELECT_SQL + " LIMIT %s", (after_id, until_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1][0]
+
+
+# =====================================================================
+# POOL TASK
+# =====================================================================
+
+def reclassify(rows):
+    """
+    Pool task: classify and extract fields for a batch of (id, operation, text).
+
+    Returns:
+        List of (id, document_type, confidence, extracted fields or None)
+    """
+    results = []
+    for document_id, operation, text in rows:
+        doc_type, confidence = classify_text(text)
+        fields = None
+        if operation == "classification":
+            # Masked display fields only, as the upload stored them
+            fields = extract_document_fields(doc_type, text)[0] or None
+        results.append((document_id, doc_type, confidence, fields))
+    return results
+
+
+# =====================================================================
+# WRITE
+# =====================================================================
+
+def _decode_meta(meta):
+    # psycopg2 already decodes JSONB columns
+    if meta is None or isinstance(meta, dict):
+        return meta
+    try:
+        return json.loads(meta)
+    except ValueError:
+        return None
+
+
+def write_batch(name, rows, results, dry_run=False):
+    """
+    Update the rows whose classification changed and move the checkpoint, in one transaction.
+
+    Returns:
+        Number of rows updated (that would be updated, with dry_run)
+    """
+    updates = []
+    counters = Counter()
+    for row, (document_id, doc_type, confidence, fields) in zip(rows, results):
+        _, email, operation, old_type, old_confidence, old_meta, _ = row
+        old_meta = _decode_meta(old_meta)
+        meta = fields if operation == "classification" else old_meta
+        if (doc_type, confidence, meta) == (old_type, old_confidence, old_meta):
+            continue
+        updates.append((doc_type, confidence, json.dumps(meta) if meta is not None else None, document_id))
+        if doc_type != old_type:
+            counters[(email, BY_TYPE, old_type or "Other")] -= 1
+            counters[(email, BY_TYPE, doc_type or "Other")] += 1
+
+    if dry_run:
+        return len(updates)
+
+    counters = {key: count for key, count in counters.items() if count}
+    with db.connection() as con:
+        cur = con.cursor()
+        if updates:
+            cur.executemany(UPDATE_SQL, updates)
+        if counters:
+            increment_stats(cur, counters)
+            cur.executemany(DELETE_EMPTY_COUNTER_SQL, sorted(key for key, count in counters.items() if count < 0))
+        cur.execute(CHECKPOINT_SQL, (name, rows[-1][0], len(updates)))
+        con.commit()
+    return len(updates)
+
+
+# =====================================================================
+# BACKFILL RUN
+# =====================================================================
+
+def run_backfill(executor, name="classification", batch_size=500, max_in_flight=None, dry_run=False):
+    """
+    Reclassify every row with text after the checkpoint of `name`.
+
+    Rows added after the run started are left alone; the current code
+    classified them already.
+
+    Args:
+        executor: concurrent.futures executor running reclassify()
+        name: Checkpoint name; use a new one to start a fresh pass
+        batch_size: Rows per read, pool task and transaction
+        max_in_flight: Batches submitted ahead of the writes (default: twice the pool size)
+        dry_run: Count the changes without writing them or the checkpoint
+
+    Returns:
+        Dict with rows scanned, rows updated, batches and rows_per_second
+    """
+    after_id, _ = get_checkpoint(name)
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT MAX(id) FROM documents")
+        until_id = cur.fetchone()[0] or 0
+    max_in_flight = max_in_flight or 2 * (getattr(executor, "_max_workers", None) or 1)
+    print(f"[INFO] Backfill {name}: ids {after_id + 1}..{until_id}{' (dry run)' if dry_run else ''}")
+
+    counts = {"scanned": 0, "updated": 0, "batches": 0}
+    started = time.monotonic()
+    in_flight = deque()
+
+    def write_oldest():
+        # Batches are written in id order so the checkpoint only moves past finished rows
+        rows, future = in_flight.popleft()
+        counts["updated"] += write_batch(name, rows, future.result(), dry_run)
+        counts["scanned"] += len(rows)
+        counts["batches"] += 1
+        if counts["batches"] % 20 == 0:
+            print(f"[INFO] Backfill {name}: {counts['scanned']} rows scanned, {counts['updated']} updated, "
+                  f"at id {rows[-1][0]}")
+
+    try:
+        for rows in stream_rows(after_id, until_id, batch_size):
+            task = [(row[0], row[2], row[6]) for row in rows]
+            in_flight.append((rows, executor.submit(reclassify, task)))
+            if len(in_flight) >= max_in_flight:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+    finally:
+        # Interrupted: batches not written yet are read again on the next run
+        for _, future in in_flight:
+            future.cancel()
+
+    elapsed = time.monotonic() - started
+    counts["rows_per_second"] = round(counts["scanned"] / elapsed, 1) if elapsed else None
+    print(f"[SUCCESS] Backfill {name} finished: {counts}")
+    return counts
@@ -0,0 +1,242 @@
+# DocumentIntelligence/batch.py
+"""
+Offline batch processing for `manage.py process_documents <dir>`.
+
+Walks a directory tree of scans and PDFs and runs OCR, classification,
+field extraction and optionally redaction on a process pool, outside any
+request. Each finished file is one line of a JSONL file. That file is also
+the checkpoint: a rerun skips every file already in it, so an interrupted
+backfill resumes where it stopped.
+
+By default runs get a zero latency budget: only the mandatory stages run,
+summaries are extractive and no PDF report is built. Nothing is written to
+the database or the upload history.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from .bulk import DOCUMENT_EXTENSIONS
+from .pipeline import LatencyBudget
+from .processing import classify_file
+from file_conversions.cancellation import CancellationToken
+from file_conversions.conversions import rasterize_pdf
+
+BATCH_EXTENSIONS = DOCUMENT_EXTENSIONS | {".pdf"}
+
+# Resolution PDF pages are rendered at for OCR
+PDF_DPI = 300
+
+# Worker crashes a file may be caught up in before it is recorded as failed
+MAX_CRASHES = 2
+
+
+def find_documents(root, exclude=None):
+    """
+    Relative paths of the scans and PDFs under `root`, in a stable order.
+
+    Hidden files and folders are skipped, and so is `exclude` (e.g. the
+    redaction output folder when it lies inside `root`).
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs
+                         if not d.startswith(".") and os.path.abspath(os.path.join(folder, d)) != exclude)
+        for name in sorted(files):
+            if not name.startswith(".") and os.path.splitext(name)[1].lower() in BATCH_EXTENSIONS:
+                yield os.path.relpath(os.path.join(folder, name), root)
+
+
+# =====================================================================
+# CHECKPOINT
+# =====================================================================
+
+def load_checkpoint(output_path, retry_errors=False):
+    """
+    Files already in the results file.
+
+    A line cut short by a crash is removed so the next record starts on a
+    line of its own.
+
+    Args:
+        output_path: JSONL results file (may not exist yet)
+        retry_errors: Leave files that failed out, so they are processed again
+
+    Returns:
+        Set of relative paths to skip
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            print(f"[WARNING] Dropping an incomplete last line of {output_path}")
+            f.truncate(complete)
+
+    for line in data[:complete].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("status") == "ok" or not retry_errors:
+            done.add(record["path"])
+    return done
+
+
+# =====================================================================
+# POOL TASK
+# =====================================================================
+
+def _pages(file_path):
+    """(page number, decoded BGR image) for an image file or each page of a PDF."""
+    if file_path.lower().endswith(".pdf"):
+        for page, _, image in rasterize_pdf(file_path, PDF_DPI):
+            yield page, cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+        return
+    image = cv2.imread(file_path)
+    if image is None:
+        raise ValueError("OpenCV cannot read the image")
+    yield 1, image
+
+
+def process_document(root, relative_path, timeout, redact_dir=None, summarize=False):
+    """
+    Pool task: OCR and classify one file (every page of a PDF).
+
+    Args:
+        root: Directory being processed
+        relative_path: File below `root`
+        timeout: Hard limit per page, in seconds
+        redact_dir: Folder for redacted images (None: no redaction)
+        summarize: Also run the abstractive summary and the PDF report
+
+    Returns:
+        The JSONL record for the file
+    """
+    started = time.monotonic()
+    file_path = os.path.join(root, relative_path)
+    stem = os.path.splitext(relative_path)[0]
+    pages = []
+    for page, image in _pages(file_path):
+        # With an image in hand the path only names the redaction outputs
+        output_name = file_path
+        if redact_dir:
+            suffix = f"_page_{page}" if file_path.lower().endswith(".pdf") else ""
+            output_name = os.path.join(redact_dir, f"{stem}{suffix}.jpg")
+            os.makedirs(os.path.dirname(output_name), exist_ok=True)
+
+        budget = LatencyBudget(None if summarize else 0, CancellationToken.with_timeout(timeout))
+        result = classify_file(output_name, budget, image=image, redact=bool(redact_dir))
+        pages.append({
+            "page": page,
+            "document_type": result["document_type"],
+            "confidence": result["confidence"],
+            "extracted_fields": result["extracted_fields"],
+            "extracted_text": result["extracted_text"],
+            "summarized_text": result["summarized_text"],
+            "redacted_path": result["redacted_path"],
+            "pdf_path": result["pdf_path"],
+        })
+
+    return {
+        "path": relative_path,
+        "status": "ok",
+        "pages": pages,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+# =====================================================================
+# BATCH RUN
+# =====================================================================
+
+def run_batch(root, output_path, executor, timeout, redact_dir=None, summarize=False, retry_errors=False,
+              max_in_flight=None, reset_executor=None):
+    """
+    Process every new file under `root`, appending one JSONL record per file.
+
+    Args:
+        root: Directory to walk
+        output_path: JSONL results file, also the checkpoint
+        executor: concurrent.futures executor running process_document()
+        timeout: Hard limit per page, in seconds
+        redact_dir: Folder for redacted images (None: no redaction)
+        summarize: Also run the abstractive summary and the PDF report
+        retry_errors: Process files recorded as failed again
+        max_in_flight: Files submitted at once (default: twice the pool size)
+        reset_executor: Callable returning a fresh executor after a worker
+            crash (default: BrokenProcessPool stops the run)
+
+    Returns:
+        Dict with found, skipped, succeeded and failed counts and files_per_second
+    """
+    done = load_checkpoint(output_path, retry_errors)
+    found = list(find_documents(root, exclude=redact_dir))
+    queue = deque(path for path in found if path not in done)
+    counts = {"found": len(found), "skipped": len(found) - len(queue), "succeeded": 0, "failed": 0}
+    max_in_flight = max_in_flight or 2 * (getattr(executor, "_max_workers", None) or 1)
+    print(f"[INFO] Batch: {len(queue)} of {len(found)} files to process, the rest are in {output_path}")
+
+    started = time.monotonic()
+    futures = {}
+    crashes = {}
+
+    def record(output, data):
+        counts["succeeded" if data["status"] == "ok" else "failed"] += 1
+        # One flushed line per file: the checkpoint never lags behind the work
+        output.write(json.dumps(data) + "\n")
+        output.flush()
+        processed = counts["succeeded"] + counts["failed"]
+        if processed % 100 == 0:
+            print(f"[INFO] Batch: {processed} files in {time.monotonic() - started:.0f}s, "
+                  f"{len(queue) + len(futures)} left")
+
+    try:
+        with open(output_path, "a", encoding="utf-8") as output:
+            while queue or futures:
+                while queue and len(futures) < max_in_flight:
+                    path = queue.popleft()
+                    futures[executor.submit(process_document, root, path, timeout, redact_dir, summarize)] = path
+
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                if reset_executor is not None and any(isinstance(f.exception(), BrokenProcessPool) for f in finished):
+                    # A crash takes every running task with it: retry them all on a fresh
+                    # pool, and give up on a file once it was running during two crashes
+                    executor = reset_executor()
+                    for path in futures.values():
+                        crashes[path] = crashes.get(path, 0) + 1
+                        if crashes[path] < MAX_CRASHES:
+                            queue.appendleft(path)
+                        else:
+                            record(output, {"path": path, "status": "error", "error": "Worker process crashed"})
+                    futures.clear()
+                    continue
+
+                for future in finished:
+                    path = futures.pop(future)
+                    try:
+                        record(output, future.result())
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        print(f"[ERROR] Batch processing of {path} failed: {e}")
+                        record(output, {"path": path, "status": "error", "error": str(e)})
+    finally:
+        # Interrupted: drop what has not started; it is picked up on the next run
+        for future in futures:
+            future.cancel()
+
+    elapsed = time.monotonic() - started
+    counts["files_per_second"] = round((counts["succeeded"] + counts["failed"]) / elapsed, 3) if elapsed else None
+    print(f"[SUCCESS] Batch finished: {counts}")
+    return counts
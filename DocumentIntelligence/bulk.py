@@ -0,0 +1,293 @@
+# DocumentIntelligence/bulk.py
+"""
+Bulk classification: many scanned documents per request.
+
+Documents come from a ZIP archive and/or a multi-file upload. They are
+stored content-addressed first (duplicates collapse into one blob), then
+the OCR -> classify -> extract -> redact pipeline runs across a process
+pool. classify_bulk() yields one record per document in completion order
+and a throughput summary at the end; the view streams them as NDJSON.
+
+Each scan is decoded once in this process into shared memory and workers
+get a handle to it (shared_images.py), so the pixels are neither pickled
+nor decoded again by each stage. At most MAX_IN_FLIGHT documents are
+decoded at a time.
+
+Pool processes are started with "spawn" (the web process runs writer and
+heartbeat threads, which fork would copy mid-lock) and are reused across
+requests; the summarization model is loaded only by a worker that summarizes.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .cpu_budget import init_pool_process
+from .pipeline import LatencyBudget
+from .processing import cached_classification, classify_file, finish_classification, record_classification
+from .shared_images import free, release, share_image
+from .storage import CHUNK_SIZE, blob_path, store_chunks
+from file_conversions.cancellation import CancellationToken
+
+# Image types the classification pipeline can read
+DOCUMENT_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp"}
+
+
+class BulkUploadError(ValueError):
+    pass
+
+
+def is_document(name):
+    base = os.path.basename(name)
+    # Skip folders, macOS resource forks and dotfiles that archivers add
+    if not base or base.startswith(".") or "__MACOSX" in name:
+        return False
+    return os.path.splitext(base)[1].lower() in DOCUMENT_EXTENSIONS
+
+
+# =====================================================================
+# UPLOADS
+# =====================================================================
+
+def _zip_chunks(archive, member, budget):
+    """Stream a ZIP member, counting real bytes against the upload limit (headers can lie)."""
+    with archive.open(member) as f:
+        while chunk := f.read(CHUNK_SIZE):
+            budget["bytes"] -= len(chunk)
+            if budget["bytes"] < 0:
+                raise BulkUploadError("Upload exceeds the size limit once uncompressed")
+            yield chunk
+
+
+def store_bulk_upload(archive=None, files=()):
+    """
+    Store every document of a bulk upload.
+
+    Args:
+        archive: Uploaded ZIP file (optional)
+        files: Uploaded document files (optional)
+
+    Returns:
+        List of (file name, Blob) in upload order
+    """
+    limits = settings.BULK_CLASSIFICATION
+    files = [f for f in files if is_document(f.name)]
+    budget = {"bytes": limits["MAX_TOTAL_BYTES"] - sum(f.size for f in files)}
+    if budget["bytes"] < 0:
+        raise BulkUploadError("Upload exceeds the size limit")
+
+    documents = []
+    if archive is not None:
+        try:
+            with zipfile.ZipFile(archive) as zf:
+                members = [m for m in zf.infolist() if not m.is_dir() and is_document(m.filename)]
+                if len(members) + len(files) > limits["MAX_FILES"]:
+                    raise BulkUploadError(f"At most {limits['MAX_FILES']} documents per upload")
+                if sum(m.file_size for m in members) > budget["bytes"]:
+                    raise BulkUploadError("Upload exceeds the size limit once uncompressed")
+                for member in members:
+                    # Only the base name is used; paths inside the archive are never extracted
+                    name = os.path.basename(member.filename)
+                    documents.append((name, store_chunks(_zip_chunks(zf, member, budget), name)))
+        except zipfile.BadZipFile:
+            raise BulkUploadError("The archive is not a valid ZIP file")
+    elif len(files) > limits["MAX_FILES"]:
+        raise BulkUploadError(f"At most {limits['MAX_FILES']} documents per upload")
+
+    for f in files:
+        documents.append((f.name, store_chunks(f.chunks(CHUNK_SIZE), f.name)))
+
+    if not documents:
+        raise BulkUploadError("No images found in the upload")
+    print(f"[INFO] Bulk upload: stored {len(documents)} documents")
+    return documents
+
+
+# =====================================================================
+# PROCESS POOL
+# =====================================================================
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The process-wide pool, sized by settings.BULK_CLASSIFICATION["WORKERS"]."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = settings.BULK_CLASSIFICATION["WORKERS"]
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    # cpu_budget imports nothing from Django: unpickling a function of
+                    # a module that imports the models before setup() would fail.
+                    # Each worker gets its share of this process's cores.
+                    initializer=init_pool_process,
+                    initargs=(settings.CPU_BUDGET["processes"] * workers,),
+                )
+    return _executor
+
+
+def reset_executor():
+    """Drop a broken pool (a worker died); the next call starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def classify_in_worker(file_path, timeout, shared=None, summarize=False):
+    """
+    Pool task: classify one stored document within a hard timeout (`shared`: its SharedImage).
+
+    Without `summarize` only the mandatory stages run: the summary is
+    extractive and no PDF report is written.
+    """
+    budget = LatencyBudget(None if summarize else 0, CancellationToken.with_timeout(timeout))
+    started = time.monotonic()
+    if shared is None:
+        result = classify_file(file_path, budget)
+    else:
+        block, image = shared.attach()
+        try:
+            result = classify_file(file_path, budget, image=image)
+        finally:
+            del image
+            release(block)
+    return result, bool(budget.skipped_stages), time.monotonic() - started
+
+
+def submit_document(executor, blob, timeout):
+    """
+    Submit one stored document to the pool, decoded into shared memory when enabled.
+
+    Returns:
+        (future, block): `block` must be passed to shared_images.free() once
+        the future is done (None if the worker reads the file itself)
+    """
+    file_path = blob_path(blob)
+    block = shared = None
+    if settings.BULK_CLASSIFICATION["SHARED_MEMORY"]:
+        block, shared = share_image(file_path)
+    try:
+        return executor.submit(classify_in_worker, file_path, timeout, shared,
+                               settings.BULK_CLASSIFICATION["SUMMARIZE"]), block
+    except Exception:
+        free(block)
+        raise
+
+
+# =====================================================================
+# BULK RUN
+# =====================================================================
+
+def _record(file_name, blob, result, email, seconds, cached=False):
+    linked_entities = record_classification(email, blob, file_name, result) if email else {}
+    return {
+        "file_name": file_name,
+        "status": "ok",
+        "document_type": result["document_type"],
+        "confidence": result["confidence"],
+        "extracted_fields": result["extracted_fields"],
+        "linked_entities": linked_entities,
+        "redacted_url": result["redacted_url"],
+        "pdf_url": result["pdf_url"],
+        "cached": cached,
+        "seconds": round(seconds, 3),
+    }
+
+
+def classify_bulk(documents, email=None, executor=None):
+    """
+    Classify stored documents in parallel.
+
+    Args:
+        documents: List of (file name, Blob) from store_bulk_upload()
+        email: Owner for history entries (None: nothing is recorded)
+        executor: concurrent.futures executor (default: the shared process pool)
+
+    Yields:
+        One dict per document as it finishes, then {"summary": {...}}
+    """
+    executor = executor or get_executor()
+    limits = settings.BULK_CLASSIFICATION
+    timeout = limits["DOCUMENT_TIMEOUT"]
+    started = time.monotonic()
+    counts = {"documents": len(documents), "succeeded": 0, "failed": 0, "cached": 0}
+
+    # Identical files in one upload are processed once
+    pending = {}
+    queue = deque()
+    futures = {}
+    try:
+        for file_name, blob in documents:
+            if blob.digest in pending:
+                pending[blob.digest][1].append(file_name)
+                continue
+            result = cached_classification(blob)
+            if result is not None:
+                counts["succeeded"] += 1
+                counts["cached"] += 1
+                yield _record(file_name, blob, finish_classification(blob, result, complete=False), email, 0,
+                              cached=True)
+                continue
+            pending[blob.digest] = (blob, [file_name])
+            queue.append(blob)
+
+        while queue or futures:
+            # Keep the pool busy without decoding the whole upload into memory
+            while queue and len(futures) < limits["MAX_IN_FLIGHT"]:
+                blob = queue.popleft()
+                future, block = submit_document(executor, blob, timeout)
+                futures[future] = (blob.digest, block)
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                digest, block = futures.pop(future)
+                free(block)
+                blob, names = pending[digest]
+                try:
+                    result, degraded, seconds = future.result()
+                    result = finish_classification(blob, result, complete=not degraded)
+                except BrokenProcessPool:
+                    reset_executor()
+                    counts["failed"] += len(names)
+                    for file_name in names:
+                        yield {"file_name": file_name, "status": "error", "error": "Worker process crashed"}
+                    continue
+                except Exception as e:
+                    print(f"[ERROR] Bulk classification of {names[0]} failed: {e}")
+                    counts["failed"] += len(names)
+                    for file_name in names:
+                        yield {"file_name": file_name, "status": "error", "error": str(e)}
+                    continue
+
+                for file_name in names:
+                    counts["succeeded"] += 1
+                    yield _record(file_name, blob, dict(result), email, seconds)
+    finally:
+        # Client went away: don't keep the pool busy with its remaining documents.
+        # A task that already started fails to attach its freed image and ends early.
+        for future, (_, block) in futures.items():
+            future.cancel()
+            free(block)
+
+    elapsed = time.monotonic() - started
+    summary = {
+        **counts,
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(counts["documents"] / elapsed, 3) if elapsed else None,
+        "workers": getattr(executor, "_max_workers", None),
+    }
+    print(f"[SUCCESS] Bulk classification: {summary}")
+    yield {"summary": summary}
@@ -0,0 +1,129 @@
+# DocumentIntelligence/cpu_budget.py
+"""
+One CPU budget for Tesseract, torch, OpenCV and the worker pools.
+
+Each of them sizes its threads from the machine's core count on its own,
+and none of them knows how many gunicorn workers share the box, so the
+cores end up oversubscribed several times over. plan() works out the cores
+this container may really use (affinity and cgroup quota), divides them
+between the processes of the deployment and then between the libraries
+inside each process; settings.py sizes the pools and governor limits from
+it and apply() configures the libraries at startup.
+
+Tesseract runs single-threaded (OMP_THREAD_LIMIT=1) with several documents
+in parallel, which gives more pages per second than OpenMP inside one run.
+
+Environment overrides:
+    CPU_BUDGET_CORES               cores to use instead of the detected count
+    WEB_CONCURRENCY                processes sharing them (gunicorn workers)
+    CPU_BUDGET_TESSERACT_PARALLEL  concurrent OCR runs per process
+    CPU_BUDGET_TORCH_THREADS       torch intra-op threads per process
+
+`manage.py benchmark_cpu_budget` measures candidate splits on this machine.
+
+Nothing here imports Django: settings.py and freshly spawned pool
+processes use it before the app registry is ready.
+"""
+
+import math
+import os
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+def cgroup_cpu_limit(root=CGROUP_ROOT):
+    """CPU quota of this cgroup in cores, or None when there is none."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        quota, period = _read(os.path.join(root, "cpu.max")).split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    # cgroup v1: quota is -1 when unlimited
+    try:
+        quota = int(_read(os.path.join(root, "cpu", "cpu.cfs_quota_us")))
+        period = int(_read(os.path.join(root, "cpu", "cpu.cfs_period_us")))
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus(root=CGROUP_ROOT):
+    """Cores this process may use: CPU affinity, capped by the cgroup quota (at least 1)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit(root)
+    if limit is not None:
+        # A fractional quota is throttled, not rounded up
+        cpus = min(cpus, math.floor(limit))
+    return max(1, cpus)
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def plan(cores=None, processes=None):
+    """
+    Split the cores between processes and, inside one process, between libraries.
+
+    Args:
+        cores: Cores for the whole deployment (default: CPU_BUDGET_CORES or detected)
+        processes: Processes sharing them (default: WEB_CONCURRENCY or 1)
+
+    Returns:
+        Dict with cores, processes, per_process, tesseract_parallel,
+        tesseract_threads, torch_threads, opencv_threads, rasterizer_parallel
+        and soffice_parallel
+    """
+    cores = cores or _env_int("CPU_BUDGET_CORES", 0) or available_cpus()
+    processes = max(1, processes or _env_int("WEB_CONCURRENCY", 1))
+    per_process = max(1, cores // processes)
+    return {
+        "cores": cores,
+        "processes": processes,
+        "per_process": per_process,
+        # OCR is the bulk of the work: one single-threaded Tesseract per core
+        "tesseract_parallel": _env_int("CPU_BUDGET_TESSERACT_PARALLEL", per_process),
+        "tesseract_threads": 1,
+        # The summarizer runs one request at a time next to OCR; half the share by default
+        "torch_threads": _env_int("CPU_BUDGET_TORCH_THREADS", max(1, per_process // 2)),
+        # Upscaling already runs on several OCR threads at once
+        "opencv_threads": 1,
+        "rasterizer_parallel": max(1, per_process // 2),
+        "soffice_parallel": max(1, per_process // 2),
+    }
+
+
+def apply(budget):
+    """Configure Tesseract (for child processes), OpenCV and torch in this process."""
+    os.environ["OMP_THREAD_LIMIT"] = str(budget["tesseract_threads"])
+    try:
+        import cv2
+        cv2.setNumThreads(budget["opencv_threads"])
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.set_num_threads(budget["torch_threads"])
+    except ImportError:
+        pass
+    print(f"[INFO] CPU budget: {budget['per_process']} of {budget['cores']} cores for this process, "
+          f"{budget['tesseract_parallel']} parallel OCR, {budget['torch_threads']} torch threads")
+
+
+def init_pool_process(processes):
+    """Process pool initializer: budget for one of `processes` pool workers, then set up Django."""
+    os.environ["WEB_CONCURRENCY"] = str(processes)
+    import django
+    django.setup()
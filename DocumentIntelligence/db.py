@@ -0,0 +1,273 @@
+# DocumentIntelligence/db.py
+"""
+Pooled database connections for the raw-SQL views.
+
+Every request checks a connection out with `with db.connection() as con:`
+and gives it back when the block ends. Connections are health-checked on
+checkout and replaced when broken, and an uncommitted or failed transaction
+is rolled back on return so it cannot leak into the next request.
+
+Postgres is used in production. A SQLite stand-in with the same interface
+(including %s placeholders) is available for tests and local development.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+from django.conf import settings
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the pool timeout."""
+
+
+# Failures of the database or the connection rather than of the statement:
+# the same statement may succeed when tried again
+TRANSIENT_ERRORS = (PoolTimeout, psycopg2.OperationalError, psycopg2.InterfaceError, sqlite3.OperationalError)
+
+
+# =====================================================================
+# POSTGRES
+# =====================================================================
+
+class PostgresPool:
+    """
+    Thread-safe psycopg2 pool.
+
+    Args:
+        minconn: Connections kept open while idle
+        maxconn: Upper limit on open connections; further checkouts wait
+        timeout: Seconds a checkout waits for a free connection
+        health_check_after: Connections idle for longer than this are pinged
+            with SELECT 1 before being handed out
+        **connect_kwargs: Passed to psycopg2.connect (host, dbname, user, ...)
+    """
+
+    vendor = "postgresql"
+
+    # Errors after which the connection itself cannot be trusted any more
+    CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+    def __init__(self, minconn=1, maxconn=10, timeout=5, health_check_after=30, **connect_kwargs):
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **connect_kwargs)
+        # ThreadedConnectionPool raises instead of waiting when exhausted
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+
+    @contextmanager
+    def connection(self):
+        con = self._checkout()
+        broken = False
+        try:
+            yield con
+        except self.CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self._release(con, broken)
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+        try:
+            con = self._pool.getconn()
+            if not self._is_healthy(con):
+                print("[WARNING] Discarding broken database connection, reconnecting")
+                self._discard(con)
+                con = self._pool.getconn()
+            return con
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _is_healthy(self, con):
+        if con.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(con), 0) < self.health_check_after:
+            return True
+        try:
+            cur = con.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            con.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _release(self, con, broken=False):
+        try:
+            if not broken and not con.closed:
+                if con.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    con.rollback()
+                self._last_used[id(con)] = time.monotonic()
+                self._pool.putconn(con)
+            else:
+                self._discard(con)
+        except Exception as e:
+            print(f"[WARNING] Could not return database connection to the pool: {e}")
+            self._discard(con)
+        finally:
+            self._slots.release()
+
+    def _discard(self, con):
+        self._last_used.pop(id(con), None)
+        try:
+            self._pool.putconn(con, close=True)
+        except Exception:
+            pass
+
+    def close(self):
+        self._pool.closeall()
+
+
+# =====================================================================
+# SQLITE STAND-IN
+# =====================================================================
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts the %s placeholders used throughout the views"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @staticmethod
+    def _convert(sql):
+        return sql.replace("%s", "?")
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._convert(sql), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(self._convert(sql), seq_of_params)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class SQLiteConnection:
+    def __init__(self, con):
+        self._con = con
+
+    def cursor(self):
+        return SQLiteCursor(self._con.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._con, name)
+
+
+class SQLitePool:
+    """
+    SQLite stand-in for PostgresPool.
+
+    Args:
+        path: Database file, or ":memory:" for a private in-memory database
+            shared by every connection of this pool
+    """
+
+    vendor = "sqlite"
+
+    _memory_counter = 0
+
+    def __init__(self, path=":memory:"):
+        self._keeper = None
+        self._lock = None
+        if path == ":memory:":
+            # Shared-cache connections fail with "table is locked" instead of
+            # waiting for each other, so they take turns
+            self._lock = threading.RLock()
+            SQLitePool._memory_counter += 1
+            self.database = f"file:documents_{id(self)}_{SQLitePool._memory_counter}?mode=memory&cache=shared"
+            # The in-memory database lives as long as one connection to it is open
+            self._keeper = self._connect()
+        else:
+            self.database = str(path)
+
+    def _connect(self):
+        return sqlite3.connect(
+            self.database,
+            uri=self.database.startswith("file:"),
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            check_same_thread=False,
+            timeout=5,
+        )
+
+    @contextmanager
+    def connection(self):
+        if self._lock is not None:
+            self._lock.acquire()
+        con = self._connect()
+        try:
+            yield SQLiteConnection(con)
+        finally:
+            con.rollback()
+            con.close()
+            if self._lock is not None:
+                self._lock.release()
+
+    def close(self):
+        if self._keeper is not None:
+            self._keeper.close()
+            self._keeper = None
+
+
+# =====================================================================
+# MODULE-LEVEL POOL
+# =====================================================================
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def create_pool_from_settings():
+    config = settings.APP_DATABASE
+    if config["ENGINE"] == "sqlite":
+        return SQLitePool(config["NAME"] or ":memory:")
+
+    return PostgresPool(
+        minconn=config["POOL_MIN"],
+        maxconn=config["POOL_MAX"],
+        timeout=config["POOL_TIMEOUT"],
+        health_check_after=config["HEALTH_CHECK_AFTER"],
+        host=config["HOST"],
+        dbname=config["NAME"],
+        user=config["USER"],
+        password=config["PASSWORD"],
+        port=config["PORT"],
+    )
+
+
+def get_pool():
+    """The process-wide pool, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = create_pool_from_settings()
+    return _pool
+
+
+def set_pool(pool):
+    """Replace the process-wide pool (e.g. with a SQLitePool in tests). Returns the old one."""
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    return previous
+
+
+@contextmanager
+def connection():
+    """Check a connection out of the pool for the duration of the block."""
+    with get_pool().connection() as con:
+        yield con
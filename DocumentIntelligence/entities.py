@@ -0,0 +1,163 @@
+# DocumentIntelligence/entities.py
+"""
+Keyed-hash index of the identity numbers found in classified documents.
+
+PAN, Aadhaar, DL, voter-ID and GSTIN numbers from the unredacted extractor
+output are normalised and stored as HMAC-SHA256(ENTITY_INDEX_KEY,
+"<type>:<number>") in entity_index, next to the owner's email and the
+digest of the stored upload. The plaintext never reaches the database,
+and without the key the hashes cannot be brute-forced from the small
+identifier space. Lookups hash the query the same way and hit the
+primary key, so "seen before" is a single index probe.
+
+Nothing is indexed until ENTITY_INDEX_KEY is set. The entity_index table
+is created by `manage.py ensure_schema` (see schema.py).
+"""
+
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+
+from . import db
+
+# Extractor field -> entity type
+ENTITY_FIELDS = {
+    "PAN_Number": "pan",
+    "Aadhar_Number": "aadhaar",
+    "DL_Number": "dl",
+    "Voter_ID": "voter_id",
+    "GST_Number": "gstin",
+}
+
+# History display label (extraction.FIELD_EXTRACTORS) -> entity type
+ENTITY_LABELS = {
+    "PAN Number": "pan",
+    "Aadhar Number": "aadhaar",
+    "DL Number": "dl",
+    "Voter ID": "voter_id",
+    "GST Number": "gstin",
+}
+
+INSERT_SQL = """
+    INSERT INTO entity_index (entity_hash, email, blob_digest, entity_type)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (entity_hash, email, blob_digest) DO NOTHING
+"""
+
+
+def normalize(value):
+    """Identifier as the extractors may print it ("1234 5678 9012", "ab-12...") -> canonical form."""
+    return re.sub(r"[\s\-./]", "", str(value)).upper()
+
+
+# Whether the missing-key warning was printed in this process
+_warned = {"missing_key": False}
+
+
+def index_enabled():
+    """True if ENTITY_INDEX_KEY is configured; warns (once per process) when it is not."""
+    if settings.ENTITY_INDEX_KEY:
+        return True
+    if not _warned["missing_key"]:
+        _warned["missing_key"] = True
+        print("[WARNING] ENTITY_INDEX_KEY is not set, skipping the entity index")
+    return False
+
+
+def entity_hash(entity_type, value):
+    if not settings.ENTITY_INDEX_KEY:
+        raise ValueError("ENTITY_INDEX_KEY is not set")
+    key = settings.ENTITY_INDEX_KEY.encode()
+    message = f"{entity_type}:{normalize(value)}".encode()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+def entities_from_fields(raw_fields):
+    """
+    (entity_type, hash) pairs for the identity numbers in unredacted extractor output.
+
+    Masked values (containing "X" or "*") are skipped; they would never match a real number.
+    Returns no entities while ENTITY_INDEX_KEY is unset.
+    """
+    if not raw_fields or not index_enabled():
+        return []
+    entities = []
+    for field, entity_type in ENTITY_FIELDS.items():
+        value = raw_fields.get(field)
+        if not value or "*" in value or "XXXX" in value.upper():
+            continue
+        entities.append((entity_type, entity_hash(entity_type, value)))
+    return entities
+
+
+# =====================================================================
+# INDEX
+# =====================================================================
+
+def index_entities(email, blob_digest, entities):
+    """Record that this user's upload contains these entities (idempotent)."""
+    if not entities:
+        return 0
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.executemany(INSERT_SQL, [(digest, email, blob_digest, entity_type) for entity_type, digest in entities])
+        con.commit()
+    print(f"[INFO] Indexed {len(entities)} entities for blob {blob_digest[:12]}")
+    return len(entities)
+
+
+def linked_uploads(email, entities, exclude_blob=None):
+    """
+    Other uploads of this user that contain the same entities.
+
+    Returns:
+        Dict of entity_type -> list of blob digests, oldest first
+    """
+    if not entities:
+        return {}
+    placeholders = ",".join(["%s"] * len(entities))
+    sql = (
+        f"SELECT entity_type, blob_digest FROM entity_index "
+        f"WHERE entity_hash IN ({placeholders}) AND email=%s"
+    )
+    params = [digest for _, digest in entities] + [email]
+    if exclude_blob:
+        sql += " AND blob_digest <> %s"
+        params.append(exclude_blob)
+    sql += " ORDER BY first_seen, blob_digest"
+
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    linked = {}
+    for entity_type, blob_digest in rows:
+        linked.setdefault(entity_type, []).append(blob_digest)
+    return linked
+
+
+def uploads_with(email, entity_type, value):
+    """Digests of this user's uploads that contain an identity number."""
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT blob_digest FROM entity_index WHERE entity_hash=%s AND email=%s",
+            (entity_hash(entity_type, value), email),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def seen_before(entity_type, value, email=None):
+    """Whether an identity number has been indexed (for one user, or for anyone)."""
+    sql = "SELECT 1 FROM entity_index WHERE entity_hash=%s"
+    params = [entity_hash(entity_type, value)]
+    if email:
+        sql += " AND email=%s"
+        params.append(email)
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute(sql + " LIMIT 1", params)
+        return cur.fetchone() is not None
@@ -0,0 +1,76 @@
+# DocumentIntelligence/executors.py
+"""
+Named thread pools for the blocking work of the async views.
+
+A pipeline run is driven from the "pipeline" pool; its CPU-heavy stages are
+handed on to the pool for that kind of work (LatencyBudget.stage_executors),
+so a burst of uploads queues on OCR threads instead of piling up on the
+summarizer, and conversions cannot starve either. Tesseract, Poppler and
+LibreOffice run as subprocesses and OpenCV / torch release the GIL, so
+threads are enough here; the bulk endpoint keeps its own process pool.
+
+Sizes come from settings.EXECUTORS.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Pipeline stage -> pool it runs on
+STAGE_POOLS = {
+    "upscale": "ocr",
+    "ocr": "ocr",
+    "classify": "ocr",
+    "redact": "ocr",
+    "summary": "summarize",
+    "pdf_report": "convert",
+}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name):
+    """The process-wide pool called `name` (a key of settings.EXECUTORS)."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=settings.EXECUTORS[name], thread_name_prefix=name)
+                _executors[name] = executor
+    return executor
+
+
+def stage_executors():
+    """Dict of stage -> pool for LatencyBudget(stage_executors=...)."""
+    return {stage: get_executor(pool) for stage, pool in STAGE_POOLS.items()}
+
+
+async def run_in(name, func, *args, cancel_token=None, **kwargs):
+    """
+    Await func(*args, **kwargs) running on the pool called `name`.
+
+    If the awaiting task is cancelled (the client went away), `cancel_token`
+    is cancelled too so the work stops instead of finishing for nobody.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_executor(name), functools.partial(func, *args, **kwargs))
+    try:
+        return await future
+    except asyncio.CancelledError:
+        if cancel_token is not None:
+            cancel_token.cancel("client disconnected")
+        raise
+
+
+def shutdown_executors(wait=True):
+    """Stop every pool (tests, process shutdown); they are recreated on next use."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,110 @@
+# DocumentIntelligence/extraction.py
+"""
+Classification and field extraction from OCR text.
+
+Kept apart from pipeline.py, which loads the summarization model and
+starts the LanguageTool client on import: processes that only work on
+stored text (the documents backfill) import this module alone.
+"""
+
+from document_classification.ocr_extraction import (
+    classify_document_hybrid,
+    extract_invoice_fields,
+    extract_aadhar_fields,
+    extract_pan_fields,
+    extract_driving_license_fields,
+    extract_voter_id_fields,
+    extract_id_card_fields,
+)
+
+# doc type -> (extractor, [(display label, extractor key), ...])
+FIELD_EXTRACTORS = {
+    "Aadhar Card": (extract_aadhar_fields, [
+        ('Aadhar Number', 'Aadhar_Number'),
+        ('Name', 'Name'),
+        ('Date of Birth', 'DOB'),
+        ('Address', 'Address'),
+    ]),
+    "PAN Card": (extract_pan_fields, [
+        ('PAN Number', 'PAN_Number'),
+        ('Name', 'Name'),
+        ("Father's Name", 'Father_Name'),
+        ('Date of Birth', 'DOB'),
+    ]),
+    "Invoice": (extract_invoice_fields, [
+        ('Invoice Number', 'Invoice_Number'),
+        ('Date', 'Date'),
+        ('GST Number', 'GST_Number'),
+        ('Total Amount', 'Total_Amount'),
+    ]),
+    "Driving License": (extract_driving_license_fields, [
+        ('DL Number', 'DL_Number'),
+        ('Name', 'Name'),
+        ('DOB', 'DOB'),
+        ('Issue Date', 'Issue_Date'),
+        ('Expiry Date', 'Expiry_Date'),
+        ('Blood Group', 'Blood_Group'),
+        ('Address', 'Address'),
+    ]),
+    "Voter ID": (extract_voter_id_fields, [
+        ('Voter ID', 'Voter_ID'),
+        ('Name', 'Name'),
+        ("Father's Name", 'Father_Name'),
+        ('DOB', 'DOB'),
+        ('Address', 'Address'),
+    ]),
+    "ID Card": (extract_id_card_fields, [
+        ('ID Number', 'ID_Number'),
+        ('Name', 'Name'),
+        ('DOB', 'DOB'),
+        ('Designation', 'Designation'),
+        ('Department', 'Department'),
+        ('Organization', 'Organization'),
+        ('Issue Date', 'Issue_Date'),
+        ('Expiry Date', 'Expiry_Date'),
+    ]),
+}
+
+SENSITIVE_DOCUMENT_TYPES = ["Aadhar Card", "PAN Card", "Driving License", "Voter ID", "ID Card"]
+
+# Labels whose stored value is masked (mask_sensitive_data): a filter on one
+# could only ever match the mask, never the number the user clicked
+MASKED_FIELDS = {
+    "Aadhar Number", "PAN Number", "GST Number", "DL Number", "Voter ID", "ID Number",
+    "Name", "Father's Name", "Date of Birth", "DOB", "Address", "Total Amount",
+}
+
+# Labels stored in clear in documents.meta, which history filters may use
+FILTERABLE_FIELDS = frozenset(
+    label for _, labels in FIELD_EXTRACTORS.values() for label, _ in labels
+) - MASKED_FIELDS
+
+
+def extract_document_fields(doc_type, text):
+    """
+    Run the field extractor for a document type.
+
+    Returns:
+        (display_fields, raw_fields): redacted fields keyed by display label,
+        and the unredacted extractor output ({} for unknown types)
+    """
+    if doc_type not in FIELD_EXTRACTORS:
+        return {}, {}
+
+    extractor, labels = FIELD_EXTRACTORS[doc_type]
+    print(f"[INFO] Processing {doc_type}...")
+
+    raw_fields = extractor(text, redact=False)
+    # Raw values are identity numbers; only log which fields were found
+    print(f"[INFO] {doc_type} fields found: {sorted(key for key, value in raw_fields.items() if value)}")
+
+    redacted_fields = extractor(text, redact=True)
+    print(f"REDACTED {doc_type} fields:", redacted_fields)
+
+    return {label: redacted_fields.get(key) for label, key in labels}, raw_fields
+
+
+def classify_text(text):
+    """(document type, confidence in percent) for OCR text, as the pipelines store them."""
+    doc_type, confidence_score = classify_document_hybrid(text)
+    return doc_type, int(confidence_score * 100)
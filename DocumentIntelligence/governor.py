@@ -0,0 +1,249 @@
+# DocumentIntelligence/governor.py
+"""
+Admission control for the expensive external resources.
+
+Each named resource (soffice, tesseract, summarizer, rasterizer) has a limit
+on concurrent users and a bounded wait queue. A caller that finds the queue
+full, or waits longer than QUEUE_TIMEOUT, gets Overloaded instead of piling
+another process onto the box; the async views turn that into a 503 with
+Retry-After. A client with too many uploads in flight gets a 429.
+
+Limits are per web process (settings.GOVERNOR); job and bulk workers run one
+document at a time and are bounded by their own worker counts.
+"""
+
+import functools
+import math
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.http import JsonResponse
+
+# Pipeline stage -> resource it holds while running
+STAGE_RESOURCES = {
+    "ocr": "tesseract",
+    "redact": "tesseract",
+    "summary": "summarizer",
+}
+
+
+class Overloaded(Exception):
+    """No slot for a resource right now; retry_after is a hint in seconds."""
+
+    status = 503
+
+    def __init__(self, resource, retry_after, reason):
+        super().__init__(f"{resource} is busy ({reason}), retry in {retry_after}s")
+        self.resource = resource
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TooManyRequests(Overloaded):
+    """One client already has MAX_REQUESTS_PER_CLIENT uploads in flight."""
+
+    status = 429
+
+
+class Resource:
+    """
+    Counting semaphore with a bounded wait queue and usage statistics.
+
+    Args:
+        name: Resource name (used in errors and metrics)
+        limit: Concurrent holders
+        max_queue: Callers allowed to wait for a slot; more are rejected at once
+        queue_timeout: Seconds a caller waits before giving up
+    """
+
+    def __init__(self, name, limit, max_queue, queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_seconds = None
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from the average hold time and the queue."""
+        average = self.avg_seconds if self.avg_seconds is not None else 1.0
+        return max(1, math.ceil(average * (self.waiting + 1) / self.limit))
+
+    def acquire(self, timeout=None):
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._cond:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(self.name, self.retry_after(), "queue full")
+
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + timeout
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        # A release may have woken this caller just as it gave up: pass it on
+                        self._cond.notify()
+                        raise Overloaded(self.name, self.retry_after(), "timed out waiting")
+                    self._cond.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, seconds):
+        with self._cond:
+            self.active -= 1
+            self.completed += 1
+            previous = self.avg_seconds if self.avg_seconds is not None else seconds
+            self.avg_seconds = 0.8 * previous + 0.2 * seconds
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.release(time.monotonic() - started)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "waiting": self.waiting,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_seconds": round(self.avg_seconds, 3) if self.avg_seconds is not None else None,
+            }
+
+
+# =====================================================================
+# REGISTRY
+# =====================================================================
+
+_resources = {}
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_resource(name):
+    """The process-wide Resource called `name` (a key of GOVERNOR["RESOURCES"])."""
+    resource = _resources.get(name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(name)
+            if resource is None:
+                config = settings.GOVERNOR["RESOURCES"][name]
+                resource = Resource(name, config["LIMIT"], config["MAX_QUEUE"],
+                                    settings.GOVERNOR["QUEUE_TIMEOUT"])
+                _resources[name] = resource
+    return resource
+
+
+@contextmanager
+def acquire(*names):
+    """Hold a slot of every named resource (None entries are ignored), in the order given."""
+    with ExitStack() as stack:
+        for name in names:
+            if name is not None:
+                stack.enter_context(get_resource(name).slot())
+        yield
+
+
+@contextmanager
+def client_slot(key):
+    """Count one request in flight for `key`; TooManyRequests above MAX_REQUESTS_PER_CLIENT."""
+    limit = settings.GOVERNOR["MAX_REQUESTS_PER_CLIENT"]
+    with _lock:
+        if _clients.get(key, 0) >= limit:
+            raise TooManyRequests("client", 1, f"{limit} uploads already in progress")
+        _clients[key] = _clients.get(key, 0) + 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _clients[key] -= 1
+            if not _clients[key]:
+                del _clients[key]
+
+
+def metrics():
+    """Queue depth and usage of every resource (all configured ones, used or not)."""
+    return {
+        "resources": {name: get_resource(name).metrics() for name in settings.GOVERNOR["RESOURCES"]},
+        "clients_in_flight": sum(_clients.values()),
+    }
+
+
+def reset():
+    """Forget all resources and counters (tests, settings changes)."""
+    with _lock:
+        _resources.clear()
+        _clients.clear()
+
+
+# =====================================================================
+# VIEWS
+# =====================================================================
+
+def overloaded_response(error):
+    print(f"[WARNING] Rejected request: {error}")
+    response = JsonResponse({
+        'status': 'error',
+        'message': str(error),
+        'resource': error.resource,
+        'retry_after': error.retry_after,
+    }, status=error.status)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def client_address(request):
+    """
+    IP address of the client behind our own proxies.
+
+    REMOTE_ADDR is the last proxy (Render's load balancer), shared by every
+    client. Each trusted proxy appends the address it received the request
+    from to X-Forwarded-For, so with TRUSTED_PROXY_HOPS proxies the client
+    is that many entries from the right; entries further left are set by
+    the client and cannot be trusted.
+    """
+    hops = settings.GOVERNOR["TRUSTED_PROXY_HOPS"]
+    forwarded = [part.strip() for part in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if part.strip()]
+    if hops and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return request.META.get("REMOTE_ADDR")
+
+
+def governed(view):
+    """
+    Async view decorator: caps uploads in flight per client (session email or
+    client IP, see client_address()) and answers Overloaded with 429/503 and
+    Retry-After.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "POST":
+            return await view(request, *args, **kwargs)
+        key = await request.session.aget('email') or client_address(request)
+        try:
+            with client_slot(key):
+                return await view(request, *args, **kwargs)
+        except Overloaded as e:
+            return overloaded_response(e)
+    return wrapper
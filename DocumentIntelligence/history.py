@@ -0,0 +1,190 @@
+# DocumentIntelligence/history.py
+"""
+Read side of the document history.
+
+List queries only select the columns the dashboard shows (no extracted or
+summarized text) and page with a keyset on (created_at, id), which the
+documents_email_created_idx index serves directly, so a page costs the
+same however much history a user has.
+
+`meta` holds the extracted fields as JSON (JSONB on Postgres, JSON text on
+SQLite) and can be filtered inside the database: a containment test served
+by the documents_meta_idx GIN index on Postgres, json_extract() on SQLite.
+Keys are the display labels written by extraction.extract_document_fields;
+only labels whose values are stored unmasked can be filtered on. Identity
+numbers (PAN, Aadhaar, GSTIN, ...) are stored masked, so a filter on one
+goes through the keyed hashes of entity_index instead and matches the rows
+of the uploads that contained it. The JSONB column and its index come from
+`manage.py ensure_schema` (see schema.py).
+"""
+
+import base64
+import json
+from functools import cached_property
+
+from django.conf import settings
+
+from . import db
+from .entities import ENTITY_LABELS, uploads_with
+from .extraction import FILTERABLE_FIELDS
+from .models import Blob
+from .storage import blob_url
+
+PAGE_SIZE = 20
+
+LIST_COLUMNS = (
+    "id",
+    "file_name",
+    "file_url",
+    "document_type",
+    "confidence",
+    "created_at",
+    "operation",
+    "meta",
+    "pdf_url",
+    "redacted_url",
+)
+
+
+class DocumentRow:
+    """One history row; `meta` is only JSON-decoded when a template reads it."""
+
+    def __init__(self, row):
+        for column, value in zip(LIST_COLUMNS, row):
+            if column == "meta":
+                column = "raw_meta"
+            setattr(self, column, value)
+
+    @cached_property
+    def meta(self):
+        if not self.raw_meta:
+            return None
+        # psycopg2 already decodes JSONB columns
+        if isinstance(self.raw_meta, dict):
+            return self.raw_meta
+        try:
+            return json.loads(self.raw_meta)
+        except ValueError:
+            return None
+
+
+# =====================================================================
+# CURSORS
+# =====================================================================
+
+def encode_cursor(created_at, document_id):
+    """Opaque page cursor for the row after which the next page starts."""
+    value = f"{created_at}|{document_id}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, document_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit("|", 1)
+        return created_at, int(document_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# =====================================================================
+# META FILTERS
+# =====================================================================
+
+def meta_filter_sql(filters, email=None):
+    """
+    WHERE fragment matching rows whose meta has every given field value.
+
+    Args:
+        filters: Dict of display label -> exact value, e.g. {"Invoice Number": "..."}
+        email: Owner of the rows; needed for identity-number labels (entities.ENTITY_LABELS)
+
+    Returns:
+        (sql, params); sql is "" when there is nothing to filter on
+
+    Raises:
+        ValueError: A label that is neither in extraction.FILTERABLE_FIELDS nor an
+            identity number, or an identity number while ENTITY_INDEX_KEY is unset
+    """
+    filters = {field: value for field, value in (filters or {}).items() if value not in (None, "")}
+    identities = {field: filters.pop(field) for field in list(filters) if field in ENTITY_LABELS}
+    for field in filters:
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Not a filterable meta field: {field!r}")
+
+    sql, params = identity_filter_sql(email, identities)
+    if not filters:
+        return sql, params
+
+    if db.get_pool().vendor == "postgresql":
+        return sql + " AND meta @> %s::jsonb", params + [json.dumps(filters)]
+
+    sql += " AND json_extract(meta, %s) = %s" * len(filters)
+    return sql, params + [param for field, value in filters.items() for param in (f'$."{field}"', value)]
+
+
+def identity_filter_sql(email, identities):
+    """WHERE fragment matching rows of this user's uploads that contain every given identity number."""
+    if not identities:
+        return "", []
+    if not settings.ENTITY_INDEX_KEY:
+        raise ValueError(f"Filtering on {', '.join(identities)} needs ENTITY_INDEX_KEY to be set")
+
+    digests = None
+    for field, value in identities.items():
+        found = set(uploads_with(email, ENTITY_LABELS[field], value))
+        digests = found if digests is None else digests & found
+    # History rows point at their upload by URL
+    urls = [blob_url(blob) for blob in Blob.objects.filter(digest__in=digests)]
+    if not urls:
+        return " AND 1=0", []
+    return f" AND file_url IN ({','.join(['%s'] * len(urls))})", urls
+
+
+# =====================================================================
+# QUERIES
+# =====================================================================
+
+def list_documents(email, cursor=None, limit=PAGE_SIZE, meta_filters=None):
+    """
+    One page of a user's history, newest first.
+
+    Args:
+        email: Owner of the documents
+        cursor: Value of next_cursor from the previous page (None for the first page)
+        limit: Rows per page
+        meta_filters: Optional dict of extracted field -> value (see meta_filter_sql)
+
+    Returns:
+        (list of DocumentRow, next_cursor or None on the last page)
+    """
+    sql = f"SELECT {', '.join(LIST_COLUMNS)} FROM documents WHERE email=%s"
+    params = [email]
+
+    filter_sql, filter_params = meta_filter_sql(meta_filters, email)
+    sql += filter_sql
+    params.extend(filter_params)
+
+    position = decode_cursor(cursor)
+    if position:
+        sql += " AND (created_at, id) < (%s, %s)"
+        params.extend(position)
+
+    # One extra row tells us whether another page exists
+    sql += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    documents = [DocumentRow(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = documents[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return documents, next_cursor
@@ -0,0 +1,245 @@
+# DocumentIntelligence/history_writer.py
+"""
+Write-behind queue for document history rows.
+
+Views hand their row to the writer and return straight away; a background
+thread collects rows and writes them with one multi-row INSERT and one
+commit per batch. A batch is written when it reaches BATCH_SIZE rows or
+FLUSH_INTERVAL seconds after its first row, whichever comes first. The
+per-user statistics counters are upserted in the same transaction, behind a
+savepoint: a counter failure is logged and skipped, never the rows. Batches
+that fail on a connection or database error are retried; any other failure
+sends the batch through again one row at a time, so only the rows that fail
+on their own are dropped (and logged). Whatever is still queued is flushed
+at shutdown.
+
+In synchronous mode (tests, management commands) every row is written
+before submit() returns.
+"""
+
+import atexit
+import json
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from . import db
+from .stats import count_rows, increment_stats, today
+
+HISTORY_COLUMNS = (
+    "email",
+    "file_name",
+    "file_url",
+    "document_type",
+    "confidence",
+    "extracted_text",
+    "summarized_text",
+    "redacted_url",
+    "pdf_url",
+    "operation",
+    "meta",
+)
+
+
+def build_insert(row_count):
+    """Multi-row INSERT for `row_count` history rows."""
+    placeholders = "(" + ",".join(["%s"] * len(HISTORY_COLUMNS)) + ")"
+    return (
+        f"INSERT INTO documents ({', '.join(HISTORY_COLUMNS)}) VALUES "
+        + ",".join([placeholders] * row_count)
+    )
+
+
+class HistoryWriter:
+    """
+    Batches document history rows into multi-row inserts.
+
+    Args:
+        batch_size: Rows per INSERT; a full batch is written immediately
+        flush_interval: Seconds a partial batch may wait before it is written
+        max_retries: Attempts per batch on transient errors before its rows are dropped (and logged)
+        retry_backoff: Seconds before the first retry; doubles on each retry
+        max_queue: Rows held in memory; beyond this submit() writes inline
+        synchronous: Write every row inside submit()
+    """
+
+    thread_name = "history-writer"
+    # Errors worth retrying a write for; anything else is a problem with the rows
+    transient_errors = db.TRANSIENT_ERRORS
+
+    def __init__(self, batch_size=50, flush_interval=1.0, max_retries=3, retry_backoff=0.5,
+                 max_queue=10000, synchronous=False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.synchronous = synchronous
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def submit(self, email, file_name=None, file_url=None, document_type=None,
+               confidence=None, extracted_text=None, summarized_text=None,
+               redacted_url=None, pdf_url=None, operation=None, meta=None):
+        """Queue one history row (or write it now in synchronous mode)."""
+        row = (
+            email,
+            file_name,
+            file_url,
+            document_type,
+            confidence,
+            extracted_text,
+            summarized_text,
+            redacted_url,
+            pdf_url,
+            operation,
+            json.dumps(meta) if meta is not None else None,
+        )
+        # Counted on the day the document was processed, not the day it is flushed
+        return self._enqueue((row, today()))
+
+    def _enqueue(self, item):
+        if self.synchronous:
+            return self._write_with_retry([item])
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            print("[WARNING] History queue full, writing row inline")
+            return self._write_with_retry([item])
+        return True
+
+    def flush(self, timeout=None):
+        """Block until every queued row has been written (or dropped after retries)."""
+        if self._thread is None:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    print(f"[WARNING] History flush timed out with {self._queue.unfinished_tasks} rows pending")
+                    return
+                self._queue.all_tasks_done.wait(remaining)
+
+    def close(self, timeout=10):
+        """Write out everything queued and stop the background thread."""
+        self.flush(timeout)
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+
+    # -----------------------------------------------------------------
+    # Background thread
+    # -----------------------------------------------------------------
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            batch_deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = batch_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_with_retry(self, items):
+        delay = self.retry_backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self._write(items)
+                return True
+            except self.transient_errors as e:
+                print(f"[WARNING] History write of {len(items)} rows failed (attempt {attempt}/{self.max_retries}): {e}")
+                if attempt < self.max_retries:
+                    time.sleep(delay)
+                    delay *= 2
+            except Exception as e:
+                if len(items) == 1:
+                    print(f"[ERROR] Dropping history row that cannot be written: {e}")
+                    return False
+                print(f"[WARNING] History write of {len(items)} rows failed ({e}), writing them one at a time")
+                return all([self._write_with_retry([item]) for item in items])
+
+        print(f"[ERROR] Dropping {len(items)} history rows after {self.max_retries} attempts")
+        return False
+
+    def _write(self, items):
+        rows = [row for row, _ in items]
+        params = [value for row in rows for value in row]
+        # (email, document_type, operation, day) per row
+        counters = count_rows((row[0], row[3], row[9], day) for row, day in items)
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute(build_insert(len(rows)), params)
+            cur.execute("SAVEPOINT document_stats")
+            try:
+                increment_stats(cur, counters)
+            except Exception as e:
+                # e.g. `manage.py ensure_schema` not run yet; `--rebuild-stats` repairs the counters
+                cur.execute("ROLLBACK TO SAVEPOINT document_stats")
+                print(f"[WARNING] Statistics counters skipped for {len(rows)} history rows: {e}")
+            else:
+                cur.execute("RELEASE SAVEPOINT document_stats")
+            con.commit()
+
+
+# =====================================================================
+# MODULE-LEVEL WRITER
+# =====================================================================
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process-wide writer, configured from settings.HISTORY_WRITER on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = settings.HISTORY_WRITER
+                _writer = HistoryWriter(
+                    batch_size=config["BATCH_SIZE"],
+                    flush_interval=config["FLUSH_INTERVAL"],
+                    max_retries=config["MAX_RETRIES"],
+                    synchronous=config["SYNCHRONOUS"],
+                )
+                atexit.register(_writer.close)
+    return _writer
+
+
+def set_writer(writer):
+    """Replace the process-wide writer (e.g. with a synchronous one in tests). Returns the old one."""
+    global _writer
+    with _writer_lock:
+        previous, _writer = _writer, writer
+    return previous
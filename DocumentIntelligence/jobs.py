@@ -0,0 +1,367 @@
+# DocumentIntelligence/jobs.py
+"""
+Database-backed job queue for OCR, classification and conversions.
+
+enqueue() stores the upload (content-addressed, see storage.py) and inserts
+a queued Job row; worker processes started by `manage.py run_workers` claim
+the queued job of their type with the lowest finish tag with a conditional
+UPDATE (so two workers never run the same job), run it through
+processing.py and store the result on the row. No broker is needed: the
+queue is the jobs table.
+
+Finish tags come from weighted fair queueing per submitter (see FAIR
+QUEUEING below), so one user's 500-page conversion does not hold up
+everyone else's single scans.
+
+Running jobs send a heartbeat; jobs whose worker died are put back in the
+queue by requeue_stale() (up to MAX_ATTEMPTS claims) and failed after that.
+"""
+
+import datetime
+import os
+import shutil
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .bulk import DOCUMENT_EXTENSIONS
+from .models import Blob, Job
+from .pipeline import LatencyBudget, summarize_text_stream
+from .processing import (
+    classify_document,
+    convert_document,
+    media_url,
+    ocr_document,
+    record_classification,
+    save_document_entry,
+)
+from .storage import acquire_blob, blob_path, blob_url, release_blob
+from file_conversions.cancellation import CancellationToken, OperationCancelled
+from file_conversions.conversions import PdfReader
+
+HANDLERS = {}
+
+
+def handler(job_type):
+    """Register the function that runs jobs of `job_type`: func(job, blob, cancel_token) -> result dict."""
+    def register(func):
+        HANDLERS[job_type] = func
+        return func
+    return register
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# =====================================================================
+# HANDLERS
+# =====================================================================
+
+@handler("ocr")
+def run_ocr_job(job, blob, cancel_token):
+    # Background jobs are not bound by a response-time budget, only by the hard timeout
+    budget = LatencyBudget(None, cancel_token)
+    result = ocr_document(blob, budget)
+    summary = result["summarized_text"]
+    if result["stream_summary"]:
+        # Cached from a request that streamed its summary to the browser
+        summary = "".join(summarize_text_stream(result["corrected_text"], max_length=150, min_length=50)).strip()
+
+    if job.email:
+        acquire_blob(blob.digest)
+        save_document_entry(
+            email=job.email,
+            file_name=job.payload["file_name"],
+            file_url=blob_url(blob),
+            document_type=result["document_type"],
+            confidence=result["confidence"],
+            extracted_text=result["corrected_text"],
+            summarized_text=summary,
+            operation='ocr',
+        )
+    return {
+        "extracted_text": result["corrected_text"],
+        "summarized_text": summary,
+        "document_type": result["document_type"],
+        "confidence": result["confidence"],
+        "file_url": blob_url(blob),
+    }
+
+
+@handler("classification")
+def run_classification_job(job, blob, cancel_token):
+    result = classify_document(blob, LatencyBudget(None, cancel_token))
+    linked_entities = {}
+    if job.email:
+        linked_entities = record_classification(job.email, blob, job.payload["file_name"], result)
+    return {
+        "extracted_text": result["extracted_text"],
+        "summarized_text": result["summarized_text"],
+        "document_type": result["document_type"],
+        "confidence": result["confidence"],
+        "extracted_fields": result["extracted_fields"],
+        "linked_entities": linked_entities,
+        "file_url": blob_url(blob),
+        "redacted_url": result["redacted_url"],
+        "pdf_url": result["pdf_url"],
+    }
+
+
+class ProgressRecorder:
+    """
+    Conversion progress callback that stores {"page", "pages", "outputs"} on the job row.
+
+    Page images (PDF to JPG) are kept next to the input blob as
+    <digest>_page_<n>.jpg, like the other derived outputs, so clients can
+    download them while the rest is still rendering.
+    """
+
+    def __init__(self, job, blob, interval):
+        self.job = job
+        self.blob = blob
+        self.interval = interval
+        self.outputs = []
+        self.last_saved = 0.0
+
+    def __call__(self, page, pages, page_path=None):
+        if page_path:
+            path = os.path.join(os.path.dirname(blob_path(self.blob)), f"{self.blob.digest}_page_{page}.jpg")
+            shutil.copyfile(page_path, path)
+            self.outputs.append(media_url(path))
+        # Partial outputs and the last page are always saved, plain page counts at most every `interval`
+        now = time.monotonic()
+        if page_path or page == pages or now - self.last_saved >= self.interval:
+            self.last_saved = now
+            Job.objects.filter(pk=self.job.pk).update(
+                progress={"page": page, "pages": pages, "outputs": self.outputs})
+
+
+@handler("convert")
+def run_convert_job(job, blob, cancel_token):
+    progress = ProgressRecorder(job, blob, settings.JOB_QUEUE["PROGRESS_INTERVAL"])
+    output_blob, filename = convert_document(
+        blob, job.payload["file_name"], job.payload["target_format"], cancel_token, progress)
+    return {"file_url": blob_url(output_blob), "filename": filename, "size": output_blob.size}
+
+
+# =====================================================================
+# FAIR QUEUEING
+# =====================================================================
+# Self-clocked weighted fair queueing, per job type. Each job gets a finish
+# tag = start + cost / weight, where start is the finish tag of the
+# submitter's last queued or running job, or the current virtual time if
+# they have none. Workers claim the lowest finish tag. The virtual time is
+# the finish tag of the job claimed last, so it keeps moving: a big job is
+# reached after about its own cost in other users' work, while a single scan
+# from an idle user goes near the front. Anonymous jobs share one queue.
+
+def estimate_cost(blob, file_name):
+    """Work estimate in pages: page count for PDFs, 1 for images, file size otherwise."""
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext in DOCUMENT_EXTENSIONS:
+        return 1.0
+    if ext == ".pdf":
+        try:
+            return float(max(1, len(PdfReader(blob_path(blob)).pages)))
+        except Exception as e:
+            print(f"[WARNING] Could not count pages of {file_name}, estimating from size: {e}")
+    return max(1.0, blob.size / settings.JOB_QUEUE["BYTES_PER_PAGE"])
+
+
+def virtual_time(job_type):
+    """Finish tag of the last claimed job of this type."""
+    last = (
+        Job.objects.filter(job_type=job_type, started_at__isnull=False)
+        .order_by("-started_at")
+        .values_list("finish_tag", flat=True)
+        .first()
+    )
+    return last or 0.0
+
+
+def finish_tag(job_type, email, cost):
+    backlog = (
+        Job.objects.filter(job_type=job_type, email=email, status__in=[Job.QUEUED, Job.RUNNING])
+        .aggregate(last=Max("finish_tag"))["last"]
+    )
+    start = max(virtual_time(job_type), backlog or 0.0)
+    weight = settings.JOB_QUEUE["USER_WEIGHTS"].get(email, 1.0)
+    return start + cost / weight
+
+
+# =====================================================================
+# QUEUE
+# =====================================================================
+
+def enqueue(job_type, blob, file_name, email="", cost=None, **options):
+    """
+    Queue a job for a stored upload.
+
+    Args:
+        job_type: One of HANDLERS
+        blob: Stored input (the job holds a reference on it until it finishes)
+        file_name: Original upload name
+        email: Submitter's session email ("" for anonymous)
+        cost: Work estimate in pages (default: estimate_cost())
+        options: Extra payload, e.g. target_format for conversions
+    """
+    if job_type not in HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    email = email or ""
+    cost = estimate_cost(blob, file_name) if cost is None else cost
+    acquire_blob(blob.digest)
+    job = Job.objects.create(
+        job_type=job_type,
+        email=email,
+        payload={"digest": blob.digest, "file_name": file_name, **options},
+        cost=cost,
+        finish_tag=finish_tag(job_type, email, cost),
+    )
+    print(f"[INFO] Queued {job_type} job {job.id} (cost {cost:.0f})")
+    return job
+
+
+def claim(job_types, worker=None, candidates=10):
+    """
+    Take the queued job of the given types with the lowest finish tag, or None.
+
+    The status check in the UPDATE makes the claim atomic on every database,
+    so workers can race for the same row safely.
+    """
+    worker = worker or worker_name()
+    queued = (
+        Job.objects.filter(status=Job.QUEUED, job_type__in=job_types)
+        .order_by("finish_tag", "created_at")
+        .values_list("pk", flat=True)
+    )
+    for job_id in queued[:candidates]:
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+class Heartbeat:
+    """Updates a running job's heartbeat_at from a background thread."""
+
+    def __init__(self, job, interval):
+        self.job = job
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job.pk}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                Job.objects.filter(pk=self.job.pk, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+        finally:
+            close_old_connections()
+
+
+def _finish(job, status, result=None, error=""):
+    Job.objects.filter(pk=job.pk).update(status=status, result=result, error=error, finished_at=timezone.now())
+    release_blob(job.payload["digest"])
+
+
+def run_job(job):
+    """Run a claimed job and store its result or error."""
+    config = settings.JOB_QUEUE
+    print(f"[INFO] Running {job.job_type} job {job.id} (attempt {job.attempts})")
+    started = time.monotonic()
+    try:
+        blob = Blob.objects.get(pk=job.payload["digest"])
+        cancel_token = CancellationToken.with_timeout(config["JOB_TIMEOUT"])
+        with Heartbeat(job, config["HEARTBEAT_INTERVAL"]):
+            result = HANDLERS[job.job_type](job, blob, cancel_token)
+    except OperationCancelled:
+        print(f"[WARNING] Job {job.id} timed out after {config['JOB_TIMEOUT']}s")
+        _finish(job, Job.FAILED, error=f"Timed out after {config['JOB_TIMEOUT']} seconds")
+        return False
+    except Exception as e:
+        print(f"[ERROR] Job {job.id} failed: {e}")
+        import traceback
+        traceback.print_exc()
+        _finish(job, Job.FAILED, error=str(e))
+        return False
+
+    _finish(job, Job.SUCCEEDED, result=result)
+    print(f"[SUCCESS] Job {job.id} finished in {time.monotonic() - started:.1f}s")
+    return True
+
+
+def requeue_stale(stale_after=None):
+    """
+    Put back jobs whose worker stopped sending heartbeats.
+
+    Returns:
+        (requeued, failed) counts
+    """
+    config = settings.JOB_QUEUE
+    stale_after = config["STALE_AFTER"] if stale_after is None else stale_after
+    cutoff = timezone.now() - datetime.timedelta(seconds=stale_after)
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff)
+
+    requeued = stale.filter(attempts__lt=config["MAX_ATTEMPTS"]).update(
+        status=Job.QUEUED, worker="", started_at=None, heartbeat_at=None
+    )
+    failed = 0
+    for job in stale:
+        # Gave up after MAX_ATTEMPTS claims; the job itself probably kills its worker
+        if Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+                status=Job.FAILED, error="Worker stopped responding", finished_at=timezone.now()):
+            release_blob(job.payload["digest"])
+            failed += 1
+
+    if requeued or failed:
+        print(f"[WARNING] Stale jobs: {requeued} requeued, {failed} failed")
+    return requeued, failed
+
+
+def work(job_types, worker=None, stop_event=None, burst=False, poll_interval=None):
+    """
+    Worker loop: claim and run jobs until stopped.
+
+    Args:
+        job_types: Job types this worker takes
+        stop_event: threading/multiprocessing Event checked between jobs
+        burst: Return once the queue is empty instead of polling
+        poll_interval: Seconds to sleep when the queue is empty
+
+    Returns:
+        Number of jobs run
+    """
+    worker = worker or worker_name()
+    poll_interval = settings.JOB_QUEUE["POLL_INTERVAL"] if poll_interval is None else poll_interval
+    processed = 0
+    while not (stop_event and stop_event.is_set()):
+        close_old_connections()
+        job = claim(job_types, worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
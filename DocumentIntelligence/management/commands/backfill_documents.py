@@ -0,0 +1,56 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from DocumentIntelligence import db
+from DocumentIntelligence.backfill import get_checkpoint, reset_checkpoint, run_backfill
+from DocumentIntelligence.cpu_budget import init_pool_process
+from DocumentIntelligence.schema import missing_tables
+
+
+class Command(BaseCommand):
+    help = ("Rerun classification and field extraction on the stored text of every history row and update "
+            "the rows whose result changed. Interrupt at any time; the next run resumes from the checkpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--name", default="classification",
+                            help="Checkpoint name; use a new one for a fresh pass after another change "
+                                 "(default: classification)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: every core this machine gives us)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per batch and transaction (default 500)")
+        parser.add_argument("--restart", action="store_true", help="Start again from the first row")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Count the rows that would change without writing anything")
+
+    def handle(self, *args, **options):
+        name = options["name"]
+        missing = missing_tables(db.get_pool(), ["documents", "document_stats", "backfill_checkpoints"])
+        if missing:
+            raise CommandError(f"Missing tables: {', '.join(missing)}. Run `manage.py ensure_schema` first.")
+        if options["restart"] and not options["dry_run"]:
+            reset_checkpoint(name)
+        last_id, updated = get_checkpoint(name)
+        if last_id:
+            self.stdout.write(f"Resuming {name} after id {last_id} ({updated} rows updated so far)")
+
+        workers = options["workers"] or settings.CPU_BUDGET["cores"]
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_pool_process,
+            initargs=(workers,),
+        )
+        try:
+            counts = run_backfill(executor, name, batch_size=options["batch_size"], dry_run=options["dry_run"])
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stdout.write(self.style.WARNING("Interrupted: run the same command again to resume"))
+            return
+        executor.shutdown()
+
+        verb = "would change" if options["dry_run"] else "updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['scanned']} rows scanned, {counts['updated']} {verb} ({counts['rows_per_second']} rows/s)"))
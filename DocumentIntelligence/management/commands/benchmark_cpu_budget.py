@@ -0,0 +1,128 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from DocumentIntelligence import cpu_budget
+
+
+def parse_splits(value):
+    """"4:1,2:2" -> [(4, 1), (2, 2)] as (parallel OCR, torch threads)"""
+    splits = []
+    for part in filter(None, value.split(",")):
+        ocr, _, torch_threads = part.partition(":")
+        if not (ocr.isdigit() and torch_threads.isdigit()) or not int(ocr) or not int(torch_threads):
+            raise CommandError(f"Invalid split {part!r}; expected <parallel OCR>:<torch threads>")
+        splits.append((int(ocr), int(torch_threads)))
+    return splits
+
+
+def p95(values):
+    """95th percentile (nearest rank) of a list of seconds; None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def pick_split(results, latency_budget):
+    """
+    Fastest split whose p95 latency fits the budget.
+
+    Returns:
+        (result, within_budget); when no split fits, the one with the lowest latency
+    """
+    within = [r for r in results if r["p95_seconds"] <= latency_budget]
+    if within:
+        return max(within, key=lambda r: r["docs_per_second"]), True
+    return min(results, key=lambda r: r["p95_seconds"]), False
+
+
+def default_splits(per_process):
+    counts = sorted({1, max(1, per_process // 2), per_process})
+    return [(ocr, torch_threads) for ocr in counts for torch_threads in counts]
+
+
+class Command(BaseCommand):
+    help = ("Measure OCR throughput and p95 latency for different splits of this process's cores "
+            "between parallel Tesseract runs and torch threads, and pick the fastest split within the "
+            "latency budget.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("image", help="Sample scan to OCR")
+        parser.add_argument("--documents", type=int, default=8, help="OCR runs per split (default 8)")
+        parser.add_argument("--summaries", type=int, default=2,
+                            help="Summaries generated alongside the OCR runs (default 2)")
+        parser.add_argument("--splits", default="",
+                            help="Splits to try as <parallel OCR>:<torch threads>, e.g. 4:1,2:2 "
+                                 "(default: combinations of 1, half and all of the per-process cores)")
+        parser.add_argument("--latency-budget", type=float, default=None,
+                            help="Seconds a document may take at p95, OCR plus summary "
+                                 "(default: PIPELINE_LATENCY_BUDGET)")
+
+    def handle(self, *args, **options):
+        # Imported here: the pipeline applies the CPU budget on import
+        from DocumentIntelligence.pipeline import (
+            get_summarizer, ocr_image_to_string, summarize_text, upscale_image_opencv,
+        )
+
+        budget = settings.CPU_BUDGET
+        splits = parse_splits(options["splits"]) or default_splits(budget["per_process"])
+        self.stdout.write(f"{budget['cores']} cores, {budget['processes']} processes, "
+                          f"{budget['per_process']} per process; {options['documents']} documents per split")
+
+        # Text to summarize: OCR of the sample itself (or the summary stage is skipped)
+        text = ocr_image_to_string(upscale_image_opencv(options["image"]))
+        if options["summaries"] and (len(text.strip()) <= 100 or not get_summarizer()):
+            self.stdout.write("Summarizer unavailable or sample too short: measuring OCR only")
+            options["summaries"] = 0
+
+        def ocr_one(_):
+            started = time.monotonic()
+            ocr_image_to_string(upscale_image_opencv(options["image"]))
+            return time.monotonic() - started
+
+        def summarize_all():
+            latencies = []
+            for _ in range(options["summaries"]):
+                started = time.monotonic()
+                summarize_text(text)
+                latencies.append(time.monotonic() - started)
+            return latencies
+
+        results = []
+        for ocr_parallel, torch_threads in splits:
+            cpu_budget.apply({**budget, "tesseract_parallel": ocr_parallel, "torch_threads": torch_threads})
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=1) as side, ThreadPoolExecutor(max_workers=ocr_parallel) as pool:
+                summaries = side.submit(summarize_all)
+                ocr_latencies = list(pool.map(ocr_one, range(options["documents"])))
+                ocr_seconds = time.monotonic() - started
+                latencies = summaries.result()
+            result = {
+                "split": (ocr_parallel, torch_threads),
+                "docs_per_second": options["documents"] / ocr_seconds,
+                "summary_seconds": sum(latencies) / len(latencies) if latencies else None,
+                # A document waits for its OCR and then its summary
+                "p95_seconds": p95(ocr_latencies) + (p95(latencies) or 0.0),
+            }
+            results.append(result)
+            summary = f"{result['summary_seconds']:.2f}s" if latencies else "-"
+            self.stdout.write(f"  OCR x{ocr_parallel:<3} torch x{torch_threads:<3} "
+                              f"{result['docs_per_second']:6.2f} docs/s   summary {summary:>6}   "
+                              f"p95 {result['p95_seconds']:.2f}s")
+
+        # Restore the configured split
+        cpu_budget.apply(budget)
+
+        latency_budget = options["latency_budget"] or settings.PIPELINE_LATENCY_BUDGET
+        best, within_budget = pick_split(results, latency_budget)
+        ocr_parallel, torch_threads = best["split"]
+        setting = f"CPU_BUDGET_TESSERACT_PARALLEL={ocr_parallel} CPU_BUDGET_TORCH_THREADS={torch_threads}"
+        if within_budget:
+            self.stdout.write(self.style.SUCCESS(f"Best throughput within {latency_budget:g}s p95: {setting}"))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"No split keeps p95 latency within {latency_budget:g}s; lowest latency: {setting}"))
@@ -0,0 +1,118 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from DocumentIntelligence.cpu_budget import init_pool_process
+from DocumentIntelligence.shared_images import SharedImage, free, release, share_image
+
+MODES = ["single", "threads", "processes", "pickled", "shared"]
+
+
+def run_document(file_path, image, timeout, transfer_only):
+    """
+    One benchmark document. `image` is None (read the file here), the
+    decoded pixels (pickled to the worker) or a SharedImage.
+    """
+    block = None
+    if isinstance(image, SharedImage):
+        block, image = image.attach()
+    try:
+        if transfer_only:
+            # Touch every pixel, as OCR would
+            image = cv2.imread(file_path) if image is None else image
+            return int(image.sum())
+        # Imported here: the worker loads the models on its first document
+        from DocumentIntelligence.bulk import LatencyBudget, classify_file, CancellationToken
+        budget = LatencyBudget(None, CancellationToken.with_timeout(timeout))
+        return classify_file(file_path, budget, image=image)["document_type"]
+    finally:
+        if block is not None:
+            del image
+            release(block)
+
+
+class Command(BaseCommand):
+    help = ("Compare the bulk classification pipeline run in one process, on threads, and on a process pool "
+            "that gets file paths, pickled images or shared memory handles.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("images", nargs="+", help="Sample scans (repeated up to --documents)")
+        parser.add_argument("--documents", type=int, default=16, help="Documents per mode (default 16)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Threads / processes (default: BULK_CLASSIFICATION WORKERS)")
+        parser.add_argument("--modes", default=",".join(MODES), help=f"Modes to run (default {','.join(MODES)})")
+        parser.add_argument("--transfer-only", action="store_true",
+                            help="Replace the pipeline by a pass over the pixels to measure the hand-off alone "
+                                 "(needs neither Tesseract nor the models)")
+
+    def handle(self, *args, **options):
+        modes = [mode for mode in options["modes"].split(",") if mode]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}; choose from {', '.join(MODES)}")
+        for path in options["images"]:
+            if cv2.imread(path) is None:
+                raise CommandError(f"OpenCV cannot read {path}")
+
+        workers = options["workers"] or settings.BULK_CLASSIFICATION["WORKERS"]
+        timeout = settings.BULK_CLASSIFICATION["DOCUMENT_TIMEOUT"]
+        transfer_only = options["transfer_only"]
+        paths = [options["images"][i % len(options["images"])] for i in range(options["documents"])]
+        self.stdout.write(f"{len(paths)} documents, {workers} workers, "
+                          f"{'hand-off only' if transfer_only else 'full pipeline'}")
+
+        pool = None
+        if {"processes", "pickled", "shared"} & set(modes):
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_pool_process,
+                initargs=(settings.CPU_BUDGET["processes"] * workers,),
+            )
+            # Start the workers (and load the models) before anything is timed
+            list(pool.map(run_document, [paths[0]] * workers, [None] * workers, [timeout] * workers,
+                          [transfer_only] * workers))
+
+        results = {}
+        try:
+            for mode in modes:
+                started = time.monotonic()
+                if mode == "single":
+                    for path in paths:
+                        run_document(path, None, timeout, transfer_only)
+                elif mode == "threads":
+                    with ThreadPoolExecutor(max_workers=workers) as threads:
+                        list(threads.map(lambda path: run_document(path, None, timeout, transfer_only), paths))
+                else:
+                    self.run_on_pool(pool, mode, paths, timeout, transfer_only)
+                results[mode] = len(paths) / (time.monotonic() - started)
+                self.stdout.write(f"  {mode:<10} {results[mode]:8.2f} docs/s")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        best = max(results, key=results.get)
+        self.stdout.write(self.style.SUCCESS(f"Fastest: {best}"))
+
+    @staticmethod
+    def run_on_pool(pool, mode, paths, timeout, transfer_only):
+        """Decoding in this process counts towards the pickled and shared modes, as it does in classify_bulk()."""
+        futures, blocks = [], []
+        try:
+            for path in paths:
+                image = None
+                if mode == "pickled":
+                    image = cv2.imread(path)
+                elif mode == "shared":
+                    block, image = share_image(path)
+                    blocks.append(block)
+                futures.append(pool.submit(run_document, path, image, timeout, transfer_only))
+            for future in futures:
+                future.result()
+        finally:
+            for block in blocks:
+                free(block)
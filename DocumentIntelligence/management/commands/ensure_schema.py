@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from DocumentIntelligence import db
+from DocumentIntelligence.schema import ensure_schema
+from DocumentIntelligence.stats import rebuild_document_stats
+
+
+class Command(BaseCommand):
+    help = ("Create the raw-SQL tables, columns and indexes the database is missing (run on every deploy, "
+            "after migrate). Safe to run again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild-stats", action="store_true",
+                            help="Also recompute document_stats from the documents table (first deploy of "
+                                 "the counters, or after counter updates were skipped)")
+
+    def handle(self, *args, **options):
+        pool = db.get_pool()
+        ensure_schema(pool)
+        self.stdout.write(self.style.SUCCESS(f"Schema up to date ({pool.vendor})"))
+
+        if options["rebuild_stats"]:
+            counters = rebuild_document_stats()
+            self.stdout.write(f"Rebuilt {counters} statistics counters")
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from DocumentIntelligence.batch import run_batch
+from DocumentIntelligence.cpu_budget import init_pool_process
+
+
+class Command(BaseCommand):
+    help = ("OCR, classify and extract fields from every image and PDF under a directory on a process pool, "
+            "writing one JSONL record per file. Rerunning with the same output resumes where it stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Folder to walk (recursively)")
+        parser.add_argument("--output", default=None,
+                            help="JSONL results file, also the checkpoint (default: <directory>/results.jsonl)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: every core this machine gives us, "
+                                 "half of them with --summarize)")
+        parser.add_argument("--redact", metavar="FOLDER", default=None,
+                            help="Redact sensitive documents into FOLDER (default: no redaction)")
+        parser.add_argument("--summarize", action="store_true",
+                            help="Also run the abstractive summary and the PDF report (slow)")
+        parser.add_argument("--timeout", type=float, default=None,
+                            help="Seconds allowed per page (default: BULK_CLASSIFICATION DOCUMENT_TIMEOUT)")
+        parser.add_argument("--retry-errors", action="store_true",
+                            help="Process files that failed in an earlier run again")
+        parser.add_argument("--restart", action="store_true",
+                            help="Discard the results file and start over")
+
+    def handle(self, *args, **options):
+        root = options["directory"]
+        if not os.path.isdir(root):
+            raise CommandError(f"{root} is not a directory")
+        output_path = options["output"] or os.path.join(root, "results.jsonl")
+        if options["restart"] and os.path.exists(output_path):
+            os.remove(output_path)
+
+        # This command has the machine to itself: one worker per core by default.
+        # Summarizing workers each load their own copy of the model and run torch
+        # on two threads, so only half as many of them fit.
+        cores = settings.CPU_BUDGET["cores"]
+        workers = options["workers"] or (max(1, cores // 2) if options["summarize"] else cores)
+        timeout = options["timeout"] or settings.BULK_CLASSIFICATION["DOCUMENT_TIMEOUT"]
+
+        def start_pool():
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                # Each worker gets 1/workers of the cores for Tesseract and torch
+                initializer=init_pool_process,
+                initargs=(workers,),
+            )
+
+        pools = [start_pool()]
+
+        def reset_pool():
+            pools[-1].shutdown(wait=False, cancel_futures=True)
+            pools.append(start_pool())
+            return pools[-1]
+
+        self.stdout.write(f"Processing {root} with {workers} workers into {output_path}")
+        try:
+            counts = run_batch(
+                root, output_path, pools[0], timeout,
+                redact_dir=options["redact"],
+                summarize=options["summarize"],
+                retry_errors=options["retry_errors"],
+                reset_executor=reset_pool,
+            )
+        except KeyboardInterrupt:
+            pools[-1].shutdown(wait=False, cancel_futures=True)
+            self.stdout.write(self.style.WARNING("Interrupted: run the same command again to resume"))
+            return
+        pools[-1].shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['succeeded']} processed, {counts['failed']} failed, {counts['skipped']} already done "
+            f"({counts['files_per_second']} files/s)"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from DocumentIntelligence.action_log import prune_actions
+
+
+class Command(BaseCommand):
+    help = "Delete UserActionHistory rows older than the retention period (run daily from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None,
+                            help="Keep this many days (default: ACTION_LOG['RETENTION_DAYS'])")
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Rows deleted per statement")
+
+    def handle(self, *args, **options):
+        deleted = prune_actions(days=options["days"], batch_size=options["batch_size"])
+        self.stdout.write(f"Deleted {deleted} actions")
@@ -0,0 +1,88 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from DocumentIntelligence import cpu_budget
+from DocumentIntelligence.jobs import HANDLERS, requeue_stale, work
+
+
+def _worker_main(job_types, burst, processes):
+    # Workers run one job at a time; the cores are shared by all of them
+    cpu_budget.apply(cpu_budget.plan(processes=processes))
+    stop = multiprocessing.Event()
+    # Finish the current job on SIGTERM, then exit
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    work(job_types, stop_event=stop, burst=burst)
+
+
+def parse_workers(value):
+    """"ocr=2,convert=1" -> {"ocr": 2, "convert": 1}"""
+    workers = {}
+    for part in filter(None, value.split(",")):
+        job_type, _, count = part.partition("=")
+        if job_type not in HANDLERS or not count.isdigit():
+            raise CommandError(f"Invalid worker spec {part!r}; expected <type>=<count> with type in {sorted(HANDLERS)}")
+        workers[job_type] = int(count)
+    return workers
+
+
+class Command(BaseCommand):
+    help = "Run background job workers (OCR, classification, conversions) from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", default="",
+                            help="Processes per job type, e.g. ocr=2,convert=1 (default: JOB_QUEUE['WORKERS'])")
+        parser.add_argument("--burst", action="store_true",
+                            help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        workers = dict(settings.JOB_QUEUE["WORKERS"])
+        workers.update(parse_workers(options["workers"]))
+
+        requeue_stale()
+
+        def start(job_type):
+            # Children must open their own database connections
+            connections.close_all()
+            process = multiprocessing.Process(target=_worker_main,
+                                              args=([job_type], options["burst"], sum(workers.values())),
+                                              name=f"worker-{job_type}")
+            process.start()
+            return process
+
+        processes = [(job_type, start(job_type)) for job_type, count in workers.items() for _ in range(count)]
+        self.stdout.write(f"Started {len(processes)} workers: " +
+                          ", ".join(f"{job_type}={count}" for job_type, count in workers.items()))
+
+        stopping = False
+
+        def stop(*args):
+            nonlocal stopping
+            stopping = True
+            for _, process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        last_check = time.monotonic()
+        while not (stopping or options["burst"]) or any(process.is_alive() for _, process in processes):
+            time.sleep(1)
+            if stopping or options["burst"]:
+                continue
+            # Replace crashed workers; their job is picked up again by requeue_stale()
+            for i, (job_type, process) in enumerate(processes):
+                if not process.is_alive():
+                    print(f"[WARNING] {job_type} worker exited with code {process.exitcode}, restarting")
+                    processes[i] = (job_type, start(job_type))
+            if time.monotonic() - last_check >= settings.JOB_QUEUE["STALE_AFTER"] / 2:
+                requeue_stale()
+                last_check = time.monotonic()
+
+        self.stdout.write("Workers stopped")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from DocumentIntelligence.storage import sweep_unreferenced_blobs
+
+
+class Command(BaseCommand):
+    help = "Delete stored blobs nothing referenced within their grace period, e.g. anonymous uploads (run daily from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=int, default=None,
+                            help="Age after which unreferenced blobs are deleted "
+                                 "(default: UNREFERENCED_BLOB_GRACE_HOURS)")
+
+    def handle(self, *args, **options):
+        swept = sweep_unreferenced_blobs(grace_hours=options["grace_hours"])
+        self.stdout.write(f"Deleted {swept} unreferenced blobs")
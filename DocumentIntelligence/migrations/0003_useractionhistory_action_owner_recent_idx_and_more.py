@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DocumentIntelligence', '0002_blob_documentfile_blob_processingresult'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useractionhistory',
+            index=models.Index(fields=['owner', '-created_at'], name='action_owner_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractionhistory',
+            index=models.Index(fields=['created_at'], name='action_created_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DocumentIntelligence', '0004_job'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='job',
+            name='job_claim_idx',
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='cost',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='finish_tag',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['job_type', 'status', 'finish_tag'], name='job_claim_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['job_type', 'started_at'], name='job_vtime_idx'),
+        ),
+    ]
@@ -1,20 +1,30 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
 from django.conf import settings
 from django.utils import timezone
 import os
+import uuid
 
 User = settings.AUTH_USER_MODEL
 
 def user_file_upload_path(instance, filename):
     # Save files under MEDIA_ROOT/user_<id>/<folder_id or root>/<filename>
-    folder_part = f"folder_{instance.folder.id}" if instance.folder else "root"
-    return os.path.join(f"user_{instance.owner.id}", folder_part, filename)
+    # (uses the raw ids so no extra query runs per upload)
+    folder_part = f"folder_{instance.folder_id}" if instance.folder_id else "root"
+    return os.path.join(f"user_{instance.owner_id}", folder_part, filename)
 
 class Folder(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="folders")
     name = models.CharField(max_length=255)
     parent = models.ForeignKey("self", null=True, blank=True, on_delete=models.CASCADE, related_name="children")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Materialized path of ancestor ids including this folder, e.g. "/3/17/42/".
+    # Maintained by save(); a subtree is every folder whose tree_path starts with ours.
+    tree_path = models.CharField(max_length=1024, db_index=True, editable=False, default="")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ("owner", "parent", "name")
@@ -23,14 +33,74 @@ class Folder(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember where the folder was loaded from so save() can detect a move
+        instance._loaded_parent_id = instance.__dict__.get("parent_id")
+        instance._loaded_tree_path = instance.__dict__.get("tree_path")
+        return instance
+
+    def save(self, *args, **kwargs):
+        parent_path = self.parent.tree_path if self.parent_id else "/"
+        if self.pk and self.tree_path.startswith("/") and parent_path.startswith(self.tree_path):
+            raise ValueError("A folder cannot be moved into its own subtree")
+
+        with transaction.atomic():
+            creating = self.pk is None
+            super().save(*args, **kwargs)
+
+            old_path = getattr(self, "_loaded_tree_path", None)
+            new_path = f"{parent_path}{self.pk}/"
+            if creating or old_path != new_path:
+                self.tree_path = new_path
+                self.depth = new_path.count("/") - 2
+                Folder.objects.filter(pk=self.pk).update(tree_path=new_path, depth=self.depth)
+
+                if not creating and old_path:
+                    # Re-root every descendant in one UPDATE
+                    Folder.objects.filter(tree_path__startswith=old_path).exclude(pk=self.pk).update(
+                        tree_path=Concat(Value(new_path), Substr("tree_path", len(old_path) + 1)),
+                        depth=F("depth") + (self.depth - (old_path.count("/") - 2)),
+                    )
+
+        self._loaded_parent_id = self.parent_id
+        self._loaded_tree_path = self.tree_path
+
+    def ancestor_ids(self):
+        return [int(part) for part in self.tree_path.strip("/").split("/") if part]
+
+    def subtree(self):
+        """This folder and every folder below it (one indexed prefix query)."""
+        return Folder.objects.filter(owner_id=self.owner_id, tree_path__startswith=self.tree_path)
+
+    def breadcrumbs(self):
+        """Folders from the root down to this one (one query)."""
+        return list(Folder.objects.filter(pk__in=self.ancestor_ids()).order_by("depth"))
+
     def path(self):
         # e.g. "Invoices/2025/April"
-        parts = []
-        cur = self
-        while cur:
-            parts.append(cur.name)
-            cur = cur.parent
-        return "/".join(reversed(parts))
+        return "/".join(folder.name for folder in self.breadcrumbs())
+
+    def subtree_size(self):
+        """Total size in bytes of the files in this folder and all its subfolders (one query)."""
+        total = DocumentFile.objects.filter(
+            owner_id=self.owner_id, folder__tree_path__startswith=self.tree_path
+        ).aggregate(total=Sum("size"))["total"]
+        return total or 0
+
+class Blob(models.Model):
+    """One stored file, addressed by the SHA-256 of its content (see storage.py)."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    # Path relative to MEDIA_ROOT, e.g. "blobs/ab/ab12...ef.pdf"
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # DocumentFile rows, history entries and cached results pointing at this blob
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.digest
 
 class DocumentFile(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="documents")
@@ -40,8 +110,21 @@ class DocumentFile(models.Model):
     size = models.PositiveIntegerField(null=True, blank=True)
     mime_type = models.CharField(max_length=128, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Deduplicated content; `file` then points at the blob's stored name
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name="files")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_blob_id = instance.__dict__.get("blob_id")
+        return instance
 
     def save(self, *args, **kwargs):
+        from .storage import acquire_blob, release_blob
+
+        if self.blob_id:
+            self.file.name = self.blob.name
+            self.size = self.size or self.blob.size
         if self.file and not self.size:
             try:
                 self.size = self.file.size
@@ -49,11 +132,50 @@ class DocumentFile(models.Model):
                 pass
         if not self.name and self.file:
             self.name = self.file.name
-        super().save(*args, **kwargs)
+
+        loaded_blob_id = getattr(self, "_loaded_blob_id", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.blob_id != loaded_blob_id:
+                if self.blob_id:
+                    acquire_blob(self.blob_id)
+                if loaded_blob_id:
+                    release_blob(loaded_blob_id)
+        self._loaded_blob_id = self.blob_id
 
     def __str__(self):
         return self.name
 
+
+@receiver(post_delete, sender=DocumentFile)
+def release_deleted_file_blob(sender, instance, **kwargs):
+    # Also runs for cascades (e.g. a deleted folder owner), unlike Model.delete()
+    if instance.blob_id:
+        from .storage import release_blob
+        release_blob(instance.blob_id)
+
+
+class ProcessingResult(models.Model):
+    """Pipeline output for a blob, reused when the same content is uploaded again."""
+    blob = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name="results")
+    operation = models.CharField(max_length=64)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("blob", "operation")
+
+
+@receiver(pre_delete, sender=ProcessingResult)
+def release_conversion_output_blob(sender, instance, **kwargs):
+    # A cached conversion holds one reference on its output blob (processing.save_conversion);
+    # give it back when the result goes, e.g. when its input blob is swept
+    digest = (instance.result or {}).get("digest") if instance.operation.startswith("convert:") else None
+    if digest and digest != instance.blob_id:
+        from .storage import release_blob
+        release_blob(digest)
+
+
 class UserActionHistory(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="actions")
     action = models.CharField(max_length=128)
@@ -62,3 +184,50 @@ class UserActionHistory(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Recent activity per user
+            models.Index(fields=["owner", "-created_at"], name="action_owner_recent_idx"),
+            # Retention pruning
+            models.Index(fields=["created_at"], name="action_created_idx"),
+        ]
+
+
+class Job(models.Model):
+    """Background OCR / classification / conversion request, queued in the database (see jobs.py)."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (SUCCEEDED, "Succeeded"), (FAILED, "Failed")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job_type = models.CharField(max_length=32)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    # Session email of the submitter; only they can read the result
+    email = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    # Page-by-page progress of running conversions: {"page", "pages", "outputs"}
+    progress = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Weighted fair queueing (see jobs.enqueue): estimated work in pages, and
+    # the virtual time at which this job's share of the workers is used up
+    cost = models.FloatField(default=1.0)
+    finish_tag = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [
+            # Workers claim the queued job of their type with the lowest finish tag
+            models.Index(fields=["job_type", "status", "finish_tag"], name="job_claim_idx"),
+            # Virtual time: finish tag of the last job claimed
+            models.Index(fields=["job_type", "started_at"], name="job_vtime_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} {self.id} ({self.status})"
@@ -0,0 +1,538 @@
+"""
+pipeline.py - OCR and classification processing stages shared by the views
+Every run carries a LatencyBudget: mandatory stages (OCR, classification,
+redaction) always run, optional ones (grammar correction, abstractive
+summary, PDF report) are skipped or downgraded once the remaining budget
+can no longer cover them
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import cv2
+from PIL import Image
+from django.conf import settings
+
+from document_classification.ocr_extraction import (
+    ocr_image_to_string,
+    extract_text_from_image,
+    classify_document_hybrid,
+    redact_sensitive_information,
+    generate_redacted_pdf,
+)
+from file_conversions.cancellation import CancellationToken
+from grammar_correction.language_tool import LanguageToolClient, CircuitOpenError
+from . import cpu_budget, governor
+from .extraction import SENSITIVE_DOCUMENT_TYPES, extract_document_fields
+
+
+# =====================================================================
+# MODELS AND SERVICES
+# =====================================================================
+
+# Thread counts for OpenCV / torch / Tesseract before any model is loaded
+cpu_budget.apply(settings.CPU_BUDGET)
+
+# The grammar client and the summarization model are set up on first use,
+# so pool workers that never run those stages don't pay for them
+_NOT_LOADED = object()
+tool = _NOT_LOADED
+summarizer = _NOT_LOADED
+_tool_lock = threading.Lock()
+_summarizer_lock = threading.Lock()
+
+
+def _start_language_tool():
+    try:
+        client = LanguageToolClient(
+            settings.LANGUAGETOOL_URL,
+            max_workers=settings.LANGUAGETOOL_MAX_WORKERS,
+            timeout=settings.LANGUAGETOOL_TIMEOUT,
+        )
+        if settings.LANGUAGETOOL_PROBE_INTERVAL:
+            client.start_health_probe(interval=settings.LANGUAGETOOL_PROBE_INTERVAL)
+        print("[SUCCESS] LanguageTool initialized successfully!")
+        return client
+    except Exception as e:
+        print(f"[WARNING] LanguageTool initialization failed: {e}")
+        return None
+
+
+def _load_summarizer():
+    print("[INFO] Initializing text summarization model...")
+    try:
+        from transformers import pipeline
+        model = pipeline(
+            "summarization",
+            model="facebook/bart-large-cnn",
+            device=-1
+        )
+        print("[SUCCESS] Summarization model loaded successfully!")
+        return model
+    except Exception as e:
+        print(f"[WARNING] Summarizer initialization failed: {e}")
+        print("[INFO] Summarization features will be disabled")
+        return None
+
+
+def get_tool():
+    """The LanguageTool client, started on the first call (None if it could not be set up)."""
+    global tool
+    with _tool_lock:
+        if tool is _NOT_LOADED:
+            tool = _start_language_tool()
+    return tool
+
+
+def get_summarizer():
+    """The summarization pipeline, loaded on the first call (None if it could not be loaded)."""
+    global summarizer
+    with _summarizer_lock:
+        if summarizer is _NOT_LOADED:
+            summarizer = _load_summarizer()
+    return summarizer
+
+
+# =====================================================================
+# STAGES
+# =====================================================================
+
+def summarize_text(text, max_length=150, min_length=50):
+
+    summarizer = get_summarizer()
+    if not summarizer:
+        print("[WARNING] Summarizer not available, returning original text")
+        return text
+
+    if not text or len(text.strip()) < 100:
+        print("[INFO] Text too short for summarization, returning original")
+        return text
+
+    try:
+        text = text.strip()
+        max_input_length = 1024 * 4
+
+        if len(text) > max_input_length:
+            print(f"[INFO] Text too long ({len(text)} chars), truncating to {max_input_length}")
+            text = text[:max_input_length]
+
+        print("[INFO] Generating summary...")
+        summary_result = summarizer(
+            text,
+            max_length=max_length,
+            min_length=min_length,
+            do_sample=False,
+            truncation=True
+        )
+
+        summary_text = summary_result[0]['summary_text']
+        print(f"[SUCCESS] Summary generated: {len(summary_text)} characters")
+        return summary_text
+
+    except Exception as e:
+        print(f"[ERROR] Summarization failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return text
+
+
+def summarize_text_stream(text, max_length=150, min_length=50):
+    """
+    Yield summary text pieces as the model generates them.
+
+    Falls back to yielding the whole text at once when summarization is not possible.
+    Closing the generator (e.g. the browser disconnects) stops the model early.
+    """
+    summarizer = get_summarizer() if text and len(text.strip()) >= 100 else None
+    if not summarizer:
+        yield text
+        return
+
+    import torch
+    from transformers import TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+
+    class _StopOnEvent(StoppingCriteria):
+        def __init__(self, event):
+            self.event = event
+
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    text = text.strip()[:1024 * 4]
+    tokenizer = summarizer.tokenizer
+    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=1024)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=120)
+    stop_event = threading.Event()
+
+    def generate():
+        try:
+            summarizer.model.generate(
+                **inputs,
+                streamer=streamer,
+                max_length=max_length,
+                min_length=min_length,
+                # Streamers only support greedy decoding
+                num_beams=1,
+                do_sample=False,
+                stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop_event)]),
+            )
+        except Exception as e:
+            print(f"[ERROR] Streaming summarization failed: {e}")
+            streamer.end()
+
+    print("[INFO] Streaming summary...")
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+    try:
+        for piece in streamer:
+            if piece:
+                yield piece
+    finally:
+        stop_event.set()
+        thread.join(timeout=5)
+
+
+def upscale_image_opencv(image_path, scale=2):
+    """Upscale image using OpenCV cubic interpolation"""
+    try:
+        img = cv2.imread(image_path)
+        if img is None:
+            print(f"[ERROR] Failed to read image: {image_path}")
+            return None
+
+        height, width = img.shape[:2]
+        new_size = (width * scale, height * scale)
+        upscaled_img = cv2.resize(img, new_size, interpolation=cv2.INTER_CUBIC)
+
+        upscaled_img_rgb = cv2.cvtColor(upscaled_img, cv2.COLOR_BGR2RGB)
+        pil_img = Image.fromarray(upscaled_img_rgb)
+        return pil_img
+
+    except Exception as e:
+        print(f"[ERROR] Image upscaling failed: {e}")
+        return None
+
+
+
+def extractive_summary(text, max_sentences=3):
+    """
+    Cheap fallback summary: the highest-scoring sentences by word frequency,
+    kept in their original order. Used when the abstractive model does not fit the budget.
+    """
+    if not text or len(text.strip()) < 100:
+        return text
+
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n{2,}", text) if len(s.strip()) > 20]
+    if len(sentences) <= max_sentences:
+        return " ".join(sentences) or text
+
+    frequencies = Counter(re.findall(r"[a-z]{3,}", text.lower()))
+
+    def score(sentence):
+        words = re.findall(r"[a-z]{3,}", sentence.lower())
+        return sum(frequencies[w] for w in words) / max(len(words), 1)
+
+    best = sorted(sorted(range(len(sentences)), key=lambda i: score(sentences[i]), reverse=True)[:max_sentences])
+    return " ".join(sentences[i] for i in best)
+
+
+# =====================================================================
+# LATENCY BUDGET
+# =====================================================================
+
+# Observed stage durations, shared by all requests in this process
+_stage_estimates = dict(settings.PIPELINE_STAGE_ESTIMATES)
+_stage_estimates_lock = threading.Lock()
+
+
+class LatencyBudget:
+    """
+    Time budget for one request's pipeline run.
+
+    Mandatory stages may overrun the soft budget; `cancel_token` is the hard
+    limit that kills their Tesseract processes.
+
+    Args:
+        seconds: Total latency budget; None means unlimited
+        cancel_token: CancellationToken shared by every stage (a token without
+            a deadline is created if omitted)
+        stage_executors: Dict of stage -> executor the stage is submitted to
+            (see executors.py); other stages run in the calling thread
+    """
+
+    def __init__(self, seconds=None, cancel_token=None, stage_executors=None):
+        self.seconds = seconds
+        self.started_at = time.monotonic()
+        self.skipped_stages = []
+        self.cancel_token = cancel_token or CancellationToken()
+        self.stage_executors = stage_executors or {}
+
+    @classmethod
+    def from_request(cls, request):
+        """Budget from the X-Latency-Budget header or latency_budget field, capped by settings."""
+        value = request.headers.get("X-Latency-Budget") or request.POST.get("latency_budget")
+        try:
+            seconds = float(value) if value else settings.PIPELINE_LATENCY_BUDGET
+        except ValueError:
+            seconds = settings.PIPELINE_LATENCY_BUDGET
+        return cls(
+            min(seconds, settings.PIPELINE_MAX_LATENCY_BUDGET),
+            CancellationToken.with_timeout(settings.PIPELINE_REQUEST_TIMEOUT),
+        )
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def remaining(self):
+        if self.seconds is None:
+            return float("inf")
+        return max(0.0, self.seconds - self.elapsed())
+
+    @property
+    def deadline(self):
+        """Absolute time.monotonic() at which the budget runs out (None if unlimited)."""
+        return None if self.seconds is None else self.started_at + self.seconds
+
+    @staticmethod
+    def estimate(stage):
+        with _stage_estimates_lock:
+            return _stage_estimates.get(stage, 0.0)
+
+    def can_afford(self, stage, reserve=0.0):
+        """True if `stage` is expected to finish with `reserve` seconds still left."""
+        return self.remaining() - reserve >= self.estimate(stage)
+
+    def skip(self, stage, action="skipped"):
+        """Record that an optional stage was skipped or downgraded."""
+        print(f"[INFO] {stage} {action}: {self.remaining():.1f}s left, needs ~{self.estimate(stage):.1f}s")
+        self.skipped_stages.append({"stage": stage, "action": action})
+
+    def run(self, stage, func, *args, **kwargs):
+        """Run one stage and fold its duration into the shared estimate (EWMA)."""
+        self.cancel_token.raise_if_cancelled()
+        # Time spent queueing for the resource is not part of the stage estimate
+        with governor.acquire(governor.STAGE_RESOURCES.get(stage)):
+            started = time.monotonic()
+            executor = self.stage_executors.get(stage)
+            try:
+                if executor is None:
+                    return func(*args, **kwargs)
+                return executor.submit(func, *args, **kwargs).result()
+            finally:
+                duration = time.monotonic() - started
+                with _stage_estimates_lock:
+                    previous = _stage_estimates.get(stage, duration)
+                    _stage_estimates[stage] = 0.8 * previous + 0.2 * duration
+
+
+# =====================================================================
+# PIPELINES
+# =====================================================================
+
+def correct_grammar(text, budget, reserve=0.0):
+    """Optional stage: grammar correction limited to what is left of the budget."""
+    if not budget.can_afford("grammar", reserve):
+        budget.skip("grammar")
+        return text
+    tool = get_tool()
+    if not tool:
+        print("[INFO] LanguageTool not available, skipping grammar correction")
+        return text
+
+    try:
+        corrected_text, corrections = budget.run(
+            "grammar", tool.correct, text, budget=budget.remaining() - reserve
+        )
+        print(f"[INFO] Applied {corrections} corrections")
+        return corrected_text
+    except CircuitOpenError:
+        print("[INFO] LanguageTool unavailable, skipping grammar correction")
+    except Exception as lang_error:
+        print(f"[WARNING] Grammar correction failed: {lang_error}")
+    return text
+
+
+def summarize_within_budget(text, budget, max_length, min_length):
+    """Optional stage: abstractive summary, downgraded to extractive when it does not fit."""
+    if not budget.can_afford("summary"):
+        budget.skip("summary", "downgraded")
+        return extractive_summary(text)
+    try:
+        return budget.run("summary", summarize_text, text, max_length=max_length, min_length=min_length)
+    except governor.Overloaded:
+        budget.skip("summary", "downgraded (summarizer busy)")
+        return extractive_summary(text)
+
+
+def run_ocr_pipeline(file_path, budget, stream_summary=False):
+    """
+    Upscale, OCR, grammar-correct, classify and summarize an image.
+
+    Args:
+        file_path: Image to process
+        budget: LatencyBudget for this run
+        stream_summary: Leave the abstractive summary to summarize_text_stream
+            (result["stream_summary"] is True when that should happen)
+
+    Returns:
+        Dict with extracted_text, corrected_text, document_type, confidence,
+        summarized_text and stream_summary
+    """
+    result = {
+        "extracted_text": None,
+        "corrected_text": None,
+        "document_type": None,
+        "confidence": None,
+        "summarized_text": None,
+        "stream_summary": False,
+    }
+
+    #  Upscale image for better OCR accuracy
+    print("[STEP 1] Upscaling image...")
+    upscaled_img = budget.run("upscale", upscale_image_opencv, file_path)
+
+    if upscaled_img is None:
+        upscaled_img = Image.open(file_path)
+        print("[WARNING] Using original image without upscaling")
+
+    # OCR using PyTesseract
+    print("[STEP 2] Extracting text with OCR...")
+    extracted_text = budget.run("ocr", ocr_image_to_string, upscaled_img, budget.cancel_token)
+    result["extracted_text"] = extracted_text
+    print(f"[INFO] Extracted {len(extracted_text)} characters")
+    print("\n" + "=" * 70)
+    print("EXTRACTED TEXT:")
+    print(extracted_text)
+    print("=" * 70)
+
+    # Grammar correction (optional)
+    print("\n[STEP 3] Correcting grammar...")
+    corrected_text = correct_grammar(extracted_text, budget, reserve=budget.estimate("classify"))
+    result["corrected_text"] = corrected_text
+
+    # Document Classification
+    print("\n[STEP 4] Classifying document type...")
+    try:
+        doc_type, confidence_score = budget.run("classify", classify_document_hybrid, corrected_text)
+        result["document_type"] = doc_type
+        result["confidence"] = int(confidence_score * 100)
+        print(f"[SUCCESS] Classified as: {doc_type} ({result['confidence']}%)")
+    except Exception as class_error:
+        print(f"[WARNING] Classification failed: {class_error}")
+        result["document_type"] = "Other"
+        result["confidence"] = 0
+
+    #  Text Summarization (optional)
+    print("\n[STEP 5] Generating AI summary...")
+    # The model is loaded only once a summary is worth making and affordable
+    if not corrected_text or len(corrected_text.strip()) <= 100:
+        print("[INFO] Text too short for summarization")
+        result["summarized_text"] = corrected_text
+    elif stream_summary and budget.can_afford("summary"):
+        # Streaming does not hold up the response, so only its budget check applies here
+        result["stream_summary"] = True
+    else:
+        result["summarized_text"] = summarize_within_budget(corrected_text, budget, max_length=150, min_length=50)
+        print("\n" + "=" * 70)
+        print("AI-GENERATED SUMMARY:")
+        print(result["summarized_text"])
+        print("=" * 70)
+
+    return result
+
+
+def ocr_decoded_image(image, cancel_token=None):
+    """OCR of an already decoded BGR scan (e.g. from shared memory)"""
+    return ocr_image_to_string(Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)), cancel_token)
+
+
+def run_classification_pipeline(file_path, budget, image=None, redact=True):
+    """
+    OCR, classify, redact, extract fields, summarize and build the PDF report.
+
+    Mandatory stages run first so optional ones only use whatever budget is left.
+    `image` is the decoded BGR scan when the caller already has it; OCR and
+    redaction then use it instead of decoding `file_path` again, which only
+    names the redacted image. redact=False skips redaction and the report.
+
+    Returns:
+        Dict with extracted_text, summarized_text, document_type, confidence,
+        extracted_fields, raw_fields, redacted_path and pdf_path
+    """
+    # STEP 1: OCR extraction
+    print("\n[STEP 1] Extracting text from image...")
+    if image is None:
+        extracted_text = budget.run("ocr", extract_text_from_image, file_path, budget.cancel_token)
+    else:
+        extracted_text = budget.run("ocr", ocr_decoded_image, image, budget.cancel_token)
+    print(f"[INFO] Extracted {len(extracted_text)} characters")
+    print("\n" + "=" * 70)
+    print("EXTRACTED TEXT:")
+    print(extracted_text)
+    print("=" * 70)
+
+    # STEP 2: Document Classification
+    print("\n[STEP 2] Classifying document...")
+    doc_type, confidence_score = budget.run("classify", classify_document_hybrid, extracted_text)
+    confidence_percentage = int(confidence_score * 100)
+    print(f"[SUCCESS] Classified as: {doc_type} ({confidence_percentage}%)")
+
+    # STEP 3: Image redaction (only for sensitive documents)
+    print("\n[STEP 3] Checking if redaction needed...")
+    redacted_path = None
+    if not redact:
+        print("[INFO] Redaction not requested")
+    elif doc_type in SENSITIVE_DOCUMENT_TYPES:
+        print(f"[INFO] Applying redaction for {doc_type}...")
+        redacted_path = budget.run(
+            "redact", redact_sensitive_information, file_path, doc_type, budget.cancel_token, image=image
+        )
+    else:
+        print(f"[INFO] No redaction needed for {doc_type}")
+
+    # STEP 4: Extract fields WITH REDACTION
+    print("\n[STEP 4] Extracting document fields...")
+    extracted_fields, raw_fields = extract_document_fields(doc_type, extracted_text)
+
+    # STEP 5: Text Summarization (optional)
+    print("\n[STEP 5] Generating text summary...")
+    summarized_text = None
+    if extracted_text and len(extracted_text.strip()) > 100:
+        summarized_text = summarize_within_budget(extracted_text, budget, max_length=200, min_length=60)
+        print("\n" + "=" * 70)
+        print("SUMMARIZED TEXT:")
+        print(summarized_text)
+        print("=" * 70)
+    else:
+        print("[INFO] Text too short for summarization")
+
+    # STEP 6: PDF report with redacted image and fields (optional)
+    print("\n[STEP 6] Generating outputs...")
+    pdf_path = None
+    if redacted_path and os.path.exists(redacted_path):
+        if not budget.can_afford("pdf_report"):
+            budget.skip("pdf_report")
+        else:
+            try:
+                pdf_path = budget.run("pdf_report", generate_redacted_pdf, redacted_path, extracted_fields, doc_type)
+                if not pdf_path or not os.path.exists(pdf_path):
+                    print("[ERROR] PDF generation failed: File not created")
+                    pdf_path = None
+            except Exception as pdf_error:
+                print(f"[ERROR] PDF generation error: {pdf_error}")
+                import traceback
+                traceback.print_exc()
+
+    return {
+        "extracted_text": extracted_text,
+        "summarized_text": summarized_text,
+        "document_type": doc_type,
+        "confidence": confidence_percentage,
+        "extracted_fields": extracted_fields,
+        "raw_fields": raw_fields,
+        "redacted_path": redacted_path,
+        "pdf_path": pdf_path,
+    }
@@ -0,0 +1,367 @@
+# DocumentIntelligence/processing.py
+"""
+OCR, classification and conversion of a stored upload (Blob).
+
+Shared by the views, which run them inside the request (the async views use
+the a* variants), and by the job workers (jobs.py), which run them in the
+background. Results are reused through the per-blob ProcessingResult cache,
+and history entries are written by the history writer in both cases.
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import FileSystemStorage
+
+from . import governor
+from .entities import entities_from_fields, index_entities, linked_uploads
+from .executors import run_in
+from .history_writer import get_writer as get_history_writer
+from .models import Blob
+from .pipeline import run_classification_pipeline, run_ocr_pipeline
+from .storage import (
+    acquire_blob,
+    blob_path,
+    blob_url,
+    get_cached_result,
+    release_blob,
+    save_cached_result,
+    store_file,
+)
+from file_conversions.cancellation import remove_path
+from file_conversions.conversions import (
+    excel_to_pdf,
+    jpg_to_pdf,
+    pdf_to_excel,
+    pdf_to_jpg,
+    pdf_to_ppt,
+    pdf_to_word,
+    ppt_to_pdf,
+    word_to_pdf,
+)
+
+
+def save_document_entry(email, file_name=None, file_url=None, document_type=None,
+                        confidence=None, extracted_text=None, summarized_text=None,
+                        redacted_url=None, pdf_url=None, operation=None, meta=None):
+    """Queue a processed document for the history (written in batches by the history writer)."""
+    try:
+        return get_history_writer().submit(
+            email,
+            file_name=file_name,
+            file_url=file_url,
+            document_type=document_type,
+            confidence=confidence,
+            extracted_text=extracted_text,
+            summarized_text=summarized_text,
+            redacted_url=redacted_url,
+            pdf_url=pdf_url,
+            operation=operation,
+            meta=meta,
+        )
+    except Exception as e:
+        print(f"[ERROR] save_document_entry failed: {e}")
+        return False
+
+
+def media_url(path):
+    """URL of a file written somewhere under MEDIA_ROOT (copied into it if it is not)."""
+    fs = FileSystemStorage()
+    name = os.path.relpath(path, fs.location)
+    if name.startswith(".."):
+        name = os.path.basename(path)
+        shutil.copy(path, os.path.join(fs.location, name))
+    return fs.url(name)
+
+
+# =====================================================================
+# OCR
+# =====================================================================
+
+def ocr_document(blob, budget, stream_summary=False):
+    """OCR pipeline result for a stored image, from the cache when possible."""
+    result = get_cached_result(blob, "ocr")
+    if result is not None:
+        print(f"[INFO] Same content processed before, reusing OCR result for blob {blob.digest[:12]}")
+        return result
+
+    result = run_ocr_pipeline(blob_path(blob), budget, stream_summary=stream_summary)
+    # Only complete runs are worth reusing
+    if not budget.skipped_stages:
+        save_cached_result(blob, "ocr", result)
+    return result
+
+
+# =====================================================================
+# CLASSIFICATION
+# =====================================================================
+
+def cached_classification(blob):
+    """Earlier classification result for this content, if its generated files still exist."""
+    result = get_cached_result(blob, "classification")
+    if result is not None and all(
+            not path or os.path.exists(path) for path in (result["redacted_path"], result["pdf_path"])):
+        print(f"[INFO] Same content processed before, reusing result for blob {blob.digest[:12]}")
+        return result
+    return None
+
+
+def classify_file(file_path, budget, image=None, redact=True):
+    """Run the classification pipeline; raw_fields are replaced by `entities` (keyed hashes)."""
+    result = run_classification_pipeline(file_path, budget, image=image, redact=redact)
+    # Identity numbers are kept only as keyed hashes, never in plaintext
+    result["entities"] = entities_from_fields(result.pop("raw_fields", None))
+    return result
+
+
+def finish_classification(blob, result, complete=True):
+    """
+    Cache a fresh result (complete runs only) and add redacted_url / pdf_url.
+    """
+    if complete:
+        save_cached_result(blob, "classification", result)
+    result["entities"] = [tuple(entity) for entity in result.get("entities", [])]
+    result["redacted_url"] = None
+    result["pdf_url"] = None
+    if result["redacted_path"] and os.path.exists(result["redacted_path"]):
+        result["redacted_url"] = media_url(result["redacted_path"])
+        print(f"[SUCCESS] Redacted image URL: {result['redacted_url']}")
+    if result["pdf_path"]:
+        result["pdf_url"] = media_url(result["pdf_path"])
+        print(f"[SUCCESS] PDF generated: {result['pdf_url']}")
+    return result
+
+
+def classify_document(blob, budget):
+    """
+    Classification pipeline result for a stored document, from the cache when possible.
+
+    Returns:
+        The pipeline result with raw_fields replaced by `entities` (keyed hashes),
+        plus redacted_url and pdf_url for the generated files
+    """
+    result = cached_classification(blob)
+    if result is not None:
+        return finish_classification(blob, result, complete=False)
+    result = classify_file(blob_path(blob), budget)
+    return finish_classification(blob, result, complete=not budget.skipped_stages)
+
+
+def record_classification(email, blob, file_name, result):
+    """
+    Save the history entry and update the entity index for a classified upload.
+
+    Returns:
+        Dict of entity_type -> number of other uploads of this user with the same number
+    """
+    acquire_blob(blob.digest)
+    save_document_entry(
+        email=email,
+        file_name=file_name,
+        file_url=blob_url(blob),
+        document_type=result["document_type"],
+        confidence=result["confidence"],
+        extracted_text=result["extracted_text"],
+        summarized_text=result["summarized_text"],
+        redacted_url=result["redacted_url"],
+        pdf_url=result["pdf_url"],
+        operation='classification',
+        meta=result["extracted_fields"] or None,
+    )
+
+    linked = {}
+    if result["entities"]:
+        try:
+            linked = linked_uploads(email, result["entities"], exclude_blob=blob.digest)
+            index_entities(email, blob.digest, result["entities"])
+        except Exception as e:
+            print(f"[ERROR] Entity index update failed: {e}")
+    return {entity_type: len(blobs) for entity_type, blobs in linked.items()}
+
+
+# =====================================================================
+# CONVERSION
+# =====================================================================
+
+class UnsupportedConversion(ValueError):
+    pass
+
+
+def _convert_file(input_path, output_folder, base_name, ext, target_format, cancel_token, progress=None):
+    """
+    Run one conversion into output_folder; returns the output path.
+
+    `progress` is passed on to the page-by-page PDF converters (see
+    file_conversions.conversions.pdf_to_jpg).
+
+    LibreOffice, rasterization and OCR are only started once the governor has
+    a slot for them (raises governor.Overloaded otherwise).
+    """
+    # ------------------- TO PDF -------------------
+    if target_format == "pdf":
+        output_path = os.path.join(output_folder, f"{base_name}_converted.pdf")
+        office_converters = {
+            ("doc", "docx"): word_to_pdf,
+            ("ppt", "pptx"): ppt_to_pdf,
+            ("xls", "xlsx"): excel_to_pdf,
+        }
+        if ext in ["jpg", "jpeg", "png"]:
+            jpg_to_pdf(input_path, output_path)
+            return output_path
+        for extensions, converter in office_converters.items():
+            if ext in extensions:
+                with governor.acquire("soffice"):
+                    converter(input_path, output_path, cancel_token)
+                return output_path
+        raise UnsupportedConversion(f"Unsupported file type: {ext}")
+
+    # ------------------- FROM PDF -------------------
+    if ext != "pdf":
+        raise UnsupportedConversion(f"Unsupported file type: {ext}")
+
+    if target_format == "jpg":
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with governor.acquire("rasterizer"):
+                jpg_files = pdf_to_jpg(input_path, temp_dir, cancel_token, progress)
+            output_path = os.path.join(output_folder, f"{base_name}_images.zip")
+            with zipfile.ZipFile(output_path, "w") as zipf:
+                for jpg in jpg_files:
+                    zipf.write(jpg, os.path.basename(jpg))
+        finally:
+            remove_path(temp_dir)
+        return output_path
+
+    # Converter, extension, resources it needs (always in this order: rasterizer, tesseract)
+    converters = {
+        "word": (pdf_to_word, ".docx", ("rasterizer", "tesseract")),
+        "ppt": (pdf_to_ppt, ".pptx", ("rasterizer",)),
+        "excel": (pdf_to_excel, ".xlsx", ("rasterizer", "tesseract")),
+    }
+    if target_format not in converters:
+        raise UnsupportedConversion(f"Unsupported target format: {target_format}")
+    converter, extension, resources = converters[target_format]
+    output_path = os.path.join(output_folder, f"{base_name}{extension}")
+    with governor.acquire(*resources):
+        converter(input_path, output_path, cancel_token, progress)
+    return output_path
+
+
+def cached_conversion(blob, target_format):
+    """
+    Earlier conversion of this content to target_format.
+
+    Returns:
+        (cached result or None, output Blob or None when it is no longer stored)
+    """
+    cached = get_cached_result(blob, f"convert:{target_format}")
+    if cached is not None:
+        output_blob = Blob.objects.filter(pk=cached["digest"]).first()
+        if output_blob is not None and os.path.exists(blob_path(output_blob)):
+            print(f"[INFO] Same content converted before, reusing {output_blob.digest[:12]}")
+            return cached, output_blob
+    return cached, None
+
+
+def convert_into(blob, file_name, target_format, output_folder, cancel_token, progress=None):
+    """Convert a stored upload into output_folder; returns the output path (no database access)."""
+    ext = file_name.split(".")[-1].lower()
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    print(f"[INFO] Converting {ext} to {target_format}")
+
+    output_path = _convert_file(blob_path(blob), output_folder, base_name, ext, target_format, cancel_token,
+                                progress)
+    if not os.path.exists(output_path):
+        raise RuntimeError(f"Conversion to {target_format} produced no output")
+    return output_path
+
+
+def save_conversion(blob, target_format, cached, output_path):
+    """Move a conversion output into blob storage and cache it; returns (output Blob, filename)."""
+    output_blob = store_file(output_path)
+
+    # The cached result holds one reference on its output blob
+    if cached is None or cached["digest"] != output_blob.digest:
+        acquire_blob(output_blob.digest)
+        if cached is not None:
+            release_blob(cached["digest"])
+    filename = os.path.basename(output_path)
+    save_cached_result(blob, f"convert:{target_format}", {"digest": output_blob.digest, "filename": filename})
+    print(f"[SUCCESS] Converted to {target_format}: {output_blob.name}")
+    return output_blob, filename
+
+
+def convert_document(blob, file_name, target_format, cancel_token, progress=None):
+    """
+    Convert a stored upload, reusing an earlier conversion of the same content.
+
+    Args:
+        blob: Input Blob
+        file_name: Original upload name (gives the extension and the output name)
+        target_format: "pdf", "jpg", "word", "ppt" or "excel"
+        cancel_token: CancellationToken for the converter subprocesses
+        progress: Optional callback(page_number, page_count, page_path) for
+            PDF sources (not called when the result comes from the cache)
+
+    Returns:
+        (output Blob, download filename); raises UnsupportedConversion or
+        OperationCancelled
+    """
+    cached, output_blob = cached_conversion(blob, target_format)
+    if output_blob is not None:
+        return output_blob, cached["filename"]
+
+    # Outputs are written to a scratch folder and then moved into blob storage
+    output_folder = tempfile.mkdtemp()
+    try:
+        output_path = convert_into(blob, file_name, target_format, output_folder, cancel_token, progress)
+        return save_conversion(blob, target_format, cached, output_path)
+    finally:
+        remove_path(output_folder)
+
+
+# =====================================================================
+# ASYNC VARIANTS (async views)
+# =====================================================================
+# Database work goes through sync_to_async; the pipelines and converters
+# run on the pools of executors.py so the event loop never waits on them.
+
+async def aocr_document(blob, budget, stream_summary=False):
+    """Async ocr_document()."""
+    result = await sync_to_async(get_cached_result)(blob, "ocr")
+    if result is not None:
+        print(f"[INFO] Same content processed before, reusing OCR result for blob {blob.digest[:12]}")
+        return result
+
+    result = await run_in("pipeline", run_ocr_pipeline, blob_path(blob), budget,
+                          stream_summary=stream_summary, cancel_token=budget.cancel_token)
+    if not budget.skipped_stages:
+        await sync_to_async(save_cached_result)(blob, "ocr", result)
+    return result
+
+
+async def aclassify_document(blob, budget):
+    """Async classify_document()."""
+    result = await sync_to_async(cached_classification)(blob)
+    if result is not None:
+        return await sync_to_async(finish_classification)(blob, result, complete=False)
+    result = await run_in("pipeline", classify_file, blob_path(blob), budget, cancel_token=budget.cancel_token)
+    return await sync_to_async(finish_classification)(blob, result, complete=not budget.skipped_stages)
+
+
+async def aconvert_document(blob, file_name, target_format, cancel_token):
+    """Async convert_document()."""
+    cached, output_blob = await sync_to_async(cached_conversion)(blob, target_format)
+    if output_blob is not None:
+        return output_blob, cached["filename"]
+
+    output_folder = tempfile.mkdtemp()
+    try:
+        output_path = await run_in("convert", convert_into, blob, file_name, target_format, output_folder,
+                                   cancel_token, cancel_token=cancel_token)
+        return await sync_to_async(save_conversion)(blob, target_format, cached, output_path)
+    finally:
+        remove_path(output_folder)
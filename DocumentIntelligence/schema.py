@@ -0,0 +1,229 @@
+# DocumentIntelligence/schema.py
+"""
+Tables used by the raw-SQL views, per database vendor.
+
+ensure_schema() creates whatever the database is missing: the tables, the
+full-text search column and index, the JSONB conversion of documents.meta
+and its GIN index, document_stats and entity_index. Every statement is
+idempotent. `manage.py ensure_schema` runs it and is a deploy step, after
+`manage.py migrate`; nothing creates these objects on its own. Commands
+that need them check with missing_tables() and stop with a pointer to it.
+"""
+
+SCHEMA = {
+    "postgresql": [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255),
+            email VARCHAR(255) UNIQUE,
+            password VARCHAR(255)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255),
+            file_name VARCHAR(255),
+            file_url TEXT,
+            document_type VARCHAR(100),
+            confidence INTEGER,
+            extracted_text TEXT,
+            summarized_text TEXT,
+            redacted_url TEXT,
+            pdf_url TEXT,
+            operation VARCHAR(50),
+            meta JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Older databases stored meta as JSON text; convert it in place once
+        """
+        DO $$
+        BEGIN
+            IF (SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'documents' AND column_name = 'meta') = 'text' THEN
+                ALTER TABLE documents ALTER COLUMN meta TYPE jsonb
+                    USING NULLIF(meta, '')::jsonb;
+            END IF;
+        END
+        $$
+        """,
+        # Containment filters on extracted fields (history.list_documents meta_filters)
+        """
+        CREATE INDEX IF NOT EXISTS documents_meta_idx
+            ON documents USING GIN (meta jsonb_path_ops)
+        """,
+        # Serves the dashboard's keyset pagination (history.list_documents)
+        """
+        CREATE INDEX IF NOT EXISTS documents_email_created_idx
+            ON documents (email, created_at DESC, id DESC)
+        """,
+        # Full-text search (search.search_documents). A stored generated column
+        # keeps the vector in step with every INSERT/UPDATE; adding it to an
+        # existing table rewrites the table once.
+        """
+        ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(file_name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(summarized_text, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(extracted_text, '')), 'C')
+            ) STORED
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS documents_search_idx
+            ON documents USING GIN (search_vector)
+        """,
+        # Incrementally maintained per-user counters (stats.py)
+        """
+        CREATE TABLE IF NOT EXISTS document_stats (
+            email VARCHAR(255) NOT NULL,
+            dimension VARCHAR(20) NOT NULL,
+            key VARCHAR(255) NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (email, dimension, key)
+        )
+        """,
+        # Keyed hashes of identity numbers (entities.py); no plaintext is stored
+        """
+        CREATE TABLE IF NOT EXISTS entity_index (
+            entity_hash CHAR(64) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            blob_digest CHAR(64) NOT NULL,
+            entity_type VARCHAR(20) NOT NULL,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (entity_hash, email, blob_digest)
+        )
+        """,
+        # Position of resumable backfills over documents (backfill.py)
+        """
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            name VARCHAR(100) PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            rows_updated INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ],
+    "sqlite": [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT UNIQUE,
+            password TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT,
+            file_name TEXT,
+            file_url TEXT,
+            document_type TEXT,
+            confidence INTEGER,
+            extracted_text TEXT,
+            summarized_text TEXT,
+            redacted_url TEXT,
+            pdf_url TEXT,
+            operation TEXT,
+            -- JSON text, queried with the JSON1 functions
+            meta TEXT CHECK (meta IS NULL OR json_valid(meta)),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Serves the dashboard's keyset pagination (history.list_documents)
+        """
+        CREATE INDEX IF NOT EXISTS documents_email_created_idx
+            ON documents (email, created_at DESC, id DESC)
+        """,
+        # Full-text search: FTS5 index over the documents table, kept in step by triggers
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+            file_name, summarized_text, extracted_text,
+            content='documents', content_rowid='id'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_fts(rowid, file_name, summarized_text, extracted_text)
+            VALUES (new.id, new.file_name, new.summarized_text, new.extracted_text);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, file_name, summarized_text, extracted_text)
+            VALUES ('delete', old.id, old.file_name, old.summarized_text, old.extracted_text);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, file_name, summarized_text, extracted_text)
+            VALUES ('delete', old.id, old.file_name, old.summarized_text, old.extracted_text);
+            INSERT INTO documents_fts(rowid, file_name, summarized_text, extracted_text)
+            VALUES (new.id, new.file_name, new.summarized_text, new.extracted_text);
+        END
+        """,
+        # Index rows that existed before the FTS table was created
+        """
+        INSERT INTO documents_fts(documents_fts)
+        SELECT 'rebuild'
+        WHERE NOT EXISTS (SELECT 1 FROM documents_fts_docsize) AND EXISTS (SELECT 1 FROM documents)
+        """,
+        # Incrementally maintained per-user counters (stats.py)
+        """
+        CREATE TABLE IF NOT EXISTS document_stats (
+            email VARCHAR(255) NOT NULL,
+            dimension VARCHAR(20) NOT NULL,
+            key VARCHAR(255) NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (email, dimension, key)
+        )
+        """,
+        # Keyed hashes of identity numbers (entities.py); no plaintext is stored
+        """
+        CREATE TABLE IF NOT EXISTS entity_index (
+            entity_hash CHAR(64) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            blob_digest CHAR(64) NOT NULL,
+            entity_type VARCHAR(20) NOT NULL,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (entity_hash, email, blob_digest)
+        )
+        """,
+        # Position of resumable backfills over documents (backfill.py)
+        """
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            name VARCHAR(100) PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            rows_updated INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ],
+}
+
+
+def ensure_schema(pool):
+    """Create any missing tables and indexes on the pool's database."""
+    with pool.connection() as con:
+        cur = con.cursor()
+        for statement in SCHEMA[pool.vendor]:
+            cur.execute(statement)
+        con.commit()
+
+
+def missing_tables(pool, tables):
+    """Those of `tables` that do not exist on the pool's database yet."""
+    if pool.vendor == "postgresql":
+        sql = "SELECT to_regclass(%s) IS NULL"
+    else:
+        sql = "SELECT NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type='table' AND name=%s)"
+    missing = []
+    with pool.connection() as con:
+        cur = con.cursor()
+        for table in tables:
+            cur.execute(sql, (table,))
+            if cur.fetchone()[0]:
+                missing.append(table)
+    return missing
@@ -0,0 +1,122 @@
+# DocumentIntelligence/search.py
+"""
+Full-text search over a user's document history.
+
+Postgres matches against the generated search_vector column (GIN index) and
+ranks with ts_rank_cd; SQLite uses the documents_fts FTS5 table and bm25.
+Both weight file name > summary > extracted text. The indexes are kept up
+to date by the database itself (generated column / triggers), so every row
+the history writer inserts is searchable as soon as it is committed.
+
+The column, the FTS table and their indexes are created by
+`manage.py ensure_schema` (a deploy step, see schema.py); until it has run
+the search view logs the error and shows no results.
+"""
+
+import re
+
+from . import db
+from .history import LIST_COLUMNS, DocumentRow, PAGE_SIZE
+
+# Matched terms are wrapped in these in snippets; templates escape the text as usual
+HIGHLIGHT_START = "«"
+HIGHLIGHT_END = "»"
+
+SNIPPET_WORDS = 20
+
+
+class SearchResult(DocumentRow):
+    """A history row plus its relevance rank and a highlighted snippet."""
+
+    def __init__(self, row):
+        super().__init__(row[:len(LIST_COLUMNS)])
+        self.rank, self.snippet = row[len(LIST_COLUMNS):]
+
+
+def fts5_query(query):
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last
+    one as a prefix so results appear while the user is still typing.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _postgres_search(query, email, document_type, limit, offset):
+    columns = ", ".join(f"d.{column}" for column in LIST_COLUMNS)
+    type_filter = "AND document_type = %s" if document_type else ""
+    sql = f"""
+        WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query)
+        SELECT {columns}, hits.rank,
+               ts_headline('english', coalesce(d.summarized_text, d.extracted_text, ''), q.query,
+                           'MaxWords={SNIPPET_WORDS}, MinWords=8, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}')
+        FROM (
+            SELECT id, ts_rank_cd(search_vector, q.query) AS rank
+            FROM documents, q
+            WHERE email = %s AND search_vector @@ q.query {type_filter}
+            ORDER BY rank DESC, id DESC
+            LIMIT %s OFFSET %s
+        ) hits
+        JOIN documents d ON d.id = hits.id
+        CROSS JOIN q
+        ORDER BY hits.rank DESC, d.id DESC
+    """
+    params = [query, email] + ([document_type] if document_type else []) + [limit, offset]
+    return sql, params
+
+
+def _sqlite_search(query, email, document_type, limit, offset):
+    match = fts5_query(query)
+    if match is None:
+        return None, None
+
+    columns = ", ".join(f"d.{column}" for column in LIST_COLUMNS)
+    type_filter = "AND d.document_type = %s" if document_type else ""
+    # bm25() is lower-is-better; negate it so rank means the same on both backends
+    sql = f"""
+        SELECT {columns}, -bm25(documents_fts, 10.0, 5.0, 1.0) AS rank,
+               snippet(documents_fts, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', {SNIPPET_WORDS})
+        FROM documents_fts
+        JOIN documents d ON d.id = documents_fts.rowid
+        WHERE documents_fts MATCH %s AND d.email = %s {type_filter}
+        ORDER BY rank DESC, d.id DESC
+        LIMIT %s OFFSET %s
+    """
+    params = [match, email] + ([document_type] if document_type else []) + [limit, offset]
+    return sql, params
+
+
+def search_documents(email, query, document_type=None, page=1, limit=PAGE_SIZE):
+    """
+    Ranked full-text search of one user's history.
+
+    Args:
+        email: Owner of the documents
+        query: Free-text query (web-search syntax on Postgres)
+        document_type: Only return documents of this type
+        page: 1-based page number
+        limit: Results per page
+
+    Returns:
+        (list of SearchResult, has_more)
+    """
+    if not query or not query.strip():
+        return [], False
+
+    page = max(1, page)
+    build = _postgres_search if db.get_pool().vendor == "postgresql" else _sqlite_search
+    # One extra row tells us whether another page exists
+    sql, params = build(query, email, document_type, limit + 1, (page - 1) * limit)
+    if sql is None:
+        return [], False
+
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    return [SearchResult(row) for row in rows[:limit]], len(rows) > limit
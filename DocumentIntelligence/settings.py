@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 
+from .cpu_budget import plan as cpu_plan
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'DocumentIntelligence',
 ]
 
 MIDDLEWARE = [
@@ -91,6 +95,188 @@ DATABASES = {
 }
 
 
+# Connection pool for the raw-SQL views (DocumentIntelligence/db.py).
+# Set DB_ENGINE=sqlite (DB_NAME = file path) for a local stand-in.
+APP_DATABASE = {
+    'ENGINE': os.environ.get('DB_ENGINE', 'postgresql'),
+    'HOST': os.environ.get('DB_HOST'),
+    'NAME': os.environ.get('DB_NAME'),
+    'USER': os.environ.get('DB_USER'),
+    'PASSWORD': os.environ.get('DB_PASSWORD'),
+    'PORT': os.environ.get('DB_PORT', 5432),
+    'POOL_MIN': int(os.environ.get('DB_POOL_MIN', 1)),
+    'POOL_MAX': int(os.environ.get('DB_POOL_MAX', 10)),
+    # Seconds a request waits for a free connection
+    'POOL_TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    # Connections idle for longer than this are pinged before reuse
+    'HEALTH_CHECK_AFTER': float(os.environ.get('DB_HEALTH_CHECK_AFTER', 30)),
+}
+
+
+# Document history is written behind the request in multi-row batches
+# (DocumentIntelligence/history_writer.py). HISTORY_WRITER_SYNC=1 writes inline.
+HISTORY_WRITER = {
+    'BATCH_SIZE': int(os.environ.get('HISTORY_WRITER_BATCH_SIZE', 50)),
+    'FLUSH_INTERVAL': float(os.environ.get('HISTORY_WRITER_FLUSH_INTERVAL', 1.0)),
+    'MAX_RETRIES': int(os.environ.get('HISTORY_WRITER_MAX_RETRIES', 3)),
+    'SYNCHRONOUS': os.environ.get('HISTORY_WRITER_SYNC', '') == '1',
+}
+
+# Buffered UserActionHistory logging (DocumentIntelligence/action_log.py);
+# rows older than RETENTION_DAYS are removed by `manage.py prune_action_history`.
+ACTION_LOG = {
+    'BATCH_SIZE': int(os.environ.get('ACTION_LOG_BATCH_SIZE', 200)),
+    'FLUSH_INTERVAL': float(os.environ.get('ACTION_LOG_FLUSH_INTERVAL', 2.0)),
+    'MAX_RETRIES': int(os.environ.get('ACTION_LOG_MAX_RETRIES', 3)),
+    'SYNCHRONOUS': os.environ.get('ACTION_LOG_SYNC', '') == '1',
+    'RETENTION_DAYS': int(os.environ.get('ACTION_LOG_RETENTION_DAYS', 90)),
+}
+
+
+# Cores of this container and their split between processes, Tesseract,
+# torch and OpenCV (DocumentIntelligence/cpu_budget.py). The pool and limit
+# defaults below follow it; pipeline.py applies the thread settings.
+CPU_BUDGET = cpu_plan()
+
+# Background jobs (DocumentIntelligence/jobs.py), run by `manage.py run_workers`.
+# WORKERS is the number of worker processes per job type.
+JOB_QUEUE = {
+    'WORKERS': {
+        'ocr': int(os.environ.get('JOB_WORKERS_OCR', 2)),
+        'classification': int(os.environ.get('JOB_WORKERS_CLASSIFICATION', 1)),
+        'convert': int(os.environ.get('JOB_WORKERS_CONVERT', 2)),
+    },
+    # Seconds an idle worker waits before looking at the queue again
+    'POLL_INTERVAL': float(os.environ.get('JOB_POLL_INTERVAL', 1.0)),
+    # Hard limit per job; converter / Tesseract processes are killed after it
+    'JOB_TIMEOUT': float(os.environ.get('JOB_TIMEOUT', 600)),
+    'HEARTBEAT_INTERVAL': float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 15)),
+    # Running jobs without a heartbeat for this long are requeued
+    'STALE_AFTER': float(os.environ.get('JOB_STALE_AFTER', 120)),
+    'MAX_ATTEMPTS': int(os.environ.get('JOB_MAX_ATTEMPTS', 3)),
+    # Seconds between progress updates of a running conversion (and between
+    # checks by the /jobs/<id>/events/ stream)
+    'PROGRESS_INTERVAL': float(os.environ.get('JOB_PROGRESS_INTERVAL', 0.5)),
+    # Fair queueing: cost of non-PDF, non-image uploads in pages, from their size
+    'BYTES_PER_PAGE': int(os.environ.get('JOB_BYTES_PER_PAGE', 100 * 1024)),
+    # Share of the workers per submitter email (default 1), e.g. '{"ops@example.com": 4}'
+    'USER_WEIGHTS': json.loads(os.environ.get('JOB_USER_WEIGHTS', '{}')),
+}
+
+# Bulk classification endpoint (DocumentIntelligence/bulk.py)
+BULK_CLASSIFICATION = {
+    # Pipeline processes shared by all bulk requests
+    'WORKERS': int(os.environ.get('BULK_WORKERS', min(4, CPU_BUDGET['per_process']))),
+    'MAX_FILES': int(os.environ.get('BULK_MAX_FILES', 500)),
+    # Limit on the uncompressed size of everything in one upload
+    'MAX_TOTAL_BYTES': int(os.environ.get('BULK_MAX_TOTAL_BYTES', 500 * 1024 * 1024)),
+    'DOCUMENT_TIMEOUT': float(os.environ.get('BULK_DOCUMENT_TIMEOUT', 150)),
+    # Hand workers decoded scans in shared memory instead of file paths
+    'SHARED_MEMORY': os.environ.get('BULK_SHARED_MEMORY', '1') == '1',
+    # Documents submitted (and decoded) at once per upload
+    'MAX_IN_FLIGHT': int(os.environ.get('BULK_MAX_IN_FLIGHT', 8)),
+    # Run the abstractive summary and PDF report for every document (off: mandatory stages only)
+    'SUMMARIZE': os.environ.get('BULK_SUMMARIZE', '0') == '1',
+}
+
+# Thread pools behind the async views (DocumentIntelligence/executors.py)
+EXECUTORS = {
+    # Pipeline runs in flight; these mostly wait on the pools below
+    'pipeline': int(os.environ.get('EXECUTOR_PIPELINE_THREADS', 32)),
+    'ocr': int(os.environ.get('EXECUTOR_OCR_THREADS', CPU_BUDGET['tesseract_parallel'])),
+    # One model instance: more threads only queue inside torch
+    'summarize': int(os.environ.get('EXECUTOR_SUMMARIZE_THREADS', 1)),
+    'convert': int(os.environ.get('EXECUTOR_CONVERT_THREADS', 2)),
+}
+
+# Admission control (DocumentIntelligence/governor.py). Limits are per web
+# process; requests beyond LIMIT wait in a queue of MAX_QUEUE for at most
+# QUEUE_TIMEOUT seconds, otherwise they get a 503 with Retry-After.
+GOVERNOR = {
+    'RESOURCES': {
+        'soffice': {
+            'LIMIT': int(os.environ.get('GOVERNOR_SOFFICE_LIMIT', CPU_BUDGET['soffice_parallel'])),
+            'MAX_QUEUE': int(os.environ.get('GOVERNOR_SOFFICE_QUEUE', 8)),
+        },
+        'tesseract': {
+            'LIMIT': int(os.environ.get('GOVERNOR_TESSERACT_LIMIT', CPU_BUDGET['tesseract_parallel'])),
+            'MAX_QUEUE': int(os.environ.get('GOVERNOR_TESSERACT_QUEUE', 32)),
+        },
+        'summarizer': {
+            'LIMIT': int(os.environ.get('GOVERNOR_SUMMARIZER_LIMIT', 1)),
+            'MAX_QUEUE': int(os.environ.get('GOVERNOR_SUMMARIZER_QUEUE', 8)),
+        },
+        'rasterizer': {
+            'LIMIT': int(os.environ.get('GOVERNOR_RASTERIZER_LIMIT', CPU_BUDGET['rasterizer_parallel'])),
+            'MAX_QUEUE': int(os.environ.get('GOVERNOR_RASTERIZER_QUEUE', 8)),
+        },
+    },
+    'QUEUE_TIMEOUT': float(os.environ.get('GOVERNOR_QUEUE_TIMEOUT', 30)),
+    # Uploads one client (session email or IP) may have in flight; more get a 429
+    'MAX_REQUESTS_PER_CLIENT': int(os.environ.get('GOVERNOR_MAX_REQUESTS_PER_CLIENT', 4)),
+    # Proxies in front of the app that append to X-Forwarded-For (1 on Render).
+    # 0 keys anonymous clients by REMOTE_ADDR, i.e. the proxy when there is one.
+    'TRUSTED_PROXY_HOPS': int(os.environ.get('GOVERNOR_TRUSTED_PROXY_HOPS', 0)),
+    # Client addresses (see governor.client_address) allowed to read /metrics/resources/
+    # without a staff login, e.g. the monitoring host
+    'METRICS_ALLOWED_ADDRESSES': [
+        address.strip()
+        for address in os.environ.get('GOVERNOR_METRICS_ALLOWED_ADDRESSES', '127.0.0.1,::1').split(',')
+        if address.strip()
+    ],
+}
+
+# Key for the hashed identity-number index (DocumentIntelligence/entities.py).
+# Must be a private random value; changing it orphans every existing entry.
+# Unset: no entities are indexed (SECRET_KEY is public in this repository).
+ENTITY_INDEX_KEY = os.environ.get('ENTITY_INDEX_KEY')
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Grammar-corrected paragraphs keyed by content hash (boilerplate repeats across uploads)
+    'grammar': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'grammar',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
+# LanguageTool grammar correction
+LANGUAGETOOL_URL = os.environ.get('LANGUAGETOOL_URL', 'http://localhost:8081')
+LANGUAGETOOL_MAX_WORKERS = int(os.environ.get('LANGUAGETOOL_MAX_WORKERS', 4))
+# Seconds one grammar correction may add to a request
+LANGUAGETOOL_TIMEOUT = float(os.environ.get('LANGUAGETOOL_TIMEOUT', 3))
+# Seconds between background health checks (0 disables the probe)
+LANGUAGETOOL_PROBE_INTERVAL = float(os.environ.get('LANGUAGETOOL_PROBE_INTERVAL', 15))
+
+
+# Processing pipeline latency budget (seconds). Clients may ask for a different
+# budget with the X-Latency-Budget header, capped at PIPELINE_MAX_LATENCY_BUDGET.
+PIPELINE_LATENCY_BUDGET = float(os.environ.get('PIPELINE_LATENCY_BUDGET', 30))
+PIPELINE_MAX_LATENCY_BUDGET = float(os.environ.get('PIPELINE_MAX_LATENCY_BUDGET', 120))
+# Hard limits (seconds): OCR / redaction / conversion processes still running
+# after this long are killed and their partial output removed. Keep them below
+# the gunicorn worker timeout so the worker is not killed first.
+PIPELINE_REQUEST_TIMEOUT = float(os.environ.get('PIPELINE_REQUEST_TIMEOUT', 150))
+CONVERSION_TIMEOUT = float(os.environ.get('CONVERSION_TIMEOUT', 120))
+# Starting estimates per stage; refined at runtime from observed durations
+PIPELINE_STAGE_ESTIMATES = {
+    'upscale': 0.5,
+    'ocr': 4.0,
+    'grammar': 2.0,
+    'classify': 0.05,
+    'redact': 3.0,
+    'summary': 15.0,
+    'pdf_report': 1.0,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,3 +323,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # at bottom of settings.py
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Blobs nothing references (e.g. anonymous uploads) are deleted by
+# `manage.py sweep_blobs` once they are this old
+UNREFERENCED_BLOB_GRACE_HOURS = int(os.environ.get('UNREFERENCED_BLOB_GRACE_HOURS', 24))
@@ -0,0 +1,112 @@
+# DocumentIntelligence/shared_images.py
+"""
+Decoded scans in shared memory for the pipeline process pool.
+
+Pool tasks are pickled: sending a worker the decoded pixels copies megabytes
+through a pipe per document, and sending it only the path makes every stage
+decode the file again (PIL for OCR, OpenCV for redaction). share_image()
+decodes a scan once into a multiprocessing.shared_memory block; the task
+carries a SharedImage handle (block name, shape and dtype) and the worker
+maps the same pages with attach(), without copying.
+
+The process that creates a block owns it and calls free() once the task is
+done; workers only close their mapping. Nothing here imports Django, so
+spawned pool processes can unpickle handles before setup().
+"""
+
+import os
+import shutil
+import threading
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# tmpfs behind shared memory; containers often give it only 64 MB
+SHM_PATH = "/dev/shm"
+
+# Bytes this process has shared and not freed yet
+_reserved = {"bytes": 0}
+_reserved_lock = threading.Lock()
+
+
+class SharedImage:
+    """Picklable handle to a decoded scan in a shared memory block."""
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = dtype
+
+    def __repr__(self):
+        return f"SharedImage({self.name!r}, {self.shape}, {self.dtype!r})"
+
+    def attach(self):
+        """
+        Map the block in this process.
+
+        Returns:
+            (block, image): the SharedMemory to pass to release() and a
+            read-only ndarray view of the pixels
+        """
+        block = shared_memory.SharedMemory(name=self.name)
+        image = np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+        image.flags.writeable = False
+        return block, image
+
+
+def _fits(size):
+    """True if the shared memory tmpfs has room for `size` more bytes (unknown: True)."""
+    try:
+        free = shutil.disk_usage(SHM_PATH).free
+    except OSError:
+        return True
+    with _reserved_lock:
+        # Blocks are sparse until written: count what this process has promised already
+        return size <= free - _reserved["bytes"]
+
+
+def share_image(file_path):
+    """
+    Decode a scan into a new shared memory block.
+
+    Returns:
+        (block, SharedImage), or (None, None) when OpenCV cannot read the file
+        or shared memory is too small for it; the caller then passes the path
+    """
+    image = cv2.imread(file_path)
+    if image is None:
+        return None, None
+    # Writing past a full tmpfs is a SIGBUS, not an exception
+    if not _fits(image.nbytes):
+        print(f"[WARNING] Shared memory full: {os.path.basename(file_path)} is sent as a path")
+        return None, None
+
+    block = shared_memory.SharedMemory(create=True, size=image.nbytes)
+    with _reserved_lock:
+        _reserved["bytes"] += block.size
+    np.ndarray(image.shape, dtype=image.dtype, buffer=block.buf)[:] = image
+    return block, SharedImage(block.name, image.shape, image.dtype.str)
+
+
+def release(block):
+    """Close a worker's mapping of a block."""
+    try:
+        block.close()
+    except BufferError:
+        # An exception traceback still references the array; the mapping
+        # goes away when it is collected
+        pass
+
+
+def free(block):
+    """Close and remove a block created by share_image() (None is ignored)."""
+    if block is None:
+        return
+    with _reserved_lock:
+        _reserved["bytes"] = max(0, _reserved["bytes"] - block.size)
+    release(block)
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,74 @@
+# DocumentIntelligence/sse.py
+"""
+Server-Sent Events and NDJSON helpers shared by the streaming endpoints.
+
+Streams are async iterators. Under ASGI Django reads a sync iterator to
+the end in a thread before it sends the first byte, and never notices the
+client going away. Blocking producers (model streaming, the bulk pool) go
+through iterate_in_thread(). A disconnect cancels the response and closes
+the producer, so its cleanup runs.
+"""
+
+import asyncio
+import json
+
+from django.http import StreamingHttpResponse
+
+
+def format_event(data, event=None):
+    """Serialize one SSE message. `data` is JSON-encoded so tokens keep their whitespace."""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def iterate_in_thread(iterable, executor=None):
+    """
+    Async iterator over a blocking iterator; each next() runs on `executor`
+    (default: the event loop's thread pool).
+
+    When the consumer stops early, the step in progress finishes in its
+    thread and then the iterator is closed, so a generator's finally blocks
+    still run.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterable)
+    exhausted = object()
+    step = None
+    try:
+        while True:
+            step = loop.run_in_executor(executor, next, iterator, exhausted)
+            # Shielded: a cancelled response must not leave next() running while close() is called
+            item = await asyncio.shield(step)
+            if item is exhausted:
+                return
+            yield item
+    finally:
+        if step is not None and not step.done():
+            await asyncio.wait([step])
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await loop.run_in_executor(executor, close)
+
+
+def event_stream_response(events):
+    """Wrap an async iterator of formatted events in an unbuffered text/event-stream response."""
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx (Render's proxy) from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def ndjson_response(records):
+    """Stream an async iterator of dicts as newline-delimited JSON, one record per line."""
+    async def lines():
+        async for record in records:
+            yield json.dumps(record, default=str) + "\n"
+
+    response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,105 @@
+# DocumentIntelligence/stats.py
+"""
+Per-user document statistics, maintained incrementally.
+
+document_stats holds one counter per (email, dimension, key). The history
+writer upserts the counters in the same transaction as the rows it inserts,
+so the dashboard reads a handful of counter rows instead of aggregating the
+user's whole history.
+
+Dimensions: "total" (key ""), "type" (document type), "operation" and
+"day" (YYYY-MM-DD, UTC).
+"""
+
+import datetime
+from collections import Counter
+
+from . import db
+
+TOTAL = "total"
+BY_TYPE = "type"
+BY_OPERATION = "operation"
+BY_DAY = "day"
+
+UPSERT_SQL = """
+    INSERT INTO document_stats (email, dimension, key, count)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (email, dimension, key)
+    DO UPDATE SET count = document_stats.count + excluded.count
+"""
+
+
+def today():
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+def count_rows(rows):
+    """
+    Counter increments for a batch of history rows.
+
+    Args:
+        rows: Iterable of (email, document_type, operation, day)
+    """
+    counters = Counter()
+    for email, document_type, operation, day in rows:
+        counters[(email, TOTAL, "")] += 1
+        counters[(email, BY_TYPE, document_type or "Other")] += 1
+        counters[(email, BY_OPERATION, operation or "other")] += 1
+        counters[(email, BY_DAY, day)] += 1
+    return counters
+
+
+def increment_stats(cur, counters):
+    """Apply counter increments with one upsert per counter, on the caller's transaction."""
+    # A fixed order keeps concurrent writers from deadlocking on each other's rows
+    cur.executemany(UPSERT_SQL, [(*key, count) for key, count in sorted(counters.items())])
+
+
+def get_document_stats(email, days=30):
+    """
+    Statistics for one user's dashboard.
+
+    Returns:
+        Dict with total, by_type, by_operation (dicts sorted by count) and
+        by_day (list of (day, count) for the last `days` days, oldest first)
+    """
+    since = (datetime.date.fromisoformat(today()) - datetime.timedelta(days=days - 1)).isoformat()
+
+    with db.connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT dimension, key, count FROM document_stats "
+            "WHERE email=%s AND (dimension <> %s OR key >= %s)",
+            (email, BY_DAY, since),
+        )
+        rows = cur.fetchall()
+
+    grouped = {TOTAL: {}, BY_TYPE: {}, BY_OPERATION: {}, BY_DAY: {}}
+    for dimension, key, count in rows:
+        grouped.setdefault(dimension, {})[key] = count
+
+    def by_count(counts):
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    return {
+        "total": grouped[TOTAL].get("", 0),
+        "by_type": by_count(grouped[BY_TYPE]),
+        "by_operation": by_count(grouped[BY_OPERATION]),
+        "by_day": sorted(grouped[BY_DAY].items()),
+    }
+
+
+def rebuild_document_stats():
+    """Recompute every counter from the documents table (initial backfill / repair)."""
+    with db.connection() as con:
+        cur = con.cursor()
+        day = "to_char(created_at, 'YYYY-MM-DD')" if db.get_pool().vendor == "postgresql" else "date(created_at)"
+        cur.execute(f"SELECT email, document_type, operation, {day} FROM documents")
+        counters = count_rows(cur.fetchall())
+
+        cur.execute("DELETE FROM document_stats")
+        increment_stats(cur, counters)
+        con.commit()
+
+    print(f"[SUCCESS] Rebuilt {len(counters)} document statistics counters")
+    return len(counters)
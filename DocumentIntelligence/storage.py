@@ -0,0 +1,203 @@
+# DocumentIntelligence/storage.py
+"""
+Content-addressed storage for uploads and conversion outputs.
+
+Files are hashed (SHA-256) while they are streamed to disk and stored once
+under MEDIA_ROOT/blobs/<aa>/<digest><ext>; a second upload of the same
+content reuses the existing blob. Blob.ref_count tracks the DocumentFile
+rows and history entries that point at a blob; a blob is deleted when its
+last reference is released. Blobs that were never referenced (anonymous
+uploads) are swept once they are older than UNREFERENCED_BLOB_GRACE_HOURS.
+
+ProcessingResult rows cache pipeline output per (blob, operation), so the
+same content is only processed once.
+"""
+
+import datetime
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Blob, ProcessingResult
+
+BLOB_DIR = "blobs"
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_name(digest, extension=""):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+def blob_path(blob):
+    """Absolute path of a blob's file."""
+    return os.path.join(settings.MEDIA_ROOT, blob.name)
+
+
+def blob_url(blob):
+    return FileSystemStorage().url(blob.name)
+
+
+# =====================================================================
+# STORING
+# =====================================================================
+
+def store_chunks(chunks, filename):
+    """
+    Hash and store a file given as an iterable of byte chunks.
+
+    Args:
+        chunks: Iterable of bytes
+        filename: Original name; only its extension is kept
+
+    Returns:
+        The Blob (existing one if the content was already stored)
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    temp_dir = os.path.join(settings.MEDIA_ROOT, BLOB_DIR, "tmp")
+    os.makedirs(temp_dir, exist_ok=True)
+
+    # Stream to a temp file in the same filesystem so the final move is atomic
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False) as temp:
+        for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            temp.write(chunk)
+    digest = digest.hexdigest()
+
+    try:
+        blob = Blob.objects.filter(pk=digest).first()
+        if blob is None:
+            name = blob_name(digest, extension)
+            os.makedirs(os.path.dirname(os.path.join(settings.MEDIA_ROOT, name)), exist_ok=True)
+            os.replace(temp.name, os.path.join(settings.MEDIA_ROOT, name))
+            try:
+                with transaction.atomic():
+                    blob = Blob.objects.create(digest=digest, name=name, size=size)
+                print(f"[INFO] Stored new blob {digest[:12]} ({size} bytes)")
+            except IntegrityError:
+                # Another request stored the same content first
+                blob = Blob.objects.get(pk=digest)
+                if blob.name != name:
+                    os.remove(os.path.join(settings.MEDIA_ROOT, name))
+        elif not os.path.exists(blob_path(blob)):
+            # The row survived but the file did not; put the content back
+            os.makedirs(os.path.dirname(blob_path(blob)), exist_ok=True)
+            os.replace(temp.name, blob_path(blob))
+        else:
+            print(f"[INFO] Duplicate content, reusing blob {digest[:12]}")
+    finally:
+        if os.path.exists(temp.name):
+            os.remove(temp.name)
+
+    return blob
+
+
+def store_upload(uploaded_file):
+    """Store a Django UploadedFile, hashing it while it streams to disk."""
+    return store_chunks(uploaded_file.chunks(CHUNK_SIZE), uploaded_file.name)
+
+
+def store_file(path, filename=None, move=True):
+    """Store a file that already exists on disk (e.g. a conversion output)."""
+    def chunks():
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    blob = store_chunks(chunks(), filename or os.path.basename(path))
+    if move:
+        os.remove(path)
+    return blob
+
+
+# =====================================================================
+# REFERENCE COUNTING
+# =====================================================================
+
+def acquire_blob(digest):
+    """Add one reference; False if the blob was deleted in the meantime."""
+    if Blob.objects.filter(pk=digest).update(ref_count=F("ref_count") + 1):
+        return True
+    print(f"[WARNING] Blob {digest[:12]} was deleted before it could be referenced")
+    return False
+
+
+def release_blob(digest):
+    """Drop one reference; the blob and its file are deleted with the last one."""
+    with transaction.atomic():
+        # Lock the row before deciding: a concurrent acquire_blob() waits for
+        # this transaction instead of counting a blob that is being deleted
+        blob = Blob.objects.select_for_update().filter(pk=digest).first()
+        if blob is None:
+            return
+        if blob.ref_count > 0:
+            blob.ref_count -= 1
+            Blob.objects.filter(pk=digest).update(ref_count=blob.ref_count)
+        if blob.ref_count > 0 or blob.files.exists():
+            return
+        directory = os.path.dirname(blob_path(blob))
+        blob.delete()
+
+    _remove_blob_files(directory, digest)
+    print(f"[INFO] Deleted unreferenced blob {digest[:12]}")
+
+
+def sweep_unreferenced_blobs(grace_hours=None):
+    """
+    Delete blobs that were never referenced and are older than the grace period.
+
+    Anonymous uploads are stored but never acquired, so release_blob() never
+    sees them. The grace period leaves time for an upload to be processed
+    and referenced.
+
+    Returns:
+        Number of blobs deleted
+    """
+    if grace_hours is None:
+        grace_hours = settings.UNREFERENCED_BLOB_GRACE_HOURS
+    cutoff = timezone.now() - datetime.timedelta(hours=grace_hours)
+
+    deleted = 0
+    candidates = Blob.objects.filter(ref_count=0, created_at__lt=cutoff, files__isnull=True)
+    for digest in candidates.values_list("digest", flat=True).iterator():
+        with transaction.atomic():
+            # Checked again under the row lock: it may have been acquired since
+            blob = Blob.objects.select_for_update().filter(pk=digest, ref_count=0).first()
+            if blob is None or blob.files.exists():
+                continue
+            directory = os.path.dirname(blob_path(blob))
+            blob.delete()
+        _remove_blob_files(directory, digest)
+        deleted += 1
+
+    print(f"[INFO] Swept {deleted} unreferenced blobs older than {grace_hours}h")
+    return deleted
+
+
+def _remove_blob_files(directory, digest):
+    """The blob file plus outputs derived from it (<digest>_redacted.jpg, ...)."""
+    if os.path.isdir(directory):
+        for entry in os.listdir(directory):
+            if entry.startswith(digest):
+                os.remove(os.path.join(directory, entry))
+
+
+# =====================================================================
+# RESULT REUSE
+# =====================================================================
+
+def get_cached_result(blob, operation):
+    """Stored pipeline result for this content and operation, or None."""
+    return ProcessingResult.objects.filter(blob=blob, operation=operation).values_list("result", flat=True).first()
+
+
+def save_cached_result(blob, operation, result):
+    ProcessingResult.objects.update_or_create(blob=blob, operation=operation, defaults={"result": result})
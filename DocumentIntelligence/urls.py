@@ -7,7 +7,9 @@ urlpatterns = [
 
     path("", views.index, name="index"),
     path("ocr/", views.ocr_view, name="ocr"),
+    path("ocr/summary-stream/", views.ocr_summary_stream, name="ocr_summary_stream"),
     path('classification/', views.classification, name='classification'),
+    path('classification/bulk/', views.bulk_classification, name='bulk_classification'),
     path('convert/', views.convert, name='convert'),
     path('generate-layout/', views.generate_layout, name='generate_layout'),
     #path('auth-model/', views.auth_model, name='auth_model'),
@@ -15,7 +17,12 @@ urlpatterns = [
     path('login/', views.login, name='login'),
     path('register/', views.register, name='register'),
     path('dashboard', views.dashboard, name='dashboard'),
+    path('search/', views.search, name='search'),
     path('logout/', views.logout_view, name='logout'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<uuid:job_id>/events/', views.job_events, name='job_events'),
+    path('jobs/<str:job_type>/', views.enqueue_job, name='enqueue_job'),
+    path('metrics/resources/', views.resource_metrics, name='resource_metrics'),
 
 ]
 
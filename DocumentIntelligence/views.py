@@ -1,19 +1,38 @@
+import asyncio
 import os
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.core.files.storage import FileSystemStorage
-from django.http import FileResponse, JsonResponse
+from django.http import FileResponse, JsonResponse, HttpResponse
 from django.conf import settings
-from PIL import Image
-import pytesseract
-import cv2
-import language_tool_python
-import shutil
-import zipfile
-import tempfile
-import json
+from django.utils.http import urlencode
+import time
+import uuid
 #import mysql.connector as mq
 from django.shortcuts import redirect
-import psycopg2 as mq
+from django.urls import reverse
+from . import db
+from .action_log import log_action, owner_for_email
+from .jobs import enqueue
+from .models import Job
+from .extraction import FILTERABLE_FIELDS
+from .history import list_documents
+from .search import search_documents
+from .stats import get_document_stats
+from .storage import store_upload, blob_path, blob_url, acquire_blob, release_blob
+from .executors import run_in, stage_executors
+from . import governor
+from .governor import Overloaded, governed
+from .processing import (
+    save_document_entry,
+    aocr_document,
+    aclassify_document,
+    record_classification,
+    aconvert_document,
+    UnsupportedConversion,
+)
+from .sse import format_event, event_stream_response, iterate_in_thread, ndjson_response
+from .bulk import BulkUploadError, store_bulk_upload, classify_bulk
 
 def logout_view(request):
     # clear session fully
@@ -22,51 +41,32 @@ def logout_view(request):
     return redirect('index')
 
 
-# helper: save a processed document entry
-def save_document_entry(email, file_name=None, file_url=None, document_type=None,
-                        confidence=None, extracted_text=None, summarized_text=None,
-                        redacted_url=None, pdf_url=None, operation=None, meta=None):
-    try:
-        sql = """
-            INSERT INTO documents
-            (email, file_name, file_url, document_type, confidence, extracted_text,
-             summarized_text, redacted_url, pdf_url, operation, meta)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """
-        cur.execute(sql, (
-            email,
-            file_name,
-            file_url,
-            document_type,
-            confidence,
-            extracted_text,
-            summarized_text,
-            redacted_url,
-            pdf_url,
-            operation,
-            json.dumps(meta) if meta is not None else None
-        ))
-        con.commit()
-        return True
-    except Exception as e:
-        print(f"[ERROR] save_document_entry failed: {e}")
+# helper: record an action for the logged-in session user (buffered, see action_log.py)
+def log_user_action(request, action, details=None):
+    email = request.session.get('email')
+    if not email:
         return False
-
-
-con = mq.connect(host=os.environ.get("DB_HOST"),
-        database=os.environ.get("DB_NAME"),
-        user=os.environ.get("DB_USER"),
-        password=os.environ.get("DB_PASSWORD"),
-        port=os.environ.get("DB_PORT", 5432))
-cur = con.cursor()
+    owner_id = request.session.get('action_owner_id')
+    if owner_id is None:
+        try:
+            owner_id = owner_for_email(email)
+        except Exception as e:
+            print(f"[ERROR] resolving action log owner failed: {e}")
+            return False
+        if owner_id is None:
+            return False
+        request.session['action_owner_id'] = owner_id
+    return log_action(owner_id, action, details)
 
 
 def login(request):
     if request.method == "POST":
         email = request.POST.get("email")
         password = request.POST.get("password")
-        cur.execute("select name,email,password from users where email=%s and password=%s", (email, password))
-        row = cur.fetchone()
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("select name,email,password from users where email=%s and password=%s", (email, password))
+            row = cur.fetchone()
         if row is None:
             return render(request, 'login.html', {'msg': 'invalid credentials'})
         else:
@@ -86,33 +86,71 @@ def dashboard(request):
     if not email:
         return redirect('login')
 
-    # fetch documents for this user
+    # optional filter on an extracted field, e.g. ?field=Invoice Number&value=...
+    meta_field = request.GET.get('field', '').strip()
+    meta_value = request.GET.get('value', '').strip()
+    meta_filters = {meta_field: meta_value} if meta_field and meta_value else None
+
+    # fetch one page of documents for this user
+    next_cursor = None
+    filter_error = None
     try:
-        cur.execute("SELECT id, file_name, file_url, document_type, confidence, created_at, operation, meta, pdf_url, redacted_url FROM documents WHERE email=%s ORDER BY created_at DESC", (email,))
-        rows = cur.fetchall()
-        documents = []
-        for r in rows:
-            doc = {
-                'id': r[0],
-                'file_name': r[1],
-                'file_url': r[2],
-                'document_type': r[3],
-                'confidence': r[4],
-                'created_at': r[5],
-                'operation': r[6],
-                'meta': json.loads(r[7]) if r[7] else None,
-                'pdf_url': r[8],
-                'redacted_url': r[9]
-            }
-            documents.append(doc)
+        documents, next_cursor = list_documents(email, cursor=request.GET.get('before'), meta_filters=meta_filters)
+    except ValueError as e:
+        print(f"[WARNING] Ignoring dashboard filter: {e}")
+        filter_error = str(e)
+        meta_filters = None
+        documents, next_cursor = list_documents(email, cursor=request.GET.get('before'))
     except Exception as e:
         print(f"[ERROR] fetching documents for dashboard: {e}")
         documents = []
 
+    try:
+        stats = get_document_stats(email)
+    except Exception as e:
+        print(f"[ERROR] fetching document stats for dashboard: {e}")
+        stats = None
+
     return render(request, 'dashboard.html', {
         'name': name,
         'email': email,
-        'documents': documents
+        'documents': documents,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('before'),
+        'meta_filters': meta_filters,
+        'filter_query': urlencode({'field': meta_field, 'value': meta_value}) if meta_filters else '',
+        'filterable_fields': FILTERABLE_FIELDS,
+        'filter_error': filter_error,
+        'stats': stats,
+    })
+
+def search(request):
+    # require login
+    email = request.session.get('email')
+    if not email:
+        return redirect('login')
+
+    query = request.GET.get('q', '').strip()
+    document_type = request.GET.get('type') or None
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+
+    results, has_more = [], False
+    if query:
+        try:
+            results, has_more = search_documents(email, query, document_type=document_type, page=page)
+        except Exception as e:
+            print(f"[ERROR] document search failed: {e}")
+
+    return render(request, 'search.html', {
+        'query': query,
+        'document_type': document_type,
+        'document_types': DOCUMENT_TYPES,
+        'results': results,
+        'page': page,
+        'has_more': has_more,
     })
 
 def register(request):
@@ -120,8 +158,10 @@ def register(request):
         name = request.POST.get("name")
         email = request.POST.get("email")
         password = request.POST.get("password")
-        cur.execute("insert into users (name,email,password) values(%s,%s,%s)", (name, email, password))
-        con.commit()
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("insert into users (name,email,password) values(%s,%s,%s)", (name, email, password))
+            con.commit()
         # create session
         request.session['is_authenticated'] = True
         request.session['name'] = name
@@ -131,206 +171,66 @@ def register(request):
 
 
 # Import functions from packages
-from document_classification.ocr_extraction import (
-    extract_text_from_image,
-    classify_document_hybrid,
-    extract_invoice_fields,
-    extract_aadhar_fields,
-    extract_pan_fields,
-    extract_driving_license_fields,
-    extract_voter_id_fields,
-    extract_id_card_fields,
-    redact_sensitive_information,
-    generate_redacted_pdf,
+from .pipeline import (
+    LatencyBudget,
+    extractive_summary,
+    summarize_text_stream,
 )
+from document_classification.ocr_extraction import redact_sensitive_information
 
-from file_conversions.conversions import (
-    jpg_to_pdf,
-    word_to_pdf,
-    ppt_to_pdf,
-    excel_to_pdf,
-    pdf_to_jpg,
-    pdf_to_word,
-    pdf_to_ppt,
-    pdf_to_excel,
-    protect_pdf
-)
+from file_conversions.conversions import protect_pdf
+from file_conversions.cancellation import CancellationToken, OperationCancelled
 
-# Import Transformers for summarization
-from transformers import pipeline
+# Document types the classifier can produce (search filter options)
+DOCUMENT_TYPES = ["Aadhar Card", "PAN Card", "Invoice", "Driving License", "Voter ID", "ID Card", "Other"]
 
 # Initialize Base path
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# Initialize LanguageTool for grammar correction
-try:
-    tool = language_tool_python.LanguageTool('en-US', remote_server='http://localhost:8081')
-    print("[SUCCESS] LanguageTool initialized successfully!")
-except Exception as e:
-    print(f"[WARNING] LanguageTool initialization failed: {e}")
-    tool = None
-
-# Initialize Summarization Pipeline
-print("[INFO] Initializing text summarization model...")
-try:
-    summarizer = pipeline(
-        "summarization",
-        model="facebook/bart-large-cnn",
-        device=-1
-    )
-    print("[SUCCESS] Summarization model loaded successfully!")
-except Exception as e:
-    print(f"[WARNING] Summarizer initialization failed: {e}")
-    print("[INFO] Summarization features will be disabled")
-    summarizer = None
-
-
-def summarize_text(text, max_length=150, min_length=50):
-
-    if not summarizer:
-        print("[WARNING] Summarizer not available, returning original text")
-        return text
-
-    if not text or len(text.strip()) < 100:
-        print("[INFO] Text too short for summarization, returning original")
-        return text
-
-    try:
-        text = text.strip()
-        max_input_length = 1024 * 4
-
-        if len(text) > max_input_length:
-            print(f"[INFO] Text too long ({len(text)} chars), truncating to {max_input_length}")
-            text = text[:max_input_length]
-
-        print("[INFO] Generating summary...")
-        summary_result = summarizer(
-            text,
-            max_length=max_length,
-            min_length=min_length,
-            do_sample=False,
-            truncation=True
-        )
-
-        summary_text = summary_result[0]['summary_text']
-        print(f"[SUCCESS] Summary generated: {len(summary_text)} characters")
-        return summary_text
-
-    except Exception as e:
-        print(f"[ERROR] Summarization failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return text
-
-
-def upscale_image_opencv(image_path, scale=2):
-    """Upscale image using OpenCV cubic interpolation"""
-    try:
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"[ERROR] Failed to read image: {image_path}")
-            return None
-
-        height, width = img.shape[:2]
-        new_size = (width * scale, height * scale)
-        upscaled_img = cv2.resize(img, new_size, interpolation=cv2.INTER_CUBIC)
 
-        upscaled_img_rgb = cv2.cvtColor(upscaled_img, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(upscaled_img_rgb)
-        return pil_img
-
-    except Exception as e:
-        print(f"[ERROR] Image upscaling failed: {e}")
-        return None
+# Seconds an OCR page has to open its summary stream before the pending history entry is dropped
+PENDING_SUMMARY_TTL = 15 * 60
 
 
 def index(request):
     return render(request, "index.html")
 
-def ocr_view(request):
+@governed
+async def ocr_view(request):
     #This is our OCR Functionality
-    extracted_text = None
     corrected_text = None
     summarized_text = None
+    stream_summary = False
     doc_type = None
     confidence_percentage = None
     original_image_url = None
     original_image_filename = None
+    budget = LatencyBudget.from_request(request)
+    budget.stage_executors = stage_executors()
 
     if request.method == "POST" and request.FILES.get("image"):
         uploaded_file = request.FILES["image"]
-        fs = FileSystemStorage()
-        filename = fs.save(uploaded_file.name, uploaded_file)
-        file_path = fs.path(filename)
-        original_image_url = fs.url(filename)
-        original_image_filename = filename
+        blob = await sync_to_async(store_upload)(uploaded_file)
+        original_image_url = blob_url(blob)
+        original_image_filename = blob.name
 
         try:
-            print(f"[INFO] Processing file: {filename}")
-            print("=" * 70)
-
-            #  Upscale image for better OCR accuracy
-            print("[STEP 1] Upscaling image...")
-            upscaled_img = upscale_image_opencv(file_path)
-
-            if upscaled_img is None:
-                upscaled_img = Image.open(file_path)
-                print("[WARNING] Using original image without upscaling")
-
-            # OCR using PyTesseract
-            print("[STEP 2] Extracting text with OCR...")
-            extracted_text = pytesseract.image_to_string(upscaled_img)
-            print(f"[INFO] Extracted {len(extracted_text)} characters")
-            print("\n" + "=" * 70)
-            print("EXTRACTED TEXT:")
-            print(extracted_text)
+            print(f"[INFO] Processing file: {uploaded_file.name}")
             print("=" * 70)
 
-            # Grammar correction
-            print("\n[STEP 3] Correcting grammar...")
-            if tool:
-                try:
-                    matches = tool.check(extracted_text)
-                    corrected_text = language_tool_python.utils.correct(extracted_text, matches)
-                    print(f"[INFO] Applied {len(matches)} corrections")
-                except Exception as lang_error:
-                    print(f"[WARNING] Grammar correction failed: {lang_error}")
-                    corrected_text = extracted_text
-            else:
-                corrected_text = extracted_text
-                print("[INFO] LanguageTool not available, skipping grammar correction")
-
-            # Document Classification
-            print("\n[STEP 4] Classifying document type...")
-            try:
-                doc_type, confidence_score = classify_document_hybrid(corrected_text)
-                confidence_percentage = int(confidence_score * 100)
-                print(f"[SUCCESS] Classified as: {doc_type} ({confidence_percentage}%)")
-            except Exception as class_error:
-                print(f"[WARNING] Classification failed: {class_error}")
-                doc_type = "Other"
-                confidence_percentage = 0
-
-            #  Text Summarization
-            print("\n[STEP 5] Generating AI summary...")
-            if corrected_text and len(corrected_text.strip()) > 100:
-                summarized_text = summarize_text(
-                    corrected_text,
-                    max_length=150,
-                    min_length=50
-                )
-                print("\n" + "=" * 70)
-                print("AI-GENERATED SUMMARY:")
-                print(summarized_text)
-                print("=" * 70)
-            else:
-                print("[INFO] Text too short for summarization")
-                summarized_text = corrected_text
+            result = await aocr_document(blob, budget, stream_summary=True)
+            corrected_text = result["corrected_text"]
+            summarized_text = result["summarized_text"]
+            stream_summary = result["stream_summary"]
+            doc_type = result["document_type"]
+            confidence_percentage = result["confidence"]
 
             print("\n" + "=" * 70)
             print("[SUCCESS] OCR processing completed!")
             print("=" * 70 + "\n")
 
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"[ERROR] Processing failed: {e}")
             import traceback
@@ -342,27 +242,52 @@ def ocr_view(request):
     line_count = len(corrected_text.split('\n')) if corrected_text else 0
 
     if corrected_text:
-        request.session['extracted_text'] = corrected_text
-        request.session['document_type'] = doc_type or 'Other'
-
-    email = request.session.get('email')
-    if email:
-        save_document_entry(
+        await request.session.aset('extracted_text', corrected_text)
+        await request.session.aset('document_type', doc_type or 'Other')
+
+    email = await request.session.aget('email')
+    entry = None
+    if email and original_image_filename:
+        # The history entry keeps its own reference to the stored image
+        await sync_to_async(acquire_blob)(blob.digest)
+        entry = dict(
             email=email,
-            file_name=original_image_filename,
+            file_name=uploaded_file.name,
             file_url=original_image_url,
             document_type=doc_type,
             confidence=confidence_percentage,
-            extracted_text=corrected_text,
-            summarized_text=summarized_text,
             redacted_url=None,  # none in ocr_view (if you produce one later, update)
             pdf_url=None,
             operation='ocr',
             meta=None
         )
-    return render(request, "ocr.html", {
+
+    if original_image_filename:
+        await sync_to_async(log_user_action)(request, 'ocr', {'blob': blob.digest, 'document_type': doc_type})
+
+    summary_id = None
+    if stream_summary:
+        # The history entry is saved once the summary stream finishes
+        summary_id = uuid.uuid4().hex
+        pending = await sync_to_async(expire_pending_summaries)(await request.session.aget('pending_summaries', {}))
+        pending[summary_id] = {
+            'entry': entry,
+            'text': corrected_text,
+            'blob': blob.digest if entry else None,
+            'created': time.time(),
+        }
+        await request.session.aset('pending_summaries', pending)
+    elif entry:
+        await sync_to_async(save_document_entry)(extracted_text=corrected_text, summarized_text=summarized_text,
+                                                 **entry)
+
+    # Context processors read the session
+    return await sync_to_async(render)(request, "ocr.html", {
         "extracted_text": corrected_text,
         "summarized_text": summarized_text,
+        "stream_summary": stream_summary,
+        "summary_id": summary_id,
+        "skipped_stages": budget.skipped_stages,
         "document_type": doc_type,
         "confidence": confidence_percentage,
         "word_count": word_count,
@@ -373,6 +298,54 @@ def ocr_view(request):
     })
 
 
+def expire_pending_summaries(pending):
+    """Drop pending summaries nobody streamed within the TTL, releasing their history entry's blob."""
+    now = time.time()
+    for summary_id, item in list(pending.items()):
+        if now - item['created'] > PENDING_SUMMARY_TTL:
+            del pending[summary_id]
+            if item.get('blob'):
+                release_blob(item['blob'])
+    return pending
+
+
+def ocr_summary_stream(request):
+    """Stream the AI summary of one OCR upload (?id= from the page) as Server-Sent Events"""
+    # Pop before streaming: session changes made inside the generator are never saved.
+    # A 204 also stops EventSource from reconnecting once the summary was delivered.
+    pending = expire_pending_summaries(request.session.get('pending_summaries', {}))
+    item = pending.pop(request.GET.get('id', ''), None)
+    request.session['pending_summaries'] = pending
+    if item is None or not item['text']:
+        return HttpResponse(status=204)
+
+    text = item['text']
+    entry = item['entry']
+
+    def summary_pieces():
+        with governor.acquire("summarizer"):
+            yield from summarize_text_stream(text, max_length=150, min_length=50)
+
+    async def events():
+        pieces = []
+        try:
+            async for piece in iterate_in_thread(summary_pieces()):
+                pieces.append(piece)
+                yield format_event({'token': piece})
+        except governor.Overloaded as e:
+            print(f"[WARNING] {e}, sending an extractive summary")
+            pieces = [extractive_summary(text)]
+        finally:
+            # Runs on client disconnect too, so history keeps whatever was generated
+            summary = "".join(pieces).strip() or text
+            if entry:
+                await sync_to_async(save_document_entry)(extracted_text=text, summarized_text=summary, **entry)
+        print(f"[SUCCESS] Summary streamed: {len(summary)} characters")
+        yield format_event({'summary': summary}, event='done')
+
+    return event_stream_response(events())
+
+
 def generate_layout(request):
 
     if request.method == 'POST':
@@ -479,7 +452,13 @@ def generate_custom_layout(text, doc_type, layout_type):
     """
 
 
-def generate_redacted_image(request):
+def redact_file(file_path, doc_type, cancel_token):
+    with governor.acquire("tesseract"):
+        return redact_sensitive_information(file_path, doc_type, cancel_token)
+
+
+@governed
+async def generate_redacted_image(request):
 
     if request.method == 'POST':
         try:
@@ -504,10 +483,12 @@ def generate_redacted_image(request):
             print(f"[INFO] Generating redacted image for {doc_type}")
             print("=" * 70)
 
-            redacted_path = redact_sensitive_information(file_path, doc_type)
+            cancel_token = CancellationToken.with_timeout(settings.PIPELINE_REQUEST_TIMEOUT)
+            redacted_path = await run_in("ocr", redact_file, file_path, doc_type, cancel_token,
+                                         cancel_token=cancel_token)
 
             if redacted_path and os.path.exists(redacted_path):
-                redacted_filename = os.path.basename(redacted_path)
+                redacted_filename = os.path.relpath(redacted_path, fs.location)
                 redacted_url = fs.url(redacted_filename)
 
                 print(f"[SUCCESS] Redacted image created: {redacted_url}")
@@ -524,6 +505,8 @@ def generate_redacted_image(request):
                     'message': 'Failed to generate redacted image'
                 }, status=500)
 
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"[ERROR] Redaction error: {e}")
             import traceback
@@ -540,239 +523,91 @@ def generate_redacted_image(request):
     }, status=400)
 
 
-def classification(request):
-    email = request.session.get('email')
+@governed
+async def classification(request):
     """Main document classification pipeline"""
+    email = await request.session.aget('email')
+    budget = LatencyBudget.from_request(request)
+    budget.stage_executors = stage_executors()
     if request.method == 'POST' and request.FILES.get('document'):
         try:
             uploaded_file = request.FILES['document']
-            fs = FileSystemStorage()
-            filename = fs.save(uploaded_file.name, uploaded_file)
-            file_path = fs.path(filename)
+            blob = await sync_to_async(store_upload)(uploaded_file)
 
             print("=" * 70)
-            print(f"[INFO] Processing document: {filename}")
-            print("=" * 70)
-
-            # STEP 1: OCR extraction
-            print("\n[STEP 1] Extracting text from image...")
-            extracted_text = extract_text_from_image(file_path)
-            print(f"[INFO] Extracted {len(extracted_text)} characters")
-            print("\n" + "=" * 70)
-            print("EXTRACTED TEXT:")
-            print(extracted_text)
+            print(f"[INFO] Processing document: {uploaded_file.name}")
             print("=" * 70)
 
-            # STEP 2: Text Summarization
-            print("\n[STEP 2] Generating text summary...")
-            summarized_text = None
-            if extracted_text and len(extracted_text.strip()) > 100:
-                summarized_text = summarize_text(
-                    extracted_text,
-                    max_length=200,
-                    min_length=60
-                )
-                print("\n" + "=" * 70)
-                print("SUMMARIZED TEXT:")
-                print(summarized_text)
-                print("=" * 70)
-            else:
-                print("[INFO] Text too short for summarization")
-
-            # STEP 3: Document Classification
-            print("\n[STEP 3] Classifying document...")
-            doc_type, confidence_score = classify_document_hybrid(extracted_text)
-            confidence_percentage = int(confidence_score * 100)
-            print(f"[SUCCESS] Classified as: {doc_type} ({confidence_percentage}%)")
-
-            # STEP 4: Image redaction (only for sensitive documents)
-            print("\n[STEP 4] Checking if redaction needed...")
-            redacted_url = None
-            pdf_url = None
-            redacted_path = None
-
-            sensitive_docs = ["Aadhar Card", "PAN Card", "Driving License", "Voter ID", "ID Card"]
-            if doc_type in sensitive_docs:
-                print(f"[INFO] Applying redaction for {doc_type}...")
-                redacted_path = redact_sensitive_information(file_path, doc_type)
-            else:
-                print(f"[INFO] No redaction needed for {doc_type}")
-
-            # STEP 5: Extract fields WITH REDACTION
-            print("\n[STEP 5] Extracting document fields...")
-            extracted_fields = {}
-
-            if doc_type == "Aadhar Card":
-                print("[INFO] Processing Aadhar Card...")
-                aadhar_fields_raw = extract_aadhar_fields(extracted_text, redact=False)
-                print("RAW Aadhar fields:", aadhar_fields_raw)
-
-                aadhar_fields = extract_aadhar_fields(extracted_text, redact=True)
-                print("REDACTED Aadhar fields:", aadhar_fields)
-
-                extracted_fields = {
-                    'Aadhar Number': aadhar_fields.get('Aadhar_Number'),
-                    'Name': aadhar_fields.get('Name'),
-                    'Date of Birth': aadhar_fields.get('DOB'),
-                    'Address': aadhar_fields.get('Address')
-                }
-
-            elif doc_type == "PAN Card":
-                print("[INFO] Processing PAN Card...")
-                pan_fields_raw = extract_pan_fields(extracted_text, redact=False)
-                print("RAW PAN fields:", pan_fields_raw)
-
-                pan_fields = extract_pan_fields(extracted_text, redact=True)
-                print("REDACTED PAN fields:", pan_fields)
-
-                extracted_fields = {
-                    'PAN Number': pan_fields.get('PAN_Number'),
-                    'Name': pan_fields.get('Name'),
-                    "Father's Name": pan_fields.get('Father_Name'),
-                    'Date of Birth': pan_fields.get('DOB')
-                }
-
-            elif doc_type == "Invoice":
-                print("[INFO] Processing Invoice...")
-                invoice_fields_raw = extract_invoice_fields(extracted_text, redact=False)
-                print("RAW Invoice fields:", invoice_fields_raw)
-
-                invoice_fields = extract_invoice_fields(extracted_text, redact=True)
-                print("REDACTED Invoice fields:", invoice_fields)
-
-                extracted_fields = {
-                    'Invoice Number': invoice_fields.get('Invoice_Number'),
-                    'Date': invoice_fields.get('Date'),
-                    'GST Number': invoice_fields.get('GST_Number'),
-                    'Total Amount': invoice_fields.get('Total_Amount')
-                }
-
-            elif doc_type == "Driving License":
-                print("[INFO] Processing Driving License...")
-                dl_fields_raw = extract_driving_license_fields(extracted_text, redact=False)
-                print("RAW DL fields:", dl_fields_raw)
-
-                dl_fields = extract_driving_license_fields(extracted_text, redact=True)
-                print("REDACTED DL fields:", dl_fields)
-
-                extracted_fields = {
-                    'DL Number': dl_fields.get('DL_Number'),
-                    'Name': dl_fields.get('Name'),
-                    'DOB': dl_fields.get('DOB'),
-                    'Issue Date': dl_fields.get('Issue_Date'),
-                    'Expiry Date': dl_fields.get('Expiry_Date'),
-                    'Blood Group': dl_fields.get('Blood_Group'),
-                    'Address': dl_fields.get('Address')
-                }
-
-            elif doc_type == "Voter ID":
-                print("[INFO] Processing Voter ID...")
-                voter_fields_raw = extract_voter_id_fields(extracted_text, redact=False)
-                print("RAW Voter ID fields:", voter_fields_raw)
-
-                voter_fields = extract_voter_id_fields(extracted_text, redact=True)
-                print("REDACTED Voter ID fields:", voter_fields)
-
-                extracted_fields = {
-                    'Voter ID': voter_fields.get('Voter_ID'),
-                    'Name': voter_fields.get('Name'),
-                    "Father's Name": voter_fields.get('Father_Name'),
-                    'DOB': voter_fields.get('DOB'),
-                    'Address': voter_fields.get('Address')
-                }
-
-            elif doc_type == "ID Card":
-                print("[INFO] Processing ID Card...")
-                id_fields_raw = extract_id_card_fields(extracted_text, redact=False)
-                print("RAW ID Card fields:", id_fields_raw)
-
-                id_fields = extract_id_card_fields(extracted_text, redact=True)
-                print("REDACTED ID Card fields:", id_fields)
-
-                extracted_fields = {
-                    'ID Number': id_fields.get('ID_Number'),
-                    'Name': id_fields.get('Name'),
-                    'DOB': id_fields.get('DOB'),
-                    'Designation': id_fields.get('Designation'),
-                    'Department': id_fields.get('Department'),
-                    'Organization': id_fields.get('Organization'),
-                    'Issue Date': id_fields.get('Issue_Date'),
-                    'Expiry Date': id_fields.get('Expiry_Date')
-                }
-
-            # STEP 6: Generate redacted image URL and PDF report
-            print("\n[STEP 6] Generating outputs...")
-            if redacted_path and os.path.exists(redacted_path):
-                redacted_filename = os.path.basename(redacted_path)
-                redacted_url = fs.url(redacted_filename)
-                print(f"[SUCCESS] Redacted image URL: {redacted_url}")
-
-                # Generate PDF with redacted image and fields
-                try:
-                    pdf_path = generate_redacted_pdf(redacted_path, extracted_fields, doc_type)
-
-                    if pdf_path and os.path.exists(pdf_path):
-                        pdf_filename = os.path.basename(pdf_path)
-                        pdf_media_path = os.path.join(fs.location, pdf_filename)
-                        shutil.copy(pdf_path, pdf_media_path)
-                        pdf_url = fs.url(pdf_filename)
-                        print(f"[SUCCESS] PDF generated: {pdf_url}")
-                    else:
-                        print("[ERROR] PDF generation failed: File not created")
-
-                except Exception as pdf_error:
-                    print(f"[ERROR] PDF generation error: {pdf_error}")
-                    import traceback
-                    traceback.print_exc()
+            result = await aclassify_document(blob, budget)
 
             print("\n" + "=" * 70)
             print("[SUCCESS] Document processing completed!")
             print("=" * 70 + "\n")
 
-            return render(request, 'classification.html', {
+            # Other uploads of this user carrying the same PAN / Aadhaar / GSTIN ...
+            linked_entities = {}
+            if email:
+                linked_entities = await sync_to_async(record_classification)(
+                    email, blob, uploaded_file.name, result)
+
+            await sync_to_async(log_user_action)(
+                request, 'classification', {'blob': blob.digest, 'document_type': result["document_type"]})
+
+            return await sync_to_async(render)(request, 'classification.html', {
                 'status': 'success',
                 'file_name': uploaded_file.name,
-                'file_url': fs.url(filename),
-                'redacted_url': redacted_url,
-                'pdf_url': pdf_url,
-                'extracted_text': extracted_text,
-                'summarized_text': summarized_text,
-                'document_type': doc_type,
-                'confidence': confidence_percentage,
-                'extracted_fields': extracted_fields
+                'file_url': blob_url(blob),
+                'redacted_url': result["redacted_url"],
+                'pdf_url': result["pdf_url"],
+                'extracted_text': result["extracted_text"],
+                'summarized_text': result["summarized_text"],
+                'document_type': result["document_type"],
+                'confidence': result["confidence"],
+                'extracted_fields': result["extracted_fields"],
+                'linked_entities': linked_entities,
+                'skipped_stages': budget.skipped_stages,
             })
 
 
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"\n[ERROR] Main processing error: {e}")
             import traceback
             traceback.print_exc()
 
-            return render(request, 'classification.html', {
+            return await sync_to_async(render)(request, 'classification.html', {
                 'status': 'error',
                 'message': f'Error: {str(e)}'
             })
 
 
-    if email:
-        meta = 'extracted_fields' if 'extracted_fields' else None
-        save_document_entry(
-            email='email',
-            file_name='uploaded_file.name',
-            file_url='fs.url(filename)',
-            document_type='doc_type',
-            confidence='confidence_percentage',
-            extracted_text='extracted_text',
-            summarized_text='summarized_text',
-            redacted_url='redacted_url',
-            pdf_url='pdf_url',
-            operation='classification',
-            meta=meta
-        )
-    return render(request, 'classification.html', {'status': None})
+    return await sync_to_async(render)(request, 'classification.html', {'status': None})
+
+
+def bulk_classification(request):
+    """Classify a ZIP of scans (or several files) and stream one NDJSON record per document"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'POST required'}, status=405)
+
+    archive = request.FILES.get('archive')
+    files = request.FILES.getlist('documents')
+    if archive is None and not files:
+        return JsonResponse({'status': 'error', 'message': 'Upload a ZIP as "archive" or files as "documents"'},
+                            status=400)
+
+    try:
+        documents = store_bulk_upload(archive, files)
+    except BulkUploadError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    email = request.session.get('email')
+    log_user_action(request, 'classification:bulk', {'documents': len(documents)})
+    return ndjson_response(iterate_in_thread(classify_bulk(documents, email=email)))
 
 
-def convert(request):
+@governed
+async def convert(request):
     context = {}
 
     if request.method == "POST":
@@ -783,7 +618,7 @@ def convert(request):
             if not files or len(files) < 2:
                 context["status"] = "error"
                 context["message"] = "Please upload at least 2 PDF files to merge"
-                return render(request, "convert.html", context)
+                return await sync_to_async(render)(request, "convert.html", context)
 
             try:
                 # Save all uploaded files
@@ -791,7 +626,7 @@ def convert(request):
                 input_paths = []
 
                 for uploaded_file in files:
-                    filename = fs.save(uploaded_file.name, uploaded_file)
+                    filename = await run_in("convert", fs.save, uploaded_file.name, uploaded_file)
                     input_path = os.path.join(fs.location, filename)
                     input_paths.append(input_path)
                     print(f"[INFO] Saved: {filename}")
@@ -806,7 +641,7 @@ def convert(request):
 
                 # Merge PDFs
                 from file_conversions.conversions import merge_pdfs
-                success = merge_pdfs(input_paths, output_path)
+                success = await run_in("convert", merge_pdfs, input_paths, output_path)
 
                 if success and os.path.exists(output_path):
                     print(f"[SUCCESS] Merged PDF ready: {output_path}")
@@ -828,7 +663,7 @@ def convert(request):
                     context["status"] = "error"
                     context["message"] = "Failed to merge PDF files"
                     print("[ERROR] Merge failed")
-                    return render(request, "convert.html", context)
+                    return await sync_to_async(render)(request, "convert.html", context)
 
             except Exception as e:
                 context["status"] = "error"
@@ -836,14 +671,14 @@ def convert(request):
                 print(f"[ERROR] PDF merge failed: {e}")
                 import traceback
                 traceback.print_exc()
-                return render(request, "convert.html", context)
+                return await sync_to_async(render)(request, "convert.html", context)
 
         # ------------------- PASSWORD PROTECT PDF -------------------
         if target_format == "protect":
             if not request.FILES.get("file"):
                 context["status"] = "error"
                 context["message"] = "Please upload a PDF file"
-                return render(request, "convert.html", context)
+                return await sync_to_async(render)(request, "convert.html", context)
 
             uploaded_file = request.FILES["file"]
             pdf_password = request.POST.get("pdf_password")
@@ -851,12 +686,12 @@ def convert(request):
             if not pdf_password:
                 context["status"] = "error"
                 context["message"] = "Please provide a password"
-                return render(request, "convert.html", context)
+                return await sync_to_async(render)(request, "convert.html", context)
 
             try:
                 # Save uploaded file
                 fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, "uploads"))
-                filename = fs.save(uploaded_file.name, uploaded_file)
+                filename = await run_in("convert", fs.save, uploaded_file.name, uploaded_file)
                 input_path = os.path.join(fs.location, filename)
 
                 # Prepare output folder
@@ -867,7 +702,7 @@ def convert(request):
                 output_path = os.path.join(output_folder, f"{base_name}_protected.pdf")
 
                 # Protect PDF with password
-                protect_pdf(input_path, output_path, pdf_password)
+                await run_in("convert", protect_pdf, input_path, output_path, pdf_password)
 
                 if os.path.exists(output_path):
                     print(f"[SUCCESS] PDF protected: {output_path}")
@@ -883,92 +718,37 @@ def convert(request):
                 print(f"[ERROR] PDF protection failed: {e}")
                 import traceback
                 traceback.print_exc()
-                return render(request, "convert.html", context)
+                return await sync_to_async(render)(request, "convert.html", context)
 
         # ------------------- REGULAR FILE CONVERSIONS -------------------
         elif request.FILES.get("file"):
             uploaded_file = request.FILES["file"]
 
-            # Save uploaded file
-            fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, "uploads"))
-            filename = fs.save(uploaded_file.name, uploaded_file)
-            input_path = os.path.join(fs.location, filename)
+            # Same content uploaded again maps to the same blob
+            blob = await sync_to_async(store_upload)(uploaded_file)
 
-            # Prepare output folder
-            output_folder = os.path.join(settings.MEDIA_ROOT, "converted")
-            os.makedirs(output_folder, exist_ok=True)
-
-            base_name = os.path.splitext(filename)[0]
+            # Kills LibreOffice / Poppler / Tesseract if the conversion outlives the request
+            cancel_token = CancellationToken.with_timeout(settings.CONVERSION_TIMEOUT)
 
             try:
-                ext = uploaded_file.name.split(".")[-1].lower()
-                print(f"[INFO] Converting {ext} to {target_format}")
-
-                # ------------------- TO PDF -------------------
-                if target_format == "pdf":
-                    output_path = os.path.join(output_folder, f"{base_name}_converted.pdf")
-
-                    if ext in ["jpg", "jpeg", "png"]:
-                        jpg_to_pdf(input_path, output_path)
-                    elif ext in ["doc", "docx"]:
-                        word_to_pdf(input_path, output_path)
-                    elif ext in ["ppt", "pptx"]:
-                        ppt_to_pdf(input_path, output_path)
-                    elif ext in ["xls", "xlsx"]:
-                        excel_to_pdf(input_path, output_path)
-
-                    if os.path.exists(output_path):
-                        print(f"[SUCCESS] Converted to PDF: {output_path}")
-                        return FileResponse(
-                            open(output_path, "rb"),
-                            as_attachment=True,
-                            filename=os.path.basename(output_path),
-                        )
-
-                # ------------------- FROM PDF -------------------
-                elif ext == "pdf":
-                    if target_format == "jpg":
-                        temp_dir = tempfile.mkdtemp()
-                        jpg_files = pdf_to_jpg(input_path, temp_dir)
-
-                        zip_filename = f"{base_name}_images.zip"
-                        zip_path = os.path.join(output_folder, zip_filename)
-                        with zipfile.ZipFile(zip_path, "w") as zipf:
-                            for jpg in jpg_files:
-                                zipf.write(jpg, os.path.basename(jpg))
-
-                        if os.path.exists(zip_path):
-                            print(f"[SUCCESS] Converted to JPG (ZIP): {zip_path}")
-                            return FileResponse(
-                                open(zip_path, "rb"),
-                                as_attachment=True,
-                                filename=zip_filename,
-                            )
-
-                    elif target_format == "word":
-                        output_path = os.path.join(output_folder, f"{base_name}.docx")
-                        pdf_to_word(input_path, output_path)
-
-                    elif target_format == "ppt":
-                        output_path = os.path.join(output_folder, f"{base_name}.pptx")
-                        pdf_to_ppt(input_path, output_path)
-
-                    elif target_format == "excel":
-                        output_path = os.path.join(output_folder, f"{base_name}.xlsx")
-                        pdf_to_excel(input_path, output_path)
-
-                    if os.path.exists(output_path):
-                        print(f"[SUCCESS] Converted from PDF: {output_path}")
-                        return FileResponse(
-                            open(output_path, "rb"),
-                            as_attachment=True,
-                            filename=os.path.basename(output_path),
-                        )
+                output_blob, output_filename = await aconvert_document(
+                    blob, uploaded_file.name, target_format, cancel_token)
+                await sync_to_async(log_user_action)(
+                    request, f"convert:{target_format}", {'blob': blob.digest, 'output': output_blob.digest})
+                return FileResponse(open(blob_path(output_blob), "rb"), as_attachment=True, filename=output_filename)
 
-                else:
-                    context["status"] = "error"
-                    context["message"] = f"Unsupported file type: {ext}"
-                    print(f"[ERROR] {context['message']}")
+            except UnsupportedConversion as e:
+                context["status"] = "error"
+                context["message"] = str(e)
+                print(f"[ERROR] {context['message']}")
+
+            except OperationCancelled as e:
+                context["status"] = "error"
+                context["message"] = "Conversion took too long and was stopped. Please try a smaller file."
+                print(f"[WARNING] Conversion cancelled: {e}")
+
+            except Overloaded:
+                raise
 
             except Exception as e:
                 context["status"] = "error"
@@ -977,4 +757,123 @@ def convert(request):
                 import traceback
                 traceback.print_exc()
 
-    return render(request, "convert.html", context)
\ No newline at end of file
+    return await sync_to_async(render)(request, "convert.html", context)
+
+# ------------------- BACKGROUND JOBS -------------------
+
+# Upload field per job type (same names as the synchronous forms)
+JOB_UPLOAD_FIELDS = {"ocr": "image", "classification": "document", "convert": "file"}
+CONVERT_TARGET_FORMATS = ["pdf", "jpg", "word", "ppt", "excel"]
+
+
+def job_to_dict(job):
+    return {
+        'id': str(job.id),
+        'job_type': job.job_type,
+        'status': job.status,
+        'result': job.result,
+        'progress': job.progress,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def enqueue_job(request, job_type):
+    """Queue an OCR / classification / conversion job; returns its id straight away (202)"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'POST required'}, status=405)
+    if job_type not in JOB_UPLOAD_FIELDS:
+        return JsonResponse({'status': 'error', 'message': f'Unknown job type: {job_type}'}, status=404)
+
+    uploaded_file = request.FILES.get(JOB_UPLOAD_FIELDS[job_type]) or request.FILES.get('file')
+    if not uploaded_file:
+        return JsonResponse({'status': 'error', 'message': 'No file uploaded'}, status=400)
+
+    options = {}
+    if job_type == 'convert':
+        target_format = request.POST.get('target_format')
+        if target_format not in CONVERT_TARGET_FORMATS:
+            return JsonResponse({'status': 'error', 'message': f'Unsupported target format: {target_format}'}, status=400)
+        options['target_format'] = target_format
+
+    try:
+        blob = store_upload(uploaded_file)
+        job = enqueue(job_type, blob, uploaded_file.name, email=request.session.get('email'), **options)
+    except Exception as e:
+        print(f"[ERROR] Could not queue {job_type} job: {e}")
+        return JsonResponse({'status': 'error', 'message': 'Could not queue the job'}, status=500)
+
+    log_user_action(request, f"job:{job_type}", {'job': str(job.id), 'blob': blob.digest})
+    response = job_to_dict(job)
+    response['status_url'] = reverse('job_status', args=[job.id])
+    response['events_url'] = reverse('job_events', args=[job.id])
+    return JsonResponse(response, status=202)
+
+
+def resource_metrics(request):
+    """Queue depth and usage of the governed resources (soffice, tesseract, ...), for staff and monitoring"""
+    allowed = settings.GOVERNOR['METRICS_ALLOWED_ADDRESSES']
+    if not request.user.is_staff and governor.client_address(request) not in allowed:
+        return JsonResponse({'status': 'error', 'message': 'Forbidden'}, status=403)
+    return JsonResponse(governor.metrics())
+
+
+def visible_job(request, job_id):
+    job = Job.objects.filter(pk=job_id).first()
+    # Jobs of logged-in users are only visible to them
+    if job is None or (job.email and job.email != request.session.get('email')):
+        return None
+    return job
+
+
+def job_status(request, job_id):
+    """Status of a job, with its result once it has finished"""
+    job = visible_job(request, job_id)
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+    return JsonResponse(job_to_dict(job))
+
+
+# Seconds between SSE comments that keep idle proxies from closing the stream
+JOB_EVENTS_KEEPALIVE = 15
+
+
+def job_events(request, job_id):
+    """
+    Stream a job's progress as Server-Sent Events: `status` when it changes,
+    `progress` per converted page ({"page", "pages", "outputs"}), then `done`
+    with the final job (same shape as job_status) and the stream ends.
+    """
+    job = visible_job(request, job_id)
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+
+    interval = settings.JOB_QUEUE["PROGRESS_INTERVAL"]
+
+    async def events():
+        status = progress = None
+        last_sent = time.monotonic()
+        while True:
+            current = await Job.objects.filter(pk=job_id).afirst()
+            if current is None:
+                yield format_event({'message': 'Job was deleted'}, event='error')
+                return
+            if current.status != status:
+                status = current.status
+                yield format_event({'status': status}, event='status')
+                last_sent = time.monotonic()
+            if current.progress and current.progress != progress:
+                progress = current.progress
+                yield format_event(progress, event='progress')
+                last_sent = time.monotonic()
+            if status in (Job.SUCCEEDED, Job.FAILED):
+                yield format_event(job_to_dict(current), event='done')
+                return
+            if time.monotonic() - last_sent >= JOB_EVENTS_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(interval)
+
+    return event_stream_response(events())
@@ -10,10 +10,30 @@ from reportlab.lib import colors
 from PIL import Image as PILImage
 
 
-def extract_text_from_image(image_path):
+def ocr_image_to_string(image, cancel_token=None):
+    """Tesseract image_to_string; with a cancel token the tesseract process is killed on cancel"""
+    if cancel_token is None:
+        return pytesseract.image_to_string(image)
+
+    with pytesseract.pytesseract.save(image) as (_, input_filename):
+        result = cancel_token.run([pytesseract.pytesseract.tesseract_cmd, input_filename, "stdout"])
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def ocr_image_to_data(image, cancel_token=None):
+    """Tesseract image_to_data as a dict of columns; cancellable like ocr_image_to_string"""
+    if cancel_token is None:
+        return pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+    with pytesseract.pytesseract.save(image) as (_, input_filename):
+        result = cancel_token.run([pytesseract.pytesseract.tesseract_cmd, input_filename, "stdout", "tsv"])
+    return pytesseract.pytesseract.file_to_dict(result.stdout.decode("utf-8", errors="replace"), "\t", -1)
+
+
+def extract_text_from_image(image_path, cancel_token=None):
     """Extract text from image using Tesseract OCR"""
     img = Image.open(image_path).convert("RGB")
-    text = pytesseract.image_to_string(img)
+    text = ocr_image_to_string(img, cancel_token)
     return text
 
 
@@ -466,13 +486,13 @@ def extract_id_card_fields(text, redact=False):
     }
 
 
-def redact_sensitive_information(image_path, doc_type):
-    """Redact image with black boxes"""
-    img = cv2.imread(image_path)
+def redact_sensitive_information(image_path, doc_type, cancel_token=None, image=None):
+    """Redact image with black boxes; `image` is the decoded BGR scan if already loaded (left unchanged)"""
+    img = image.copy() if image is not None else cv2.imread(image_path)
     if img is None:
         return None
 
-    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+    data = ocr_image_to_data(img, cancel_token)
 
     if doc_type == "Aadhar Card":
         patterns_to_redact = [
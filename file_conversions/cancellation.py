@@ -0,0 +1,146 @@
+"""
+cancellation.py - Cancellation tokens for OCR and conversion work
+A token is shared by everything one request starts. Cancelling it (or
+letting its deadline pass) kills the Tesseract / LibreOffice / Poppler
+child processes it tracks, and the helpers remove their partial output
+"""
+
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+
+class OperationCancelled(Exception):
+    """Raised inside a helper when its request was cancelled or ran out of time."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation with an optional deadline.
+
+    Args:
+        deadline: Absolute time.monotonic() after which the token counts as cancelled
+    """
+
+    # How often a running subprocess is checked against the token
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+
+    @classmethod
+    def with_timeout(cls, seconds):
+        """Token that cancels itself `seconds` from now (never, if seconds is None)."""
+        return cls(None if seconds is None else time.monotonic() + seconds)
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def remaining(self):
+        """Seconds left before the deadline (None if there is no deadline)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason="cancelled"):
+        """Cancel the token and kill every child process it is tracking."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            processes = list(self._processes)
+
+        print(f"[INFO] Cancelling {len(processes)} running processes: {reason}")
+        for proc in processes:
+            _kill_process_group(proc)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+    def run(self, cmd, check=True, **kwargs):
+        """
+        subprocess.run() replacement that kills the child (and its children) on cancel.
+
+        Output is always captured. Returns a CompletedProcess.
+        """
+        self.raise_if_cancelled()
+
+        # A new session lets us kill helpers the command spawns (soffice -> soffice.bin)
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+            **kwargs,
+        )
+        with self._lock:
+            self._processes.add(proc)
+
+        try:
+            # Reader thread keeps the pipes drained while we poll the token
+            output = {}
+            reader = threading.Thread(target=lambda: output.update(zip(("stdout", "stderr"), proc.communicate())))
+            reader.daemon = True
+            reader.start()
+
+            while reader.is_alive():
+                if self.cancelled:
+                    _kill_process_group(proc)
+                    reader.join()
+                    raise OperationCancelled(self.reason)
+                reader.join(self.POLL_INTERVAL)
+        finally:
+            with self._lock:
+                self._processes.discard(proc)
+
+        # cancel() from another thread may have killed the process after the last poll
+        self.raise_if_cancelled()
+
+        if check and proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, output.get("stdout"), output.get("stderr"))
+        return subprocess.CompletedProcess(cmd, proc.returncode, output.get("stdout"), output.get("stderr"))
+
+    @contextmanager
+    def cleanup_on_cancel(self, *paths):
+        """Remove partial output files / folders if the wrapped block is cancelled."""
+        try:
+            yield
+        except OperationCancelled:
+            for path in paths:
+                remove_path(path)
+            raise
+
+
+def remove_path(path):
+    """Delete a file or folder, ignoring anything that is already gone."""
+    if not path or not os.path.exists(path):
+        return
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+    except OSError as e:
+        print(f"[WARNING] Could not remove {path}: {e}")
+
+
+def _kill_process_group(proc):
+    if proc.poll() is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        proc.kill()
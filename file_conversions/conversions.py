@@ -5,16 +5,17 @@ Includes PDF merging and password protection
 """
 
 import os
+import re
 import sys
 import tempfile
-import subprocess
 from PIL import Image
-from pdf2image import convert_from_path
-import pytesseract
 from docx import Document
 from docx.shared import Inches
 import zipfile
 
+from file_conversions.cancellation import CancellationToken, OperationCancelled, remove_path
+from document_classification.ocr_extraction import ocr_image_to_string
+
 # Handle different PyPDF2/pypdf versions
 try:
     from pypdf import PdfMerger, PdfReader, PdfWriter
@@ -74,13 +75,14 @@ def jpg_to_pdf(input_path, output_path):
 # WORD TO PDF (MacOS - using LibreOffice)
 # =====================================================================
 
-def word_to_pdf(input_path, output_path):
+def word_to_pdf(input_path, output_path, cancel_token=None):
     """
     Convert Word document to PDF using LibreOffice (MacOS).
 
     Args:
         input_path: Path to input Word file (.doc or .docx)
         output_path: Path to save PDF
+        cancel_token: CancellationToken that kills soffice when the request is abandoned
     """
     try:
         # Ensure absolute paths
@@ -110,12 +112,14 @@ def word_to_pdf(input_path, output_path):
                 input_path
             ]
 
-            subprocess.run(cmd, check=True, capture_output=True)
-
             # LibreOffice saves with original filename, rename if needed
             base_name = os.path.splitext(os.path.basename(input_path))[0]
             generated_pdf = os.path.join(output_dir, f"{base_name}.pdf")
 
+            cancel_token = cancel_token or CancellationToken()
+            with cancel_token.cleanup_on_cancel(generated_pdf, output_path):
+                cancel_token.run(cmd)
+
             if generated_pdf != output_path and os.path.exists(generated_pdf):
                 os.rename(generated_pdf, output_path)
 
@@ -154,13 +158,14 @@ def word_to_pdf(input_path, output_path):
 # POWERPOINT TO PDF (MacOS - using LibreOffice)
 # =====================================================================
 
-def ppt_to_pdf(input_path, output_path):
+def ppt_to_pdf(input_path, output_path, cancel_token=None):
     """
     Convert PowerPoint presentation to PDF using LibreOffice (MacOS).
 
     Args:
         input_path: Path to input PowerPoint file (.ppt or .pptx)
         output_path: Path to save PDF
+        cancel_token: CancellationToken that kills soffice when the request is abandoned
     """
     try:
         # Ensure absolute paths
@@ -190,12 +195,14 @@ def ppt_to_pdf(input_path, output_path):
                 input_path
             ]
 
-            subprocess.run(cmd, check=True, capture_output=True)
-
             # LibreOffice saves with original filename, rename if needed
             base_name = os.path.splitext(os.path.basename(input_path))[0]
             generated_pdf = os.path.join(output_dir, f"{base_name}.pdf")
 
+            cancel_token = cancel_token or CancellationToken()
+            with cancel_token.cleanup_on_cancel(generated_pdf, output_path):
+                cancel_token.run(cmd)
+
             if generated_pdf != output_path and os.path.exists(generated_pdf):
                 os.rename(generated_pdf, output_path)
 
@@ -213,13 +220,14 @@ def ppt_to_pdf(input_path, output_path):
 # EXCEL TO PDF (MacOS - using LibreOffice)
 # =====================================================================
 
-def excel_to_pdf(input_path, output_path):
+def excel_to_pdf(input_path, output_path, cancel_token=None):
     """
     Convert Excel spreadsheet to PDF using LibreOffice (MacOS).
 
     Args:
         input_path: Path to input Excel file (.xls or .xlsx)
         output_path: Path to save PDF
+        cancel_token: CancellationToken that kills soffice when the request is abandoned
     """
     try:
         # Ensure absolute paths
@@ -249,12 +257,14 @@ def excel_to_pdf(input_path, output_path):
                 input_path
             ]
 
-            subprocess.run(cmd, check=True, capture_output=True)
-
             # LibreOffice saves with original filename, rename if needed
             base_name = os.path.splitext(os.path.basename(input_path))[0]
             generated_pdf = os.path.join(output_dir, f"{base_name}.pdf")
 
+            cancel_token = cancel_token or CancellationToken()
+            with cancel_token.cleanup_on_cancel(generated_pdf, output_path):
+                cancel_token.run(cmd)
+
             if generated_pdf != output_path and os.path.exists(generated_pdf):
                 os.rename(generated_pdf, output_path)
 
@@ -268,34 +278,82 @@ def excel_to_pdf(input_path, output_path):
         raise
 
 
+# =====================================================================
+# PDF RASTERIZATION
+# =====================================================================
+
+def rasterize_pdf(input_path, dpi, cancel_token=None, pages_per_batch=4):
+    """
+    Render PDF pages a few at a time instead of the whole file at once.
+
+    pdfinfo and every pdftoppm call run through the token, which kills them
+    (in their own process group) as soon as it is cancelled or its deadline
+    passes; between batches the token is checked again.
+
+    Yields:
+        (page_number, page_count, PIL image) for every page, in order
+    """
+    cancel_token = cancel_token or CancellationToken()
+    cancel_token.raise_if_cancelled()
+
+    info = cancel_token.run(["pdfinfo", input_path]).stdout.decode(errors="replace")
+    page_count = int(re.search(r"^Pages:\s*(\d+)", info, re.MULTILINE).group(1))
+
+    for first_page in range(1, page_count + 1, pages_per_batch):
+        cancel_token.raise_if_cancelled()
+        last_page = min(first_page + pages_per_batch - 1, page_count)
+        with tempfile.TemporaryDirectory() as batch_dir:
+            cancel_token.run([
+                "pdftoppm", "-r", str(dpi), "-f", str(first_page), "-l", str(last_page),
+                input_path, os.path.join(batch_dir, "page"),
+            ])
+            images = []
+            # page-1.ppm, or page-01.ppm etc. depending on the page count
+            for name in sorted(os.listdir(batch_dir), key=lambda name: int(name.rsplit("-", 1)[1].split(".")[0])):
+                with Image.open(os.path.join(batch_dir, name)) as image:
+                    image.load()
+                    images.append(image.copy())
+
+        for page_number, image in enumerate(images, start=first_page):
+            yield page_number, page_count, image
+
+
 # =====================================================================
 # PDF TO IMAGE
 # =====================================================================
 
-def pdf_to_jpg(input_path, output_folder):
+def pdf_to_jpg(input_path, output_folder, cancel_token=None, progress=None):
     """
     Convert PDF pages to JPG images.
 
     Args:
         input_path: Path to input PDF file
         output_folder: Folder to save JPG images
+        cancel_token: CancellationToken; written pages are removed on cancel
+        progress: Optional callback(page_number, page_count, page_path), called
+            as soon as each image is written
 
     Returns:
         List of paths to generated JPG files
     """
+    cancel_token = cancel_token or CancellationToken()
+    jpg_files = []
     try:
-        # Convert PDF to images
-        images = convert_from_path(input_path, dpi=300)
-
-        jpg_files = []
-        for i, image in enumerate(images, start=1):
+        for i, page_count, image in rasterize_pdf(input_path, 300, cancel_token):
             output_path = os.path.join(output_folder, f'page_{i}.jpg')
-            image.save(output_path, 'JPEG', quality=95)
             jpg_files.append(output_path)
+            image.save(output_path, 'JPEG', quality=95)
+            if progress:
+                progress(i, page_count, output_path)
 
         print(f"[SUCCESS] PDF converted to {len(jpg_files)} JPG images")
         return jpg_files
 
+    except OperationCancelled:
+        for path in jpg_files:
+            remove_path(path)
+        print(f"[INFO] PDF to JPG conversion cancelled: {cancel_token.reason}")
+        raise
     except Exception as e:
         print(f"[ERROR] PDF to JPG conversion failed: {e}")
         raise
@@ -305,72 +363,83 @@ def pdf_to_jpg(input_path, output_folder):
 # PDF TO WORD
 # =====================================================================
 
-def pdf_to_word(input_path, output_path):
+def pdf_to_word(input_path, output_path, cancel_token=None, progress=None):
     """
     Convert PDF to Word document by extracting text and images.
 
     Args:
         input_path: Path to input PDF file
         output_path: Path to save Word document
+        cancel_token: CancellationToken that stops rendering / OCR when the request is abandoned
+        progress: Optional callback(page_number, page_count, None) after each page
     """
+    cancel_token = cancel_token or CancellationToken()
+    temp_dir = tempfile.mkdtemp(prefix="pdf_to_word_")
     try:
-        # Convert PDF pages to images
-        images = convert_from_path(input_path, dpi=200)
-
         # Create Word document
         doc = Document()
 
-        for i, image in enumerate(images, start=1):
-            # Extract text using OCR
-            text = pytesseract.image_to_string(image)
+        with cancel_token.cleanup_on_cancel(output_path):
+            for i, page_count, image in rasterize_pdf(input_path, 200, cancel_token):
+                # Extract text using OCR
+                text = ocr_image_to_string(image, cancel_token)
 
-            # Add text to document
-            if text.strip():
-                doc.add_paragraph(text)
+                # Add text to document
+                if text.strip():
+                    doc.add_paragraph(text)
 
-            # Add page image
-            temp_image_path = os.path.join(tempfile.gettempdir(), f'page_{i}.png')
-            image.save(temp_image_path, 'PNG')
+                # Add page image
+                temp_image_path = os.path.join(temp_dir, f'page_{i}.png')
+                image.save(temp_image_path, 'PNG')
 
-            try:
-                doc.add_picture(temp_image_path, width=Inches(6))
-            except:
-                pass  # Skip if image can't be added
+                try:
+                    doc.add_picture(temp_image_path, width=Inches(6))
+                except:
+                    pass  # Skip if image can't be added
+
+                # Add page break (except for last page)
+                if i < page_count:
+                    doc.add_page_break()
 
-            # Add page break (except for last page)
-            if i < len(images):
-                doc.add_page_break()
+                if progress:
+                    progress(i, page_count, None)
 
-        # Save document
-        doc.save(output_path)
+            # Save document
+            doc.save(output_path)
 
         print(f"[SUCCESS] PDF converted to Word: {output_path}")
         return output_path
 
+    except OperationCancelled:
+        print(f"[INFO] PDF to Word conversion cancelled: {cancel_token.reason}")
+        raise
     except Exception as e:
         print(f"[ERROR] PDF to Word conversion failed: {e}")
         raise
+    finally:
+        remove_path(temp_dir)
 
 
 # =====================================================================
 # PDF TO POWERPOINT
 # =====================================================================
 
-def pdf_to_ppt(input_path, output_path):
+def pdf_to_ppt(input_path, output_path, cancel_token=None, progress=None):
     """
     Convert PDF to PowerPoint by converting pages to images.
 
     Args:
         input_path: Path to input PDF file
         output_path: Path to save PowerPoint file
+        cancel_token: CancellationToken that stops rendering when the request is abandoned
+        progress: Optional callback(page_number, page_count, None) after each slide
     """
+    cancel_token = cancel_token or CancellationToken()
+    temp_dir = tempfile.mkdtemp(prefix="pdf_to_ppt_")
     try:
         from pptx import Presentation
         from pptx.util import Inches
 
-        # Convert PDF pages to images
-        images = convert_from_path(input_path, dpi=150)
-
         # Create presentation
         prs = Presentation()
 
@@ -378,45 +447,58 @@ def pdf_to_ppt(input_path, output_path):
         prs.slide_width = Inches(10)
         prs.slide_height = Inches(7.5)
 
-        for i, image in enumerate(images, start=1):
-            # Add blank slide
-            blank_slide_layout = prs.slide_layouts[6]  # Blank layout
-            slide = prs.slides.add_slide(blank_slide_layout)
+        with cancel_token.cleanup_on_cancel(output_path):
+            for i, page_count, image in rasterize_pdf(input_path, 150, cancel_token):
+                # Add blank slide
+                blank_slide_layout = prs.slide_layouts[6]  # Blank layout
+                slide = prs.slides.add_slide(blank_slide_layout)
 
-            # Save image temporarily
-            temp_image_path = os.path.join(tempfile.gettempdir(), f'page_{i}.png')
-            image.save(temp_image_path, 'PNG')
+                # Save image temporarily
+                temp_image_path = os.path.join(temp_dir, f'page_{i}.png')
+                image.save(temp_image_path, 'PNG')
 
-            # Add image to slide (centered)
-            left = Inches(0.5)
-            top = Inches(0.5)
-            height = Inches(6.5)
+                # Add image to slide (centered)
+                left = Inches(0.5)
+                top = Inches(0.5)
+                height = Inches(6.5)
 
-            slide.shapes.add_picture(temp_image_path, left, top, height=height)
+                slide.shapes.add_picture(temp_image_path, left, top, height=height)
 
-        # Save presentation
-        prs.save(output_path)
+                if progress:
+                    progress(i, page_count, None)
+
+            # Save presentation
+            prs.save(output_path)
 
         print(f"[SUCCESS] PDF converted to PowerPoint: {output_path}")
         return output_path
 
+    except OperationCancelled:
+        print(f"[INFO] PDF to PowerPoint conversion cancelled: {cancel_token.reason}")
+        raise
     except Exception as e:
         print(f"[ERROR] PDF to PowerPoint conversion failed: {e}")
         raise
+    finally:
+        remove_path(temp_dir)
 
 
 # =====================================================================
 # PDF TO EXCEL
 # =====================================================================
 
-def pdf_to_excel(input_path, output_path):
+def pdf_to_excel(input_path, output_path, cancel_token=None, progress=None):
     """
     Convert PDF to Excel by extracting text and attempting to parse tables.
 
     Args:
         input_path: Path to input PDF file
         output_path: Path to save Excel file
+        cancel_token: CancellationToken that stops rendering / OCR when the request is abandoned
+        progress: Optional callback(page_number, page_count, None) after each OCR'd page
+            (table extraction runs in one step and reports nothing)
     """
+    cancel_token = cancel_token or CancellationToken()
     try:
         import pandas as pd
         from openpyxl import Workbook
@@ -440,12 +522,13 @@ def pdf_to_excel(input_path, output_path):
             print(f"[WARNING] Tabula extraction failed: {tabula_error}")
 
         # Fallback: Extract text and create simple Excel
-        images = convert_from_path(input_path, dpi=150)
         extracted_text = []
 
-        for image in images:
-            text = pytesseract.image_to_string(image)
+        for i, page_count, image in rasterize_pdf(input_path, 150, cancel_token):
+            text = ocr_image_to_string(image, cancel_token)
             extracted_text.append(text)
+            if progress:
+                progress(i, page_count, None)
 
         # Create Excel workbook
         wb = Workbook()
@@ -466,6 +549,9 @@ def pdf_to_excel(input_path, output_path):
         print(f"[SUCCESS] PDF converted to Excel (text extraction): {output_path}")
         return output_path
 
+    except OperationCancelled:
+        print(f"[INFO] PDF to Excel conversion cancelled: {cancel_token.reason}")
+        raise
     except Exception as e:
         print(f"[ERROR] PDF to Excel conversion failed: {e}")
         raise
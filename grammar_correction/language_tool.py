@@ -0,0 +1,333 @@
+"""
+language_tool.py - Grammar correction against a LanguageTool HTTP server
+Splits OCR text into paragraphs, checks them concurrently over a pooled
+HTTP session and caches corrected paragraphs by content hash
+"""
+
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_SERVER_URL = "http://localhost:8081"
+
+# Connecting to a local server should be instant; a slow connect means it is down
+CONNECT_TIMEOUT = 1.0
+
+# Blank lines separate paragraphs; the separators are kept so the text reassembles exactly
+PARAGRAPH_SEPARATOR = re.compile(r"(\n[ \t]*\n\s*)")
+
+
+# =====================================================================
+# HELPERS
+# =====================================================================
+
+def split_paragraphs(text):
+    """
+    Split text on blank lines.
+
+    Returns:
+        List alternating paragraph, separator, paragraph, ... so that
+        "".join(parts) == text
+    """
+    return PARAGRAPH_SEPARATOR.split(text)
+
+
+def apply_corrections(text, matches):
+    """
+    Apply the first suggested replacement of every LanguageTool match.
+
+    Args:
+        text: Text that was checked
+        matches: "matches" list from a /v2/check response
+    """
+    corrected = text
+    last_start = len(text)
+
+    # Work backwards so earlier offsets stay valid; skip overlapping matches
+    for match in sorted(matches, key=lambda m: m["offset"], reverse=True):
+        replacements = match.get("replacements") or []
+        start = match["offset"]
+        end = start + match["length"]
+        if not replacements or end > last_start:
+            continue
+        corrected = corrected[:start] + replacements[0]["value"] + corrected[end:]
+        last_start = start
+
+    return corrected
+
+
+def paragraph_cache_key(language, paragraph):
+    """Cache key for a paragraph: its SHA-256 digest, scoped by language."""
+    digest = hashlib.sha256(paragraph.encode("utf-8")).hexdigest()
+    return f"languagetool:{language}:{digest}"
+
+
+# =====================================================================
+# CIRCUIT BREAKER
+# =====================================================================
+
+class CircuitOpenError(Exception):
+    """Raised when grammar correction is skipped because the server is unhealthy."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open circuit breaker.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds to stay open before letting one trial call through
+        clock: Monotonic time source (injectable for tests)
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """True while calls are being skipped (open and not yet due for a trial call)."""
+        with self._lock:
+            return self.state == self.OPEN and self.clock() - self.opened_at < self.reset_timeout
+
+    def allow_request(self):
+        """True if a call may go to the server right now."""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("[INFO] LanguageTool circuit closed")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self):
+        """Open the circuit immediately (used by the health probe)."""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            print("[WARNING] LanguageTool circuit opened, skipping grammar correction")
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+
+
+# =====================================================================
+# CLIENT
+# =====================================================================
+
+class LanguageToolClient:
+    """
+    Paragraph-level LanguageTool client.
+
+    Args:
+        server_url: Base URL of the LanguageTool server
+        language: Language code sent with every check
+        max_workers: Paragraphs checked in parallel (also the HTTP pool size)
+        timeout: Default latency budget in seconds for one correct() call
+        cache: Django cache used for corrected paragraphs (defaults to the "grammar" cache)
+        breaker: CircuitBreaker guarding the server (a default one is created)
+    """
+
+    def __init__(self, server_url=DEFAULT_SERVER_URL, language="en-US", max_workers=4, timeout=10,
+                 cache=None, breaker=None):
+        self.server_url = server_url.rstrip("/")
+        self.language = language
+        self.timeout = timeout
+        self.cache = cache if cache is not None else _default_cache()
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="languagetool")
+
+        self._probe_thread = None
+        self._probe_stop = threading.Event()
+
+    @property
+    def available(self):
+        """False while the circuit is open; correct() would raise CircuitOpenError."""
+        return not self.breaker.is_open()
+
+    def check(self, text, deadline=None):
+        """
+        Return the LanguageTool matches for one piece of text.
+
+        Args:
+            text: Text to check
+            deadline: Absolute time.monotonic() by which the call must finish
+        """
+        deadline = deadline or time.monotonic() + self.timeout
+        remaining = deadline - time.monotonic()
+        # Before allow_request(): a half-open trial slot must never be taken by a call that is not made
+        if remaining <= 0:
+            raise TimeoutError("LanguageTool deadline passed before the check started")
+
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("LanguageTool circuit is open")
+
+        healthy = False
+        try:
+            response = self.session.post(
+                f"{self.server_url}/v2/check",
+                data={"text": text, "language": self.language},
+                timeout=(min(CONNECT_TIMEOUT, remaining), remaining),
+            )
+            # A rejected request (e.g. 413 text too long) still shows the server is up
+            healthy = response.status_code < 500
+            response.raise_for_status()
+            matches = response.json().get("matches", [])
+        except ValueError:
+            healthy = False
+            raise
+        finally:
+            # Every exit records an outcome, so a half-open trial is always resolved
+            if healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+        return matches
+
+    def correct_paragraph(self, paragraph, deadline=None):
+        """Check one paragraph and return (corrected_paragraph, corrections_applied)."""
+        matches = self.check(paragraph, deadline)
+        return apply_corrections(paragraph, matches), len(matches)
+
+    def correct(self, text, budget=None):
+        """
+        Grammar-correct text paragraph by paragraph.
+
+        Cached paragraphs are reused; the rest are checked concurrently and cached.
+        Paragraphs whose check misses the deadline or fails keep their original text.
+
+        Args:
+            text: Text to correct
+            budget: Seconds this call may take (defaults to the client timeout)
+
+        Returns:
+            (corrected_text, corrections_applied)
+
+        Raises:
+            CircuitOpenError: The server is known to be unhealthy; nothing was sent
+        """
+        if not text or not text.strip():
+            return text, 0
+
+        if not self.available:
+            raise CircuitOpenError("LanguageTool circuit is open")
+
+        deadline = time.monotonic() + (self.timeout if budget is None else min(budget, self.timeout))
+
+        parts = split_paragraphs(text)
+        # Even indices are paragraphs, odd indices the blank-line separators
+        indexes = [i for i in range(0, len(parts), 2) if parts[i].strip()]
+        keys = {i: paragraph_cache_key(self.language, parts[i]) for i in indexes}
+
+        results = self.cache.get_many(list(set(keys.values())))
+        # Repeated paragraphs within one document are only checked once
+        pending = {keys[i]: parts[i] for i in indexes if keys[i] not in results}
+
+        print(f"[INFO] Grammar check: {len(indexes)} paragraphs, {len(pending)} sent to LanguageTool")
+
+        futures = {
+            key: self.executor.submit(self.correct_paragraph, paragraph, deadline)
+            for key, paragraph in pending.items()
+        }
+        wait(futures.values(), timeout=max(0, deadline - time.monotonic()))
+
+        checked = {}
+        for key, future in futures.items():
+            if future.done() and not future.exception():
+                checked[key] = future.result()
+            else:
+                future.cancel()
+
+        if len(checked) < len(futures):
+            print(f"[WARNING] {len(futures) - len(checked)} paragraphs not corrected within the deadline")
+        if checked:
+            self.cache.set_many({key: list(result) for key, result in checked.items()}, timeout=None)
+            results.update(checked)
+
+        corrections = 0
+        for i in indexes:
+            if keys[i] in results:
+                corrected, count = results[keys[i]]
+                parts[i] = corrected
+                corrections += count
+
+        return "".join(parts), corrections
+
+    # -----------------------------------------------------------------
+    # Health probe
+    # -----------------------------------------------------------------
+
+    def probe(self):
+        """Ping the server once and update the circuit breaker. Returns True if healthy."""
+        try:
+            response = self.session.get(f"{self.server_url}/v2/languages", timeout=(CONNECT_TIMEOUT, 2))
+            healthy = response.ok
+        except requests.RequestException:
+            healthy = False
+
+        if healthy:
+            self.breaker.record_success()
+        else:
+            self.breaker.trip()
+        return healthy
+
+    def start_health_probe(self, interval=15):
+        """Probe the server every `interval` seconds on a daemon thread."""
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+
+        def run():
+            while not self._probe_stop.is_set():
+                self.probe()
+                self._probe_stop.wait(interval)
+
+        self._probe_stop.clear()
+        self._probe_thread = threading.Thread(target=run, name="languagetool-probe", daemon=True)
+        self._probe_thread.start()
+
+    def stop_health_probe(self):
+        self._probe_stop.set()
+        if self._probe_thread:
+            self._probe_thread.join(timeout=5)
+
+    def close(self):
+        self.stop_health_probe()
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+def _default_cache():
+    from django.core.cache import caches
+
+    return caches["grammar"]
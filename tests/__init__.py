@@ -0,0 +1,54 @@
+import io
+
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from DocumentIntelligence import db
+from DocumentIntelligence.schema import ensure_schema
+
+
+def read_streaming_content(response):
+    """Whole body of a streaming response whose content is an async iterator"""
+    async def collect():
+        return b"".join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(collect)()
+
+
+def png_upload(name="scan.png", color="white"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def fake_pipeline(file_path, budget, image=None, redact=True):
+    """Stand-in for run_classification_pipeline: a PAN card, unless the scan is 13 pixels wide or reads "broken" """
+    unreadable = image.shape[1] == 13 if image is not None else b"broken" in open(file_path, "rb").read()
+    if unreadable:
+        raise RuntimeError("unreadable scan")
+    return {
+        "extracted_text": "text",
+        "summarized_text": None,
+        "document_type": "PAN Card",
+        "confidence": 90,
+        "extracted_fields": {"PAN Number": "XXXXX1234X"},
+        "raw_fields": {"PAN_Number": "ABCDE1234F"},
+        "redacted_path": file_path.replace(".jpg", "_redacted.jpg") if redact and file_path.endswith(".jpg") else None,
+        "pdf_path": None,
+    }
+
+
+class SQLitePoolMixin:
+    """Runs each test against its own in-memory SQLitePool, as the process-wide pool"""
+
+    # False: leave the database empty (tests of ensure_schema itself)
+    create_schema = True
+
+    def setUp(self):
+        super().setUp()
+        self.pool = db.SQLitePool()
+        if self.create_schema:
+            ensure_schema(self.pool)
+        self.previous = db.set_pool(self.pool)
+        self.addCleanup(self.pool.close)
+        self.addCleanup(db.set_pool, self.previous)
@@ -0,0 +1,114 @@
+import datetime
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from DocumentIntelligence.action_log import ActionLogger, prune_actions, recent_actions, set_logger
+from DocumentIntelligence.models import UserActionHistory
+from DocumentIntelligence.views import log_user_action
+
+
+class TestActionLog(TestCase):
+    """Buffered action logging and retention"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("owner", password="pw")
+        self.logger = ActionLogger(synchronous=True)
+        self.previous = set_logger(self.logger)
+
+    def tearDown(self):
+        set_logger(self.previous)
+
+    def test_batch_is_written_with_one_insert(self):
+        logger = ActionLogger(batch_size=50)
+        rows = [
+            UserActionHistory(owner_id=self.user.pk, action="ocr", details={"n": n}, created_at=timezone.now())
+            for n in range(10)
+        ]
+        with self.assertNumQueries(1):
+            logger._write(rows)
+        self.assertEqual(UserActionHistory.objects.filter(owner=self.user).count(), 10)
+
+    def test_background_writes_release_stale_connections(self):
+        logger = ActionLogger()
+        row = lambda: UserActionHistory(owner_id=self.user.pk, action="ocr", created_at=timezone.now())
+        with patch("DocumentIntelligence.action_log.close_old_connections") as close:
+            logger._write([row()])
+            self.assertEqual(close.call_count, 0)
+            # As if on the logger's own thread
+            logger._thread = threading.current_thread()
+            logger._write([row()])
+            self.assertEqual(close.call_count, 2)
+
+    def test_recent_actions_newest_first(self):
+        for action in ("ocr", "classification", "convert:pdf"):
+            self.logger.log(self.user, action, {"blob": "abc"})
+
+        actions = recent_actions(self.user, limit=2)
+
+        self.assertEqual([a.action for a in actions], ["convert:pdf", "classification"])
+        self.assertEqual(actions[0].details, {"blob": "abc"})
+
+    def test_prune_removes_only_expired_rows(self):
+        self.logger.log(self.user.pk, "ocr")
+        old = timezone.now() - datetime.timedelta(days=120)
+        for _ in range(3):
+            UserActionHistory.objects.create(owner=self.user, action="convert:pdf", created_at=old)
+
+        self.assertEqual(prune_actions(days=90, batch_size=2), 3)
+        self.assertEqual(list(UserActionHistory.objects.values_list("action", flat=True)), ["ocr"])
+
+    def test_prune_command(self):
+        UserActionHistory.objects.create(
+            owner=self.user, action="ocr", created_at=timezone.now() - datetime.timedelta(days=10))
+
+        out = StringIO()
+        call_command("prune_action_history", "--days", "7", stdout=out)
+
+        self.assertIn("Deleted 1 actions", out.getvalue())
+        self.assertFalse(UserActionHistory.objects.exists())
+
+
+class TestSessionActionLogging(TestCase):
+    """Actions of accounts from the raw-SQL users table"""
+
+    def setUp(self):
+        self.logger = ActionLogger(synchronous=True)
+        self.previous = set_logger(self.logger)
+
+    def tearDown(self):
+        set_logger(self.previous)
+
+    def request(self, session):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        request.session.update(session)
+        return request
+
+    def test_actions_are_logged_for_the_session_email(self):
+        owner = get_user_model().objects.create_user("alice", email="A@example.com")
+        request = self.request({"email": "a@example.com", "is_authenticated": True})
+
+        self.assertTrue(log_user_action(request, "ocr", {"blob": "abc"}))
+        self.assertTrue(log_user_action(request, "classification"))
+
+        self.assertEqual(request.session["action_owner_id"], owner.pk)
+        self.assertEqual([a.action for a in recent_actions(owner)], ["classification", "ocr"])
+
+    def test_emails_without_a_user_are_not_logged(self):
+        request = self.request({"email": "x" * 150 + "@example.com", "is_authenticated": True})
+
+        self.assertFalse(log_user_action(request, "ocr"))
+        self.assertNotIn("action_owner_id", request.session)
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertEqual(UserActionHistory.objects.count(), 0)
+
+    def test_anonymous_requests_are_not_logged(self):
+        self.assertFalse(log_user_action(self.request({}), "ocr"))
+        self.assertEqual(UserActionHistory.objects.count(), 0)
@@ -0,0 +1,101 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from DocumentIntelligence.executors import run_in, shutdown_executors, stage_executors
+from DocumentIntelligence.pipeline import LatencyBudget
+from file_conversions.cancellation import CancellationToken
+from tests import png_upload
+
+EXECUTORS = {'pipeline': 4, 'ocr': 2, 'summarize': 1, 'convert': 2}
+
+
+@override_settings(EXECUTORS=EXECUTORS)
+class TestExecutors(SimpleTestCase):
+
+    def tearDown(self):
+        shutdown_executors()
+
+    def test_stages_run_on_their_pool(self):
+        budget = LatencyBudget(stage_executors=stage_executors())
+        thread_name = lambda: threading.current_thread().name
+
+        self.assertTrue(budget.run("ocr", thread_name).startswith("ocr"))
+        self.assertTrue(budget.run("summary", thread_name).startswith("summarize"))
+        self.assertEqual(budget.run("grammar", thread_name), thread_name())
+
+    def test_cancelled_await_cancels_the_token(self):
+        token = CancellationToken()
+        started = threading.Event()
+
+        def work():
+            started.set()
+            while not token.cancelled:
+                token._event.wait(0.01)
+
+        async def cancel_while_running():
+            task = asyncio.ensure_future(run_in("convert", work, cancel_token=token))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_while_running())
+        self.assertEqual(token.reason, "client disconnected")
+
+
+@override_settings(EXECUTORS=EXECUTORS)
+class TestAsyncViews(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        shutdown_executors()
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    async def test_uploads_are_processed_concurrently(self):
+        # Both runs must be in the pipeline at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fake_pipeline(file_path, budget, stream_summary=False):
+            barrier.wait()
+            return {
+                "extracted_text": "Invoice 42",
+                "corrected_text": "Invoice 42",
+                "document_type": "Invoice",
+                "confidence": 80,
+                "summarized_text": "Invoice 42",
+                "stream_summary": False,
+            }
+
+        with patch("DocumentIntelligence.processing.run_ocr_pipeline", side_effect=fake_pipeline):
+            responses = await asyncio.gather(
+                self.async_client.post("/ocr/", {"image": png_upload("a.png", "red")}),
+                self.async_client.post("/ocr/", {"image": png_upload("b.png", "blue")}),
+            )
+
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["document_type"], "Invoice")
+
+    def test_conversion(self):
+        response = self.client.post("/convert/", {"file": png_upload(), "target_format": "pdf"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('filename="scan_converted.pdf"', response["Content-Disposition"])
+
+    def test_classification_error_is_rendered(self):
+        with patch("DocumentIntelligence.processing.run_classification_pipeline",
+                   side_effect=RuntimeError("unreadable scan")):
+            response = self.client.post("/classification/", {"document": png_upload()})
+
+        self.assertEqual(response.context["status"], "error")
+        self.assertIn("unreadable scan", response.context["message"])
@@ -0,0 +1,71 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from DocumentIntelligence import db
+from DocumentIntelligence.backfill import get_checkpoint, run_backfill, write_batch
+from DocumentIntelligence.history_writer import HistoryWriter
+from DocumentIntelligence.stats import get_document_stats
+from tests import SQLitePoolMixin
+
+PAN_TEXT = "INCOME TAX DEPARTMENT Permanent Account Number ABCDE1234F"
+
+
+class TestBackfill(SQLitePoolMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        writer = HistoryWriter(synchronous=True)
+        # Stale rows: classified by an older classifier
+        writer.submit("a@example.com", document_type="Invoice", confidence=40, extracted_text=PAN_TEXT,
+                      operation="classification", meta={"Invoice Number": None})
+        writer.submit("a@example.com", document_type="Invoice", confidence=40, extracted_text=PAN_TEXT,
+                      operation="ocr")
+        writer.submit("a@example.com", operation="convert")
+        for _ in range(3):
+            writer.submit("a@example.com", document_type="Invoice", confidence=100,
+                          extracted_text="TAX INVOICE GSTIN bill", operation="ocr")
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def rows(self):
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("SELECT operation, document_type, meta FROM documents ORDER BY id")
+            return cur.fetchall()
+
+    def test_stale_rows_are_reclassified(self):
+        counts = run_backfill(self.executor, batch_size=2)
+
+        self.assertEqual((counts["scanned"], counts["updated"]), (5, 2))
+        rows = self.rows()
+        self.assertEqual(rows[0][:2], ("classification", "PAN Card"))
+        self.assertEqual(json.loads(rows[0][2])["PAN Number"], "ABCXX1234X")
+        self.assertEqual(rows[1], ("ocr", "PAN Card", None))
+        # Type counters move with the rows
+        self.assertEqual(get_document_stats("a@example.com")["by_type"], {"Invoice": 3, "PAN Card": 2, "Other": 1})
+        self.assertEqual(get_checkpoint("classification"), (6, 2))
+
+    def test_interrupted_run_resumes_after_the_last_batch(self):
+        calls = []
+
+        def interrupt_second_batch(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return write_batch(*args, **kwargs)
+
+        with patch("DocumentIntelligence.backfill.write_batch", side_effect=interrupt_second_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                run_backfill(self.executor, batch_size=2, max_in_flight=1)
+        self.assertEqual(get_checkpoint("classification")[0], 2)
+
+        counts = run_backfill(self.executor, batch_size=2)
+
+        # Only the rows after the first batch are read again
+        self.assertEqual(counts["scanned"], 3)
+        self.assertEqual(get_document_stats("a@example.com")["by_type"]["PAN Card"], 2)
@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from DocumentIntelligence.batch import find_documents, load_checkpoint, run_batch
+from tests import fake_pipeline
+
+
+def fake_rasterize(path, dpi, cancel_token=None):
+    for page in (1, 2):
+        yield page, 2, Image.new("RGB", (20, 10), "white")
+
+
+class TestBatchProcessing(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path, width in [("a.png", 20), ("sub/b.jpg", 20), ("sub/bad.png", 13), (".hidden/c.png", 20)]:
+            os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+            Image.new("RGB", (width, 10), "white").save(os.path.join(self.root, path))
+        for path, data in [("scan.pdf", b"%PDF-1.4"), ("notes.txt", b"text")]:
+            with open(os.path.join(self.root, path), "wb") as f:
+                f.write(data)
+        self.output = os.path.join(self.root, "results.jsonl")
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.pipeline = patch("DocumentIntelligence.processing.run_classification_pipeline",
+                              side_effect=fake_pipeline)
+        self.mock_pipeline = self.pipeline.start()
+        self.rasterize = patch("DocumentIntelligence.batch.rasterize_pdf", side_effect=fake_rasterize)
+        self.rasterize.start()
+
+    def tearDown(self):
+        self.rasterize.stop()
+        self.pipeline.stop()
+        self.executor.shutdown()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def run_batch(self, **options):
+        return run_batch(self.root, self.output, self.executor, timeout=30, **options)
+
+    def records(self):
+        with open(self.output) as f:
+            return {record["path"]: record for record in map(json.loads, f)}
+
+    def test_one_record_per_file(self):
+        self.assertEqual(list(find_documents(self.root)),
+                         ["a.png", "scan.pdf", os.path.join("sub", "b.jpg"), os.path.join("sub", "bad.png")])
+
+        counts = self.run_batch(redact_dir=os.path.join(self.root, "redacted"))
+
+        self.assertEqual((counts["succeeded"], counts["failed"]), (3, 1))
+        records = self.records()
+        self.assertEqual(records["sub/bad.png"], {"path": "sub/bad.png", "status": "error", "error": "unreadable scan"})
+        self.assertEqual([page["page"] for page in records["scan.pdf"]["pages"]], [1, 2])
+        self.assertEqual(records["scan.pdf"]["pages"][1]["redacted_path"],
+                         os.path.join(self.root, "redacted", "scan_page_2_redacted.jpg"))
+        self.assertEqual(records["a.png"]["pages"][0]["document_type"], "PAN Card")
+        self.assertNotIn("ABCDE1234F", open(self.output).read())
+
+    def test_rerun_resumes_from_the_results_file(self):
+        self.run_batch()
+        with open(self.output, "a") as f:
+            f.write('{"path": "sub/b.jp')
+        self.mock_pipeline.reset_mock()
+
+        # Only the failed file is run again, and the cut-off line is gone
+        self.assertEqual(load_checkpoint(self.output), {"a.png", "scan.pdf", "sub/b.jpg", "sub/bad.png"})
+        counts = self.run_batch(retry_errors=True)
+
+        self.assertEqual((counts["skipped"], counts["failed"]), (3, 1))
+        self.assertEqual(self.mock_pipeline.call_count, 1)
+        with open(self.output) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 5)
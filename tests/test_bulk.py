@@ -0,0 +1,159 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from DocumentIntelligence.bulk import BulkUploadError, classify_bulk, store_bulk_upload
+from tests import fake_pipeline, read_streaming_content
+
+BULK = {'WORKERS': 2, 'MAX_FILES': 5, 'MAX_TOTAL_BYTES': 1024 * 1024, 'DOCUMENT_TIMEOUT': 30,
+        'SHARED_MEMORY': True, 'MAX_IN_FLIGHT': 2, 'SUMMARIZE': False}
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 20), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def zip_upload(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return SimpleUploadedFile("scans.zip", buffer.getvalue(), content_type="application/zip")
+
+
+@override_settings(BULK_CLASSIFICATION=BULK)
+class TestBulkClassification(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.pipeline = patch("DocumentIntelligence.processing.run_classification_pipeline",
+                              side_effect=fake_pipeline)
+        self.mock_pipeline = self.pipeline.start()
+
+    def tearDown(self):
+        self.pipeline.stop()
+        self.executor.shutdown()
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_archive_members_are_filtered(self):
+        archive = zip_upload({
+            "scans/a.png": png_bytes("red"),
+            "scans/b.PNG": png_bytes("blue"),
+            "__MACOSX/scans/._a.png": b"junk",
+            "notes.txt": b"not a scan",
+        })
+        documents = store_bulk_upload(archive)
+        self.assertEqual([name for name, _ in documents], ["a.png", "b.PNG"])
+
+    def test_one_record_per_document_and_a_summary(self):
+        documents = store_bulk_upload(files=[
+            SimpleUploadedFile("a.png", png_bytes("red")),
+            SimpleUploadedFile("copy-of-a.png", png_bytes("red")),
+            SimpleUploadedFile("b.png", png_bytes("blue")),
+            SimpleUploadedFile("c.png", b"broken"),
+        ])
+
+        records = list(classify_bulk(documents, executor=self.executor))
+
+        by_name = {r["file_name"]: r for r in records[:-1]}
+        self.assertEqual(set(by_name), {"a.png", "copy-of-a.png", "b.png", "c.png"})
+        self.assertEqual(by_name["a.png"]["document_type"], "PAN Card")
+        self.assertEqual(by_name["c.png"], {"file_name": "c.png", "status": "error", "error": "unreadable scan"})
+        self.assertNotIn("ABCDE1234F", json.dumps(records))
+        # Duplicate content is classified once
+        self.assertEqual(self.mock_pipeline.call_count, 3)
+
+        summary = records[-1]["summary"]
+        self.assertEqual((summary["documents"], summary["succeeded"], summary["failed"]), (4, 3, 1))
+
+    def test_results_are_reused_on_the_next_upload(self):
+        upload = lambda: [SimpleUploadedFile("a.png", png_bytes("red"))]
+        list(classify_bulk(store_bulk_upload(files=upload()), executor=self.executor))
+        records = list(classify_bulk(store_bulk_upload(files=upload()), executor=self.executor))
+
+        self.assertTrue(records[0]["cached"])
+        self.assertEqual(self.mock_pipeline.call_count, 1)
+
+    def test_workers_get_the_decoded_scan_in_shared_memory(self):
+        documents = store_bulk_upload(files=[
+            SimpleUploadedFile(f"{i}.png", png_bytes((i, 0, 0))) for i in range(3)
+        ] + [SimpleUploadedFile("c.png", b"broken")])
+
+        records = list(classify_bulk(documents, executor=self.executor))
+
+        self.assertEqual(records[-1]["summary"]["succeeded"], 3)
+        images = [call.kwargs["image"] for call in self.mock_pipeline.call_args_list]
+        # Unreadable by OpenCV: the worker gets the path only
+        self.assertEqual(sum(image is None for image in images), 1)
+        for image in filter(lambda image: image is not None, images):
+            self.assertEqual(image.shape, (20, 20, 3))
+            self.assertFalse(image.flags.writeable)
+
+    def test_optional_stages_run_only_when_summarizing(self):
+        documents = store_bulk_upload(files=[SimpleUploadedFile("a.png", png_bytes("red"))])
+        list(classify_bulk(documents, executor=self.executor))
+        self.assertEqual(self.mock_pipeline.call_args.args[1].remaining(), 0.0)
+
+        documents = store_bulk_upload(files=[SimpleUploadedFile("b.png", png_bytes("blue"))])
+        with override_settings(BULK_CLASSIFICATION={**BULK, 'SUMMARIZE': True}):
+            list(classify_bulk(documents, executor=self.executor))
+        self.assertEqual(self.mock_pipeline.call_args.args[1].remaining(), float("inf"))
+
+    def test_limits(self):
+        too_many = {f"{i}.png": png_bytes((i, 0, 0)) for i in range(6)}
+        with self.assertRaises(BulkUploadError):
+            store_bulk_upload(zip_upload(too_many))
+        with self.assertRaises(BulkUploadError):
+            store_bulk_upload(SimpleUploadedFile("scans.zip", b"not a zip"))
+        with override_settings(BULK_CLASSIFICATION={**BULK, 'MAX_TOTAL_BYTES': 10}):
+            with self.assertRaises(BulkUploadError):
+                store_bulk_upload(zip_upload({"a.png": png_bytes("red")}))
+
+    def test_endpoint_rejects_empty_upload(self):
+        self.assertEqual(self.client.post("/classification/bulk/").status_code, 400)
+
+
+@override_settings(BULK_CLASSIFICATION=BULK)
+class TestBulkEndpoint(TransactionTestCase):
+    """The stream is produced on worker threads, which need committed uploads"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.pipeline = patch("DocumentIntelligence.processing.run_classification_pipeline",
+                              side_effect=fake_pipeline)
+        self.pipeline.start()
+
+    def tearDown(self):
+        self.pipeline.stop()
+        self.executor.shutdown()
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_endpoint_streams_ndjson(self):
+        with patch("DocumentIntelligence.bulk.get_executor", return_value=self.executor):
+            response = self.client.post("/classification/bulk/", {
+                "archive": zip_upload({"a.png": png_bytes("red"), "b.png": png_bytes("blue")}),
+            })
+            lines = read_streaming_content(response).decode().splitlines()
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[-1]["summary"]["succeeded"], 2)
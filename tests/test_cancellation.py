@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from file_conversions.cancellation import CancellationToken, OperationCancelled
+from file_conversions.conversions import rasterize_pdf
+
+# Stand-ins for the Poppler tools: a 5 page document, rendered as 1x1 pixel pages
+FAKE_PDFINFO = "#!/bin/sh\necho 'Title: test'\necho 'Pages:          5'\n"
+FAKE_PDFTOPPM = f"""#!{sys.executable}
+import os, sys, time
+args = sys.argv[1:]
+if os.environ.get("FAKE_PDFTOPPM_HANG"):
+    time.sleep(10)
+first, last = int(args[args.index("-f") + 1]), int(args[args.index("-l") + 1])
+for page in range(first, last + 1):
+    with open(f"{{args[-1]}}-{{page:02d}}.ppm", "w") as out:
+        out.write(f"P3 1 1 255 {{page}} 0 0")
+"""
+
+
+class TestCancellationToken(SimpleTestCase):
+
+    def test_run_returns_output(self):
+        result = CancellationToken().run(["echo", "hello"])
+        self.assertEqual(result.stdout.strip(), b"hello")
+
+    def test_cancel_kills_running_process(self):
+        token = CancellationToken()
+        threading.Timer(0.2, token.cancel, args=("client went away",)).start()
+
+        started = time.monotonic()
+        with self.assertRaises(OperationCancelled):
+            token.run(["sleep", "10"])
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(token.reason, "client went away")
+
+    def test_deadline_cancels_token(self):
+        token = CancellationToken.with_timeout(0.2)
+        with self.assertRaises(OperationCancelled):
+            token.run(["sleep", "10"])
+        self.assertEqual(token.reason, "deadline exceeded")
+
+    def test_partial_output_removed_on_cancel(self):
+        token = CancellationToken()
+        fd, partial = tempfile.mkstemp()
+        os.close(fd)
+
+        with self.assertRaises(OperationCancelled):
+            with token.cleanup_on_cancel(partial):
+                token.cancel()
+                token.raise_if_cancelled()
+
+        self.assertFalse(os.path.exists(partial))
+
+
+class TestRasterizePdf(SimpleTestCase):
+
+    def setUp(self):
+        self.bin_dir = tempfile.mkdtemp()
+        for name, script in (("pdfinfo", FAKE_PDFINFO), ("pdftoppm", FAKE_PDFTOPPM)):
+            path = os.path.join(self.bin_dir, name)
+            with open(path, "w") as f:
+                f.write(script)
+            os.chmod(path, 0o755)
+        path = patch.dict(os.environ, {"PATH": self.bin_dir + os.pathsep + os.environ["PATH"]})
+        path.start()
+        self.addCleanup(path.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.bin_dir, ignore_errors=True)
+
+    def test_pages_are_rendered_in_batches_and_order(self):
+        pages = list(rasterize_pdf("doc.pdf", 72, pages_per_batch=2))
+
+        self.assertEqual([(page, count) for page, count, _ in pages], [(n, 5) for n in range(1, 6)])
+        self.assertEqual([image.getpixel((0, 0))[0] for _, _, image in pages], [1, 2, 3, 4, 5])
+
+    def test_cancel_kills_pdftoppm(self):
+        token = CancellationToken.with_timeout(0.3)
+        started = time.monotonic()
+        with patch.dict(os.environ, {"FAKE_PDFTOPPM_HANG": "1"}):
+            with self.assertRaises(OperationCancelled):
+                list(rasterize_pdf("doc.pdf", 72, token))
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(token.reason, "deadline exceeded")
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from DocumentIntelligence import cpu_budget
+from DocumentIntelligence.management.commands.benchmark_cpu_budget import p95, parse_splits, pick_split
+
+
+class TestCpuBudget(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_cgroup_v2_quota(self):
+        self.write("cpu.max", "250000 100000\n")
+        self.assertEqual(cpu_budget.cgroup_cpu_limit(self.root), 2.5)
+        self.write("cpu.max", "max 100000\n")
+        self.assertIsNone(cpu_budget.cgroup_cpu_limit(self.root))
+
+    def test_cgroup_v1_quota(self):
+        self.write("cpu/cpu.cfs_quota_us", "300000")
+        self.write("cpu/cpu.cfs_period_us", "100000")
+        self.assertEqual(cpu_budget.cgroup_cpu_limit(self.root), 3)
+        self.write("cpu/cpu.cfs_quota_us", "-1")
+        self.assertIsNone(cpu_budget.cgroup_cpu_limit(self.root))
+
+    def test_quota_caps_the_visible_cores(self):
+        self.write("cpu.max", "150000 100000")
+        with patch("os.sched_getaffinity", return_value=set(range(16))):
+            self.assertEqual(cpu_budget.available_cpus(self.root), 1)
+        self.assertEqual(cpu_budget.available_cpus(os.path.join(self.root, "missing")),
+                         len(os.sched_getaffinity(0)))
+
+    def test_cores_are_split_between_processes(self):
+        with patch.dict(os.environ, {}, clear=True):
+            budget = cpu_budget.plan(cores=8, processes=2)
+        self.assertEqual(budget["per_process"], 4)
+        self.assertEqual(budget["tesseract_parallel"], 4)
+        self.assertEqual(budget["torch_threads"], 2)
+        self.assertEqual(budget["tesseract_threads"], 1)
+
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "16", "CPU_BUDGET_TORCH_THREADS": "3"}, clear=True):
+            budget = cpu_budget.plan(cores=8)
+        self.assertEqual((budget["per_process"], budget["torch_threads"]), (1, 3))
+
+    def test_p95(self):
+        self.assertIsNone(p95([]))
+        self.assertEqual(p95([3.0]), 3.0)
+        self.assertEqual(p95([float(n) for n in range(1, 21)]), 19.0)
+
+    def test_pick_split_keeps_to_the_latency_budget(self):
+        results = [
+            {"split": (4, 1), "docs_per_second": 3.0, "p95_seconds": 40.0},
+            {"split": (2, 2), "docs_per_second": 2.0, "p95_seconds": 20.0},
+            {"split": (1, 4), "docs_per_second": 1.0, "p95_seconds": 10.0},
+        ]
+        self.assertEqual(pick_split(results, 30), (results[1], True))
+        self.assertEqual(pick_split(results, 60), (results[0], True))
+        self.assertEqual(pick_split(results, 5), (results[2], False))
+
+    def test_parse_splits(self):
+        self.assertEqual(parse_splits("4:1,2:2"), [(4, 1), (2, 2)])
@@ -0,0 +1,108 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+from psycopg2 import extensions
+from django.test import SimpleTestCase
+
+from DocumentIntelligence import db
+from tests import SQLitePoolMixin
+
+
+class TestSQLitePool(SQLitePoolMixin, SimpleTestCase):
+
+    def test_percent_s_placeholders_work(self):
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("insert into users (name,email,password) values(%s,%s,%s)", ("Ann", "ann@example.com", "pw"))
+            con.commit()
+
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("select name from users where email=%s", ("ann@example.com",))
+            self.assertEqual(cur.fetchone(), ("Ann",))
+
+    def test_failed_transaction_does_not_leak_into_next_checkout(self):
+        with self.assertRaises(RuntimeError):
+            with db.connection() as con:
+                cur = con.cursor()
+                cur.execute("insert into users (name,email,password) values(%s,%s,%s)", ("Bob", "bob@example.com", "pw"))
+                raise RuntimeError("view crashed before commit")
+
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("select count(*) from users")
+            self.assertEqual(cur.fetchone(), (0,))
+
+    def test_threads_get_their_own_connections(self):
+        def insert(i):
+            with db.connection() as con:
+                cur = con.cursor()
+                cur.execute("insert into documents (email, file_name) values(%s,%s)", ("a@example.com", f"f{i}"))
+                con.commit()
+
+        threads = [threading.Thread(target=insert, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("select count(*) from documents where email=%s", ("a@example.com",))
+            self.assertEqual(cur.fetchone(), (8,))
+
+
+class TestPostgresPool(SimpleTestCase):
+
+    def make_connection(self, closed=0):
+        con = MagicMock()
+        con.closed = closed
+        con.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+        return con
+
+    def make_pool(self, *connections, **kwargs):
+        with patch('DocumentIntelligence.db.ThreadedConnectionPool') as pool_class:
+            pool = db.PostgresPool(maxconn=2, **kwargs)
+        pool._pool = pool_class.return_value
+        pool._pool.getconn.side_effect = list(connections)
+        return pool
+
+    def test_closed_connection_is_replaced_on_checkout(self):
+        dead, fresh = self.make_connection(closed=1), self.make_connection()
+        pool = self.make_pool(dead, fresh)
+
+        with pool.connection() as con:
+            self.assertIs(con, fresh)
+
+        pool._pool.putconn.assert_any_call(dead, close=True)
+        pool._pool.putconn.assert_called_with(fresh)
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        con = self.make_connection()
+        con.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INERROR
+        pool = self.make_pool(con)
+
+        with pool.connection():
+            pass
+
+        con.rollback.assert_called()
+        pool._pool.putconn.assert_called_with(con)
+
+    def test_connection_error_discards_connection(self):
+        con = self.make_connection()
+        pool = self.make_pool(con)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            with pool.connection():
+                raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+        pool._pool.putconn.assert_called_with(con, close=True)
+
+    def test_checkout_waits_then_times_out_when_exhausted(self):
+        pool = self.make_pool(self.make_connection(), self.make_connection(), timeout=0.1)
+
+        with pool.connection(), pool.connection():
+            with self.assertRaises(db.PoolTimeout):
+                with pool.connection():
+                    pass
@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from DocumentIntelligence import db
+from DocumentIntelligence.history_writer import HistoryWriter
+from DocumentIntelligence.schema import missing_tables
+from DocumentIntelligence.stats import get_document_stats
+from tests import SQLitePoolMixin
+
+
+class TestEnsureSchemaCommand(SQLitePoolMixin, SimpleTestCase):
+
+    create_schema = False
+
+    def objects(self):
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("SELECT name FROM sqlite_master")
+            return {name for (name,) in cur.fetchall()}
+
+    def test_creates_every_raw_sql_object(self):
+        call_command("ensure_schema", stdout=StringIO())
+        self.assertLessEqual({"users", "documents", "document_stats", "backfill_checkpoints"}, self.objects())
+        # Idempotent
+        call_command("ensure_schema", stdout=StringIO())
+
+    def test_creates_the_search_index(self):
+        call_command("ensure_schema", stdout=StringIO())
+        self.assertLessEqual({"documents_fts", "documents_fts_insert", "documents_fts_delete", "documents_fts_update"},
+                             self.objects())
+
+    def test_creates_the_entity_index(self):
+        call_command("ensure_schema", stdout=StringIO())
+        self.assertIn("entity_index", self.objects())
+
+    def test_backfill_requires_the_schema(self):
+        self.assertEqual(missing_tables(self.pool, ["documents", "backfill_checkpoints"]),
+                         ["documents", "backfill_checkpoints"])
+        with self.assertRaisesMessage(CommandError, "Run `manage.py ensure_schema` first"):
+            call_command("backfill_documents", stdout=StringIO())
+
+        call_command("ensure_schema", stdout=StringIO())
+        self.assertEqual(missing_tables(self.pool, ["documents", "backfill_checkpoints"]), [])
+
+    def test_rebuild_stats_counts_rows_written_without_counters(self):
+        with db.connection() as con:
+            con.cursor().execute("CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT, "
+                                 "file_name TEXT, file_url TEXT, document_type TEXT, confidence INTEGER, "
+                                 "extracted_text TEXT, summarized_text TEXT, redacted_url TEXT, pdf_url TEXT, "
+                                 "operation TEXT, meta TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+            con.commit()
+        # Written before the deploy step: document_stats does not exist yet
+        HistoryWriter(synchronous=True, max_retries=1).submit("a@example.com", document_type="Invoice")
+
+        call_command("ensure_schema", "--rebuild-stats", stdout=StringIO())
+
+        self.assertEqual(get_document_stats("a@example.com")["by_type"], {"Invoice": 1})
@@ -0,0 +1,57 @@
+from django.test import SimpleTestCase, override_settings
+
+from DocumentIntelligence import db
+from DocumentIntelligence.entities import (
+    entities_from_fields,
+    entity_hash,
+    index_entities,
+    linked_uploads,
+    seen_before,
+)
+from tests import SQLitePoolMixin
+
+PAN_FIELDS = {"PAN_Number": "ABCDE1234F", "Name": "Test User", "DOB": "01/01/1990"}
+
+
+@override_settings(ENTITY_INDEX_KEY="test-entity-index-key")
+class TestEntityIndex(SQLitePoolMixin, SimpleTestCase):
+
+    def test_only_identity_numbers_are_hashed(self):
+        entities = entities_from_fields({**PAN_FIELDS, "GST_Number": "XXXXXXXXXXX1Z5", "Voter_ID": None})
+        self.assertEqual([entity_type for entity_type, _ in entities], ["pan"])
+
+    def test_hash_ignores_formatting_but_not_type(self):
+        self.assertEqual(entity_hash("aadhaar", "1234 5678 9012"), entity_hash("aadhaar", "123456789012"))
+        self.assertNotEqual(entity_hash("pan", "ABCDE1234F"), entity_hash("dl", "ABCDE1234F"))
+
+    def test_hash_depends_on_key(self):
+        default = entity_hash("pan", "ABCDE1234F")
+        with override_settings(ENTITY_INDEX_KEY="another-key"):
+            self.assertNotEqual(entity_hash("pan", "ABCDE1234F"), default)
+
+    def test_nothing_is_indexed_without_a_key(self):
+        with override_settings(ENTITY_INDEX_KEY=None):
+            self.assertEqual(entities_from_fields(PAN_FIELDS), [])
+            with self.assertRaises(ValueError):
+                entity_hash("pan", "ABCDE1234F")
+
+    def test_plaintext_is_not_stored(self):
+        index_entities("a@example.com", "blob1", entities_from_fields(PAN_FIELDS))
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("SELECT * FROM entity_index")
+            rows = cur.fetchall()
+        self.assertEqual(len(rows), 1)
+        self.assertNotIn("ABCDE1234F", str(rows))
+
+    def test_seen_before_and_linked_uploads(self):
+        entities = entities_from_fields(PAN_FIELDS)
+        index_entities("a@example.com", "blob1", entities)
+        index_entities("a@example.com", "blob2", entities)
+        index_entities("a@example.com", "blob2", entities)
+        index_entities("b@example.com", "blob3", entities)
+
+        self.assertTrue(seen_before("pan", "abcde 1234f", email="a@example.com"))
+        self.assertFalse(seen_before("pan", "ZZZZZ9999Z"))
+        self.assertEqual(linked_uploads("a@example.com", entities, exclude_blob="blob2"), {"pan": ["blob1"]})
+        self.assertEqual(linked_uploads("c@example.com", entities), {})
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from DocumentIntelligence.models import DocumentFile, Folder, user_file_upload_path
+
+
+class TestFolderTree(TestCase):
+    """Materialized-path folder tree"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("owner", password="pw")
+        self.invoices = Folder.objects.create(owner=self.user, name="Invoices")
+        self.year = Folder.objects.create(owner=self.user, name="2025", parent=self.invoices)
+        self.april = Folder.objects.create(owner=self.user, name="April", parent=self.year)
+        self.other = Folder.objects.create(owner=self.user, name="Other")
+
+    def test_tree_path_is_maintained_on_create(self):
+        self.assertEqual(self.april.tree_path, f"/{self.invoices.pk}/{self.year.pk}/{self.april.pk}/")
+        self.assertEqual(self.april.depth, 2)
+
+    def test_breadcrumbs_take_one_query(self):
+        april = Folder.objects.get(pk=self.april.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(april.path(), "Invoices/2025/April")
+
+    def test_subtree_takes_one_query(self):
+        with self.assertNumQueries(1):
+            names = sorted(folder.name for folder in self.invoices.subtree())
+        self.assertEqual(names, ["2025", "April", "Invoices"])
+
+    def test_move_rewrites_descendant_paths(self):
+        year = Folder.objects.get(pk=self.year.pk)
+        year.parent = self.other
+        year.save()
+
+        april = Folder.objects.get(pk=self.april.pk)
+        self.assertEqual(april.tree_path, f"/{self.other.pk}/{self.year.pk}/{self.april.pk}/")
+        self.assertEqual(april.depth, 2)
+        self.assertEqual(april.path(), "Other/2025/April")
+        self.assertEqual([f.name for f in self.invoices.subtree()], ["Invoices"])
+
+    def test_cannot_move_into_own_subtree(self):
+        invoices = Folder.objects.get(pk=self.invoices.pk)
+        invoices.parent = self.april
+        with self.assertRaises(ValueError):
+            invoices.save()
+
+    def test_subtree_size_takes_one_query(self):
+        DocumentFile.objects.create(owner=self.user, folder=self.invoices, name="a.pdf", file="a.pdf", size=100)
+        DocumentFile.objects.create(owner=self.user, folder=self.april, name="b.pdf", file="b.pdf", size=50)
+        DocumentFile.objects.create(owner=self.user, folder=self.other, name="c.pdf", file="c.pdf", size=7)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.invoices.subtree_size(), 150)
+
+    def test_upload_path_does_not_load_the_folder(self):
+        document = DocumentFile(owner_id=self.user.pk, folder_id=self.april.pk)
+        with self.assertNumQueries(0):
+            path = user_file_upload_path(document, "scan.png")
+        self.assertEqual(path, f"user_{self.user.pk}/folder_{self.april.pk}/scan.png")
@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from DocumentIntelligence import governor
+from DocumentIntelligence.executors import shutdown_executors
+from DocumentIntelligence.governor import Overloaded, Resource
+from tests import png_upload
+
+GOVERNOR = {
+    'RESOURCES': {
+        'soffice': {'LIMIT': 1, 'MAX_QUEUE': 0},
+        'tesseract': {'LIMIT': 1, 'MAX_QUEUE': 0},
+        'summarizer': {'LIMIT': 1, 'MAX_QUEUE': 0},
+        'rasterizer': {'LIMIT': 1, 'MAX_QUEUE': 0},
+    },
+    'QUEUE_TIMEOUT': 1,
+    'MAX_REQUESTS_PER_CLIENT': 4,
+    'TRUSTED_PROXY_HOPS': 0,
+    'METRICS_ALLOWED_ADDRESSES': ['127.0.0.1'],
+}
+
+
+class TestResource(SimpleTestCase):
+
+    def test_queue_is_bounded(self):
+        resource = Resource("soffice", limit=1, max_queue=1, queue_timeout=5)
+        resource.acquire()
+        waiter = threading.Thread(target=resource.acquire)
+        waiter.start()
+        while not resource.waiting:
+            pass
+
+        with self.assertRaises(Overloaded) as raised:
+            resource.acquire()
+        self.assertEqual(raised.exception.reason, "queue full")
+        self.assertEqual(resource.metrics()["rejected"], 1)
+
+        # The waiter gets the slot once it is released
+        resource.release(2.0)
+        waiter.join(5)
+        self.assertEqual((resource.active, resource.waiting), (1, 0))
+
+    def test_waiting_times_out_with_a_retry_hint(self):
+        resource = Resource("tesseract", limit=1, max_queue=5, queue_timeout=0.05)
+        with resource.slot():
+            with self.assertRaises(Overloaded) as raised:
+                resource.acquire()
+        self.assertEqual(raised.exception.reason, "timed out waiting")
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(resource.metrics()["timed_out"], 1)
+
+
+class TestClientAddress(SimpleTestCase):
+
+    def request(self, forwarded=None):
+        meta = {"REMOTE_ADDR": "10.0.0.1"}
+        if forwarded:
+            meta["HTTP_X_FORWARDED_FOR"] = forwarded
+        return RequestFactory().post("/", **meta)
+
+    def test_without_trusted_proxies_uses_remote_addr(self):
+        with override_settings(GOVERNOR=GOVERNOR):
+            self.assertEqual(governor.client_address(self.request("203.0.113.7")), "10.0.0.1")
+
+    def test_trusted_hop_is_taken_from_the_right(self):
+        with override_settings(GOVERNOR={**GOVERNOR, 'TRUSTED_PROXY_HOPS': 1}):
+            # The client forged the first entry; the proxy appended the real address
+            self.assertEqual(governor.client_address(self.request("1.2.3.4, 203.0.113.7")), "203.0.113.7")
+            self.assertEqual(governor.client_address(self.request()), "10.0.0.1")
+
+    def test_clients_behind_the_proxy_get_separate_slots(self):
+        with override_settings(GOVERNOR={**GOVERNOR, 'MAX_REQUESTS_PER_CLIENT': 1, 'TRUSTED_PROXY_HOPS': 1}):
+            first = governor.client_address(self.request("203.0.113.7"))
+            second = governor.client_address(self.request("198.51.100.9"))
+            with governor.client_slot(first):
+                with governor.client_slot(second):
+                    pass
+                with self.assertRaises(Overloaded):
+                    with governor.client_slot(first):
+                        pass
+
+
+@override_settings(GOVERNOR=GOVERNOR)
+class TestAdmissionControl(TestCase):
+
+    def setUp(self):
+        governor.reset()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        governor.reset()
+        shutdown_executors()
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_busy_resource_returns_503_with_retry_after(self):
+        with governor.acquire("tesseract"):
+            response = self.client.post("/classification/", {"document": png_upload()})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["resource"], "tesseract")
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+    def test_too_many_uploads_per_client_returns_429(self):
+        with override_settings(GOVERNOR={**GOVERNOR, 'MAX_REQUESTS_PER_CLIENT': 0}):
+            response = self.client.post("/convert/", {"file": png_upload(), "target_format": "pdf"})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    def test_metrics_report_queue_depth(self):
+        with governor.acquire("soffice"):
+            data = self.client.get("/metrics/resources/").json()
+
+        self.assertEqual(set(data["resources"]), set(GOVERNOR["RESOURCES"]))
+        self.assertEqual(data["resources"]["soffice"]["active"], 1)
+        self.assertEqual(data["resources"]["soffice"]["waiting"], 0)
+
+    def test_metrics_are_limited_to_staff_and_allowed_addresses(self):
+        outside = {"REMOTE_ADDR": "203.0.113.7"}
+        self.assertEqual(self.client.get("/metrics/resources/", **outside).status_code, 403)
+        self.client.force_login(get_user_model().objects.create_user("ops", is_staff=True))
+        self.assertEqual(self.client.get("/metrics/resources/", **outside).status_code, 200)
@@ -0,0 +1,188 @@
+import json
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from DocumentIntelligence import db
+from DocumentIntelligence.entities import entity_hash, index_entities
+from DocumentIntelligence.extraction import FILTERABLE_FIELDS, extract_document_fields
+from DocumentIntelligence.history import (
+    DocumentRow,
+    decode_cursor,
+    encode_cursor,
+    list_documents,
+    meta_filter_sql,
+)
+from DocumentIntelligence.models import Blob
+from DocumentIntelligence.storage import blob_name, blob_url
+from tests import SQLitePoolMixin
+
+
+class TestListDocuments(SQLitePoolMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Several rows share a timestamp so the id tie-breaker is exercised
+        with db.connection() as con:
+            cur = con.cursor()
+            for i in range(7):
+                cur.execute(
+                    "INSERT INTO documents (email, file_name, extracted_text, meta, created_at) VALUES (%s,%s,%s,%s,%s)",
+                    ("a@example.com", f"doc{i}", "long text", '{"n": %d}' % i, f"2025-01-0{1 + i // 3} 10:00:00"),
+                )
+            cur.execute("INSERT INTO documents (email, file_name) VALUES (%s,%s)", ("b@example.com", "other"))
+            con.commit()
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        names = []
+        cursor = None
+        while True:
+            documents, cursor = list_documents("a@example.com", cursor=cursor, limit=3)
+            names.extend(doc.file_name for doc in documents)
+            if not cursor:
+                break
+
+        self.assertEqual(names, ["doc6", "doc5", "doc4", "doc3", "doc2", "doc1", "doc0"])
+
+    def test_list_query_leaves_out_text_columns(self):
+        documents, _ = list_documents("a@example.com")
+        self.assertFalse(hasattr(documents[0], "extracted_text"))
+
+    def test_meta_is_decoded_lazily(self):
+        documents, _ = list_documents("a@example.com", limit=1)
+        self.assertNotIn("meta", documents[0].__dict__)
+        self.assertEqual(documents[0].meta, {"n": 6})
+
+    def test_bad_cursor_starts_from_the_first_page(self):
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+        self.assertEqual(decode_cursor(encode_cursor("2025-01-01 10:00:00", 5)), ("2025-01-01 10:00:00", 5))
+
+    def test_invalid_meta_json_is_ignored(self):
+        row = DocumentRow((1, "f", None, None, None, None, None, "{broken", None, None))
+        self.assertIsNone(row.meta)
+
+    def test_decoded_jsonb_meta_is_used_as_is(self):
+        row = DocumentRow((1, "f", None, None, None, None, None, {"n": 1}, None, None))
+        self.assertEqual(row.meta, {"n": 1})
+
+
+def invoice_meta(number, date, gstin="27AAAAA0000A1Z5"):
+    """meta exactly as the pipelines store it for an invoice scan"""
+    text = f"Invoice No: {number}\nDate: {date}\nGSTIN: {gstin}\nTotal: 100.00"
+    return extract_document_fields("Invoice", text)[0]
+
+
+class TestMetaFilters(SQLitePoolMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rows = [
+            ("a@example.com", "inv1", invoice_meta("INV-001", "12/03/2024")),
+            ("a@example.com", "inv2", invoice_meta("INV-002", "12/03/2024", gstin="29BBBBB1111B1Z5")),
+            ("a@example.com", "inv3", invoice_meta("INV-001", "15/04/2024")),
+            ("b@example.com", "inv4", invoice_meta("INV-001", "12/03/2024")),
+            ("a@example.com", "plain", None),
+        ]
+        with db.connection() as con:
+            cur = con.cursor()
+            for email, name, meta in rows:
+                cur.execute(
+                    "INSERT INTO documents (email, file_name, meta) VALUES (%s,%s,%s)",
+                    (email, name, json.dumps(meta) if meta else None),
+                )
+            con.commit()
+
+    def test_filter_by_field_value(self):
+        documents, _ = list_documents("a@example.com", meta_filters={"Invoice Number": "INV-001"})
+        self.assertEqual(sorted(doc.file_name for doc in documents), ["inv1", "inv3"])
+
+    def test_every_filter_must_match(self):
+        documents, _ = list_documents(
+            "a@example.com", meta_filters={"Invoice Number": "INV-001", "Date": "15/04/2024"})
+        self.assertEqual([doc.file_name for doc in documents], ["inv3"])
+
+    def test_filtered_pages(self):
+        first, cursor = list_documents("a@example.com", limit=1, meta_filters={"Date": "12/03/2024"})
+        second, cursor_after = list_documents(
+            "a@example.com", cursor=cursor, limit=1, meta_filters={"Date": "12/03/2024"})
+        self.assertEqual([doc.file_name for doc in first + second], ["inv2", "inv1"])
+        self.assertIsNone(cursor_after)
+
+    def test_field_names_are_validated(self):
+        with self.assertRaises(ValueError):
+            meta_filter_sql({"x') OR 1=1 --": "y"})
+        self.assertEqual(meta_filter_sql({"Invoice Number": ""}), ("", []))
+
+    @override_settings(ENTITY_INDEX_KEY=None)
+    def test_identity_filters_need_the_index_key(self):
+        # Stored as "27**********1Z5": only the entity index can match the number
+        self.assertNotIn("GST Number", FILTERABLE_FIELDS)
+        with self.assertRaisesMessage(ValueError, "GST Number needs ENTITY_INDEX_KEY"):
+            meta_filter_sql({"GST Number": "27AAAAA0000A1Z5"}, "a@example.com")
+
+    def test_postgres_uses_containment(self):
+        with patch.object(self.pool, "vendor", "postgresql"):
+            sql, params = meta_filter_sql({"Invoice Number": "INV-001"})
+        self.assertEqual(sql, " AND meta @> %s::jsonb")
+        self.assertEqual(json.loads(params[0]), {"Invoice Number": "INV-001"})
+
+
+@override_settings(ENTITY_INDEX_KEY="test-entity-index-key")
+class TestIdentityFilters(SQLitePoolMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        for email, name, gstin in (("a@example.com", "inv1", "27AAAAA0000A1Z5"),
+                                   ("a@example.com", "inv2", "29BBBBB1111B1Z5"),
+                                   ("b@example.com", "inv3", "27AAAAA0000A1Z5")):
+            blob = Blob.objects.create(digest=name * 16, name=blob_name(name * 16, ".png"), size=1)
+            meta = invoice_meta("INV-001", "12/03/2024", gstin)
+            with db.connection() as con:
+                con.cursor().execute("INSERT INTO documents (email, file_name, file_url, meta) VALUES (%s,%s,%s,%s)",
+                                     (email, name, blob_url(blob), json.dumps(meta)))
+                con.commit()
+            index_entities(email, blob.digest, [("gstin", entity_hash("gstin", gstin))])
+
+    def test_filter_by_gst_number(self):
+        documents, _ = list_documents("a@example.com", meta_filters={"GST Number": "27 AAAAA 0000 A1Z5"})
+        self.assertEqual([doc.file_name for doc in documents], ["inv1"])
+
+    def test_identity_and_meta_filters_combine(self):
+        documents, _ = list_documents(
+            "a@example.com", meta_filters={"GST Number": "29BBBBB1111B1Z5", "Invoice Number": "INV-002"})
+        self.assertEqual(documents, [])
+
+    def test_unknown_number_matches_nothing(self):
+        documents, _ = list_documents("a@example.com", meta_filters={"GST Number": "33CCCCC2222C1Z5"})
+        self.assertEqual(documents, [])
+
+
+class TestDashboardFilterLinks(SQLitePoolMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        with db.connection() as con:
+            cur = con.cursor()
+            for name, number in (("inv1", "INV-001"), ("inv2", "INV-002")):
+                cur.execute("INSERT INTO documents (email, file_name, meta) VALUES (%s,%s,%s)",
+                            ("a@example.com", name, json.dumps(invoice_meta(number, "12/03/2024"))))
+            con.commit()
+        session = self.client.session
+        session["email"] = "a@example.com"
+        session.save()
+
+    def test_links_only_filterable_fields(self):
+        response = self.client.get("/dashboard")
+        self.assertContains(response, "?field=Invoice%20Number&value=INV-001")
+        self.assertNotContains(response, "?field=GST%20Number")
+
+    @override_settings(ENTITY_INDEX_KEY=None)
+    def test_rejected_filter_is_reported(self):
+        response = self.client.get("/dashboard", {"field": "GST Number", "value": "27AAAAA0000A1Z5"})
+        self.assertContains(response, "Filter not applied: Filtering on GST Number needs ENTITY_INDEX_KEY")
+        self.assertEqual(len(response.context["documents"]), 2)
+
+    def test_filter_link_narrows_the_list(self):
+        response = self.client.get("/dashboard", {"field": "Invoice Number", "value": "INV-002"})
+        self.assertEqual([doc.file_name for doc in response.context["documents"]], ["inv2"])
+        self.assertEqual(response.context["meta_filters"], {"Invoice Number": "INV-002"})
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from DocumentIntelligence import db
+from DocumentIntelligence.history_writer import HistoryWriter, build_insert
+from tests import SQLitePoolMixin
+
+
+class TestHistoryWriter(SQLitePoolMixin, SimpleTestCase):
+
+    def rows(self):
+        with db.connection() as con:
+            cur = con.cursor()
+            cur.execute("SELECT file_name, operation, meta FROM documents ORDER BY id")
+            return cur.fetchall()
+
+    def test_synchronous_mode_writes_before_returning(self):
+        writer = HistoryWriter(synchronous=True)
+        self.assertTrue(writer.submit("a@example.com", file_name="a.png", operation="ocr", meta={"k": 1}))
+        self.assertEqual(self.rows(), [("a.png", "ocr", json.dumps({"k": 1}))])
+
+    def test_rows_are_batched_into_multi_row_inserts(self):
+        writer = HistoryWriter(batch_size=5, flush_interval=5)
+        with patch.object(writer, "_write", wraps=writer._write) as write:
+            for i in range(10):
+                writer.submit("a@example.com", file_name=f"{i}.png")
+            writer.flush(timeout=5)
+        writer.close()
+
+        self.assertEqual([len(call.args[0]) for call in write.call_args_list], [5, 5])
+        self.assertEqual(len(self.rows()), 10)
+
+    def test_partial_batch_is_written_after_flush_interval(self):
+        writer = HistoryWriter(batch_size=50, flush_interval=0.1)
+        writer.submit("a@example.com", file_name="late.png")
+
+        deadline = time.monotonic() + 2
+        while not self.rows() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        writer.close()
+
+        self.assertEqual(self.rows()[0][0], "late.png")
+
+    def test_failed_batch_is_retried(self):
+        writer = HistoryWriter(synchronous=True, retry_backoff=0)
+        real_write = writer._write
+        attempts = []
+
+        def flaky(rows):
+            attempts.append(len(rows))
+            if len(attempts) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            real_write(rows)
+
+        with patch.object(writer, "_write", side_effect=flaky):
+            self.assertTrue(writer.submit("a@example.com", file_name="retry.png"))
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(len(self.rows()), 1)
+
+    def test_bad_row_is_dropped_alone(self):
+        writer = HistoryWriter(batch_size=3, flush_interval=5, retry_backoff=0)
+        with patch.object(writer, "_write", wraps=writer._write) as write:
+            writer.submit("a@example.com", file_name="first.png")
+            # Not a value the database driver can bind
+            writer.submit("a@example.com", file_name=object())
+            writer.submit("a@example.com", file_name="third.png")
+            writer.flush(timeout=5)
+        writer.close()
+
+        self.assertEqual([len(call.args[0]) for call in write.call_args_list], [3, 1, 1, 1])
+        self.assertEqual([row[0] for row in self.rows()], ["first.png", "third.png"])
+
+    def test_build_insert_has_one_placeholder_group_per_row(self):
+        sql = build_insert(3)
+        self.assertEqual(sql.count("("), 4)
+        self.assertEqual(sql.count("%s"), 33)
+
+    def test_stats_failure_keeps_the_history_rows(self):
+        with db.connection() as con:
+            con.cursor().execute("DROP TABLE document_stats")
+            con.commit()
+
+        writer = HistoryWriter(synchronous=True, max_retries=1)
+        self.assertTrue(writer.submit("a@example.com", file_name="kept.png", operation="ocr"))
+        self.assertEqual(self.rows(), [("kept.png", "ocr", None)])
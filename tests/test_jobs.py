@@ -0,0 +1,220 @@
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from DocumentIntelligence import jobs
+from DocumentIntelligence.action_log import ActionLogger, set_logger
+from DocumentIntelligence.models import Blob, Job
+from DocumentIntelligence.storage import store_upload
+from file_conversions.conversions import PdfWriter
+from tests import png_upload, read_streaming_content
+
+JOB_QUEUE = {
+    'WORKERS': {'ocr': 1, 'classification': 1, 'convert': 1},
+    'POLL_INTERVAL': 0.01,
+    'JOB_TIMEOUT': 30,
+    'HEARTBEAT_INTERVAL': 60,
+    'STALE_AFTER': 60,
+    'MAX_ATTEMPTS': 2,
+    'PROGRESS_INTERVAL': 0.01,
+    'BYTES_PER_PAGE': 100 * 1024,
+    'USER_WEIGHTS': {},
+}
+
+
+def pdf_upload(name="report.pdf", pages=3):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="application/pdf")
+
+
+@override_settings(JOB_QUEUE=JOB_QUEUE)
+class TestJobQueue(TestCase):
+    """Database-backed job queue"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.blob = store_upload(png_upload())
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_a_job_is_claimed_once(self):
+        job = jobs.enqueue("convert", self.blob, "scan.png", target_format="pdf")
+
+        claimed = jobs.claim(["convert"], worker="w1")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, Job.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(jobs.claim(["convert"], worker="w2"))
+
+    def test_workers_only_take_their_job_types(self):
+        jobs.enqueue("ocr", self.blob, "scan.png")
+        self.assertIsNone(jobs.claim(["convert"]))
+        self.assertIsNotNone(jobs.claim(["ocr"]))
+
+    def test_conversion_job_runs_to_completion(self):
+        job = jobs.enqueue("convert", self.blob, "scan.png", target_format="pdf")
+
+        self.assertEqual(jobs.work(["convert"], burst=True), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result["filename"], "scan_converted.pdf")
+        self.assertTrue(job.result["file_url"].endswith(".pdf"))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failure_is_recorded_and_input_released(self):
+        def broken(job, blob, cancel_token):
+            raise RuntimeError("converter crashed")
+
+        job = jobs.enqueue("convert", self.blob, "scan.png", target_format="pdf")
+        self.assertEqual(Blob.objects.get(pk=self.blob.pk).ref_count, 1)
+
+        with patch.dict(jobs.HANDLERS, {"convert": broken}):
+            jobs.work(["convert"], burst=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.error, "converter crashed")
+        self.assertFalse(Blob.objects.filter(pk=self.blob.pk).exists())
+
+    def test_stale_jobs_are_requeued_then_failed(self):
+        job = jobs.enqueue("ocr", self.blob, "scan.png")
+        long_ago = timezone.now() - datetime.timedelta(minutes=10)
+
+        jobs.claim(["ocr"])
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        self.assertEqual(jobs.requeue_stale(), (1, 0))
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.QUEUED)
+
+        jobs.claim(["ocr"])
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        self.assertEqual(jobs.requeue_stale(), (0, 1))
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+
+
+@override_settings(JOB_QUEUE=JOB_QUEUE)
+class TestFairQueueing(TestCase):
+    """Weighted fair queueing per submitter"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.blob = store_upload(png_upload())
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def enqueue(self, email, cost):
+        return jobs.enqueue("convert", self.blob, "scan.png", email=email, cost=cost, target_format="pdf")
+
+    def test_small_job_overtakes_another_users_backlog(self):
+        backlog = [self.enqueue("batch@example.com", 100) for _ in range(3)]
+        small = self.enqueue("user@example.com", 1)
+
+        claimed = [jobs.claim(["convert"]).pk for _ in range(4)]
+        self.assertEqual(claimed, [small.pk] + [job.pk for job in backlog])
+
+    def test_big_job_keeps_making_progress(self):
+        big = self.enqueue("batch@example.com", 20)
+        for i in range(40):
+            self.enqueue("user@example.com", 1)
+            if jobs.claim(["convert"]).pk == big.pk:
+                break
+        self.assertLessEqual(i, 21)
+
+    def test_weights_scale_the_share(self):
+        with override_settings(JOB_QUEUE={**JOB_QUEUE, 'USER_WEIGHTS': {'ops@example.com': 4}}):
+            heavy = self.enqueue("ops@example.com", 8)
+        light = self.enqueue("user@example.com", 3)
+        self.assertLess(heavy.finish_tag, light.finish_tag)
+
+    def test_pdf_cost_is_its_page_count(self):
+        blob = store_upload(pdf_upload())
+
+        self.assertEqual(jobs.estimate_cost(blob, "report.pdf"), 3)
+        self.assertEqual(jobs.estimate_cost(self.blob, "scan.png"), 1)
+
+
+@override_settings(JOB_QUEUE=JOB_QUEUE)
+class TestJobEndpoints(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        # Enqueueing logs the action; write it inside the test transaction
+        self.previous_logger = set_logger(ActionLogger(synchronous=True))
+
+    def tearDown(self):
+        set_logger(self.previous_logger)
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def login(self, email):
+        session = self.client.session
+        session['email'] = email
+        session.save()
+
+    def test_enqueue_returns_job_id_and_status_url(self):
+        response = self.client.post("/jobs/convert/", {"file": png_upload(), "target_format": "pdf"})
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data["status"], Job.QUEUED)
+        self.assertEqual(self.client.get(data["status_url"]).json()["id"], data["id"])
+
+    def test_rejects_unknown_type_and_format(self):
+        self.assertEqual(self.client.post("/jobs/translate/", {"file": png_upload()}).status_code, 404)
+        self.assertEqual(
+            self.client.post("/jobs/convert/", {"file": png_upload(), "target_format": "gif"}).status_code, 400)
+
+    def test_conversion_progress_and_event_stream(self):
+        def fake_pdf_to_jpg(input_path, output_folder, cancel_token, progress):
+            pages = []
+            for page in (1, 2):
+                path = os.path.join(output_folder, f"page_{page}.jpg")
+                Image.new("RGB", (10, 10), "white").save(path, "JPEG")
+                pages.append(path)
+                progress(page, 2, path)
+            return pages
+
+        data = self.client.post("/jobs/convert/", {"file": pdf_upload(), "target_format": "jpg"}).json()
+        with patch("DocumentIntelligence.processing.pdf_to_jpg", side_effect=fake_pdf_to_jpg):
+            jobs.work(["convert"], burst=True)
+
+        progress = Job.objects.get(pk=data["id"]).progress
+        self.assertEqual((progress["page"], progress["pages"]), (2, 2))
+        self.assertEqual(len(progress["outputs"]), 2)
+        self.assertTrue(progress["outputs"][0].endswith("_page_1.jpg"))
+
+        response = self.client.get(data["events_url"])
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = read_streaming_content(response).decode()
+        events = [line.split(": ", 1)[1] for line in stream.splitlines() if line.startswith("event: ")]
+        self.assertEqual(events, ["status", "progress", "done"])
+
+    def test_other_users_cannot_read_a_job(self):
+        self.login("a@example.com")
+        status_url = self.client.post("/jobs/ocr/", {"image": png_upload()}).json()["status_url"]
+        self.assertEqual(self.client.get(status_url).status_code, 200)
+
+        self.login("b@example.com")
+        self.assertEqual(self.client.get(status_url).status_code, 404)
@@ -0,0 +1,240 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+import requests
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from grammar_correction.language_tool import (
+    LanguageToolClient,
+    CircuitBreaker,
+    CircuitOpenError,
+    apply_corrections,
+    split_paragraphs,
+)
+
+
+class StubLanguageToolHandler(BaseHTTPRequestHandler):
+    """Minimal LanguageTool API: flags every 'teh' and can be made slow or failing"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        text = parse_qs(self.rfile.read(length).decode())['text'][0]
+        self.server.checked.append(text)
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.server.fail:
+            return self._send(500, {'error': 'boom'})
+        if self.server.reject:
+            return self._send(413, {'error': 'text too long'})
+
+        matches = []
+        start = text.find('teh')
+        while start != -1:
+            matches.append({'offset': start, 'length': 3, 'replacements': [{'value': 'the'}]})
+            start = text.find('teh', start + 3)
+        self._send(200, {'matches': matches})
+
+    def do_GET(self):
+        if self.server.fail:
+            return self._send(500, {'error': 'boom'})
+        self._send(200, [{'name': 'English (US)', 'code': 'en', 'longCode': 'en-US'}])
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LanguageToolStubTestCase(SimpleTestCase):
+    """Runs a local stub LanguageTool server for each test"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubLanguageToolHandler)
+        self.server.checked = []
+        self.server.delay = 0
+        self.server.fail = False
+        self.server.reject = False
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.client = LanguageToolClient(
+            f'http://127.0.0.1:{self.server.server_port}',
+            timeout=2,
+            cache=LocMemCache('languagetool-tests', {}),
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestParagraphHelpers(SimpleTestCase):
+
+    def test_split_paragraphs_round_trips(self):
+        text = "Header line\n\nBody one\nBody two\n \n\nFooter\n"
+        self.assertEqual("".join(split_paragraphs(text)), text)
+        self.assertEqual(split_paragraphs(text)[::2], ['Header line', 'Body one\nBody two', 'Footer\n'])
+
+    def test_apply_corrections_uses_offsets_from_original_text(self):
+        matches = [
+            {'offset': 0, 'length': 3, 'replacements': [{'value': 'The'}]},
+            {'offset': 8, 'length': 3, 'replacements': [{'value': 'the'}]},
+            {'offset': 12, 'length': 3, 'replacements': []},
+        ]
+        self.assertEqual(apply_corrections("Teh cat teh dog", matches), "The cat the dog")
+
+
+class TestLanguageToolClient(LanguageToolStubTestCase):
+
+    def test_corrects_each_paragraph(self):
+        corrected, count = self.client.correct("teh header\n\nsee teh footer")
+        self.assertEqual(corrected, "the header\n\nsee the footer")
+        self.assertEqual(count, 2)
+        self.assertEqual(sorted(self.server.checked), ['see teh footer', 'teh header'])
+
+    def test_cached_paragraphs_are_not_sent_again(self):
+        self.client.correct("teh boilerplate\n\nfirst body")
+        self.server.checked.clear()
+
+        corrected, _ = self.client.correct("teh boilerplate\n\nsecond body")
+
+        self.assertEqual(corrected, "the boilerplate\n\nsecond body")
+        self.assertEqual(self.server.checked, ['second body'])
+
+    def test_slow_server_is_cut_off_at_the_deadline(self):
+        self.server.delay = 1
+
+        started = time.monotonic()
+        corrected, count = self.client.correct("teh text", budget=0.2)
+
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual(corrected, "teh text")
+        self.assertEqual(count, 0)
+
+    def test_failures_open_the_circuit(self):
+        self.server.fail = True
+        self.client.correct("one")
+        self.client.correct("two")
+        self.assertFalse(self.client.available)
+
+        self.server.checked.clear()
+        with self.assertRaises(CircuitOpenError):
+            self.client.correct("three")
+        self.assertEqual(self.server.checked, [])
+
+    def test_expired_deadline_does_not_take_the_half_open_trial(self):
+        self.client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.client.breaker.trip()
+
+        with self.assertRaises(TimeoutError):
+            self.client.check("teh text", deadline=time.monotonic() - 1)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.client.check("teh text")[0]['offset'], 0)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_rejected_request_resolves_the_half_open_trial(self):
+        self.client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.client.breaker.trip()
+        self.server.reject = True
+
+        with self.assertRaises(requests.HTTPError):
+            self.client.check("far too long")
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_health_probe_closes_the_circuit_after_recovery(self):
+        self.client.breaker.trip()
+        self.assertTrue(self.client.probe())
+        self.assertTrue(self.client.available)
+
+    def test_health_probe_trips_the_circuit_when_server_is_down(self):
+        self.server.fail = True
+        self.assertFalse(self.client.probe())
+        self.assertFalse(self.client.available)
+
+    def test_background_probe_runs_until_stopped(self):
+        self.client.breaker.trip()
+        self.client.start_health_probe(interval=0.05)
+        deadline = time.monotonic() + 2
+        while not self.client.available and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.client.stop_health_probe()
+        self.assertTrue(self.client.available)
+
+
+class TestCircuitBreaker(SimpleTestCase):
+
+    def test_half_open_after_reset_timeout_allows_one_trial(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow_request())
+
+        now[0] = 10.0
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+
+    def test_success_closes_the_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_opens_only_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+    def test_open_circuit_stays_open_until_reset_timeout(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.trip()
+
+        now[0] = 9.9
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow_request())
+
+        now[0] = 10.0
+        self.assertFalse(breaker.is_open())
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_failed_trial_restarts_the_reset_timeout(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.trip()
+        now[0] = 10.0
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record_failure()
+        now[0] = 15.0
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow_request())
+        now[0] = 20.0
+        self.assertTrue(breaker.allow_request())
@@ -0,0 +1,120 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from DocumentIntelligence import governor, pipeline
+from DocumentIntelligence.pipeline import LatencyBudget, extractive_summary, summarize_within_budget
+
+LONG_TEXT = (
+    "The invoice covers consulting services delivered in March. "
+    "Payment of the invoice is due within thirty days of the invoice date. "
+    "The weather in March was unusually mild for the season. "
+    "Late invoice payments incur a fee of two percent per month. "
+    "Our office plants were watered every morning by the team."
+)
+
+
+class TestLatencyBudget(SimpleTestCase):
+
+    def setUp(self):
+        estimates = patch.dict(pipeline._stage_estimates, {"grammar": 2.0, "summary": 5.0}, clear=True)
+        estimates.start()
+        self.addCleanup(estimates.stop)
+
+    def test_unlimited_budget_affords_every_stage(self):
+        budget = LatencyBudget()
+        self.assertEqual(budget.remaining(), float("inf"))
+        self.assertIsNone(budget.deadline)
+        self.assertTrue(budget.can_afford("summary"))
+
+    def test_exhausted_budget_affords_only_free_stages(self):
+        budget = LatencyBudget(0)
+        self.assertEqual(budget.remaining(), 0.0)
+        self.assertFalse(budget.can_afford("grammar"))
+        self.assertTrue(budget.can_afford("never_timed"))
+
+    def test_reserve_is_kept_back(self):
+        budget = LatencyBudget(6)
+        self.assertTrue(budget.can_afford("summary"))
+        self.assertFalse(budget.can_afford("summary", reserve=2.0))
+
+    def test_run_folds_duration_into_the_estimate(self):
+        budget = LatencyBudget()
+        self.assertEqual(budget.run("grammar", lambda text: text.upper(), "ok"), "OK")
+        # EWMA: 0.8 * 2.0 plus a near-zero observation
+        self.assertAlmostEqual(LatencyBudget.estimate("grammar"), 1.6, places=2)
+
+    def test_skipped_grammar_is_recorded(self):
+        budget = LatencyBudget(0)
+        with patch.object(pipeline, "tool", object()):
+            self.assertEqual(pipeline.correct_grammar("teh text", budget), "teh text")
+        self.assertEqual(budget.skipped_stages, [{"stage": "grammar", "action": "skipped"}])
+
+
+class TestSummaryFallback(SimpleTestCase):
+
+    def setUp(self):
+        estimates = patch.dict(pipeline._stage_estimates, {"summary": 5.0}, clear=True)
+        estimates.start()
+        self.addCleanup(estimates.stop)
+
+    def test_summary_downgraded_when_it_does_not_fit(self):
+        budget = LatencyBudget(1)
+        with patch.object(pipeline, "summarize_text") as summarize:
+            summary = summarize_within_budget(LONG_TEXT, budget, max_length=150, min_length=50)
+
+        summarize.assert_not_called()
+        self.assertEqual(summary, extractive_summary(LONG_TEXT))
+        self.assertEqual(budget.skipped_stages, [{"stage": "summary", "action": "downgraded"}])
+
+    def test_summary_downgraded_when_summarizer_is_busy(self):
+        budget = LatencyBudget()
+        busy = governor.Overloaded("summarizer", 1, "queue full")
+        with patch.object(pipeline, "summarize_text", side_effect=busy):
+            summary = summarize_within_budget(LONG_TEXT, budget, max_length=150, min_length=50)
+
+        self.assertEqual(summary, extractive_summary(LONG_TEXT))
+        self.assertEqual(budget.skipped_stages[0]["action"], "downgraded (summarizer busy)")
+
+    def test_summary_runs_when_it_fits(self):
+        budget = LatencyBudget(60)
+        with patch.object(pipeline, "summarize_text", return_value="abstract") as summarize:
+            summary = summarize_within_budget(LONG_TEXT, budget, max_length=150, min_length=50)
+
+        self.assertEqual(summary, "abstract")
+        summarize.assert_called_once_with(LONG_TEXT, max_length=150, min_length=50)
+        self.assertEqual(budget.skipped_stages, [])
+
+
+class TestLazyModels(SimpleTestCase):
+
+    def test_skipped_stages_load_nothing(self):
+        budget = LatencyBudget(0)
+        with patch.object(pipeline, "summarizer", pipeline._NOT_LOADED), \
+                patch.object(pipeline, "tool", pipeline._NOT_LOADED), \
+                patch.object(pipeline, "_load_summarizer") as load_summarizer, \
+                patch.object(pipeline, "_start_language_tool") as start_language_tool:
+            pipeline.correct_grammar(LONG_TEXT, budget)
+            summarize_within_budget(LONG_TEXT, budget, max_length=150, min_length=50)
+
+        load_summarizer.assert_not_called()
+        start_language_tool.assert_not_called()
+
+    def test_summarizer_is_loaded_once(self):
+        with patch.object(pipeline, "summarizer", pipeline._NOT_LOADED), \
+                patch.object(pipeline, "_load_summarizer", return_value=None) as load_summarizer:
+            self.assertIsNone(pipeline.get_summarizer())
+            self.assertIsNone(pipeline.get_summarizer())
+
+        load_summarizer.assert_called_once_with()
+
+
+class TestExtractiveSummary(SimpleTestCase):
+
+    def test_short_text_is_returned_unchanged(self):
+        self.assertEqual(extractive_summary("Too short."), "Too short.")
+
+    def test_keeps_the_best_sentences_in_order(self):
+        summary = extractive_summary(LONG_TEXT, max_sentences=2)
+        self.assertEqual(summary, "The invoice covers consulting services delivered in March. "
+                                  "Payment of the invoice is due within thirty days of the invoice date.")
@@ -1,9 +1,29 @@
+import functools
+from contextlib import contextmanager
+
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from django.test import TestCase, RequestFactory
 from django.template.response import TemplateResponse
 
 
+def patch_db(test):
+    """Patch the pooled connection used by the views; the test receives (mock_con, mock_cur)"""
+    @functools.wraps(test)
+    def wrapper(self, *args, **kwargs):
+        mock_con = MagicMock()
+        mock_cur = MagicMock()
+        mock_con.cursor.return_value = mock_cur
+
+        @contextmanager
+        def connection():
+            yield mock_con
+
+        with patch('DocumentIntelligence.views.db.connection', connection):
+            return test(self, mock_con, mock_cur, *args, **kwargs)
+    return wrapper
+
+
 class TestRegisterView(TestCase):
     """Test suite for the register view function"""
     
@@ -16,8 +36,7 @@ class TestRegisterView(TestCase):
             'password': 'securepassword123'
         }
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_get_request_returns_registration_form(self, mock_con, mock_cur):
         """Test that GET request returns the registration form template"""
         from DocumentIntelligence.views import register
@@ -32,8 +51,7 @@ class TestRegisterView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'register.html')
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_post_with_valid_credentials_registers_user(self, mock_con, mock_cur):
         """Test that POST with valid credentials successfully registers user"""
         from DocumentIntelligence.views import register
@@ -63,8 +81,7 @@ class TestRegisterView(TestCase):
         self.assertTemplateUsed(response, 'register.html')
         self.assertIn('Registration Successful', str(response.content))
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_post_with_missing_name_field(self, mock_con, mock_cur):
         """Test that POST with missing name field still processes request"""
         from DocumentIntelligence.views import register
@@ -92,8 +109,7 @@ class TestRegisterView(TestCase):
         # Verify the template is still rendered
         self.assertEqual(response.status_code, 200)
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_post_with_missing_email_field(self, mock_con, mock_cur):
         """Test that POST with missing email field still processes request"""
         from DocumentIntelligence.views import register
@@ -121,8 +137,7 @@ class TestRegisterView(TestCase):
         # Verify the template is still rendered
         self.assertEqual(response.status_code, 200)
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_post_with_missing_password_field(self, mock_con, mock_cur):
         """Test that POST with missing password field still processes request"""
         from DocumentIntelligence.views import register
@@ -150,8 +165,7 @@ class TestRegisterView(TestCase):
         # Verify the template is still rendered
         self.assertEqual(response.status_code, 200)
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_database_commit_fails(self, mock_con, mock_cur):
         """Test that database commit failure is handled"""
         from DocumentIntelligence.views import register
@@ -171,8 +185,7 @@ class TestRegisterView(TestCase):
         
         self.assertIn("Database connection error", str(context.exception))
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_database_insert_fails(self, mock_con, mock_cur):
         """Test that database insert failure is handled"""
         from DocumentIntelligence.views import register
@@ -198,8 +211,7 @@ class TestRegisterViewResponseData(TestCase):
         """Set up test fixtures"""
         self.factory = RequestFactory()
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_registration_success_returns_correct_message(self, mock_con, mock_cur):
         """Test that successful registration returns the correct success message"""
         from DocumentIntelligence.views import register
@@ -218,8 +230,7 @@ class TestRegisterViewResponseData(TestCase):
         # Check for success message in response
         self.assertIn(b'Registration Successful', response.content)
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_get_request_response_context_is_empty(self, mock_con, mock_cur):
         """Test that GET request returns register template without msg context"""
         from DocumentIntelligence.views import register
@@ -242,8 +253,7 @@ class TestRegisterViewEdgeCases(TestCase):
         """Set up test fixtures"""
         self.factory = RequestFactory()
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_post_with_empty_string_values(self, mock_con, mock_cur):
         """Test POST request with empty string values"""
         from DocumentIntelligence.views import register
@@ -270,8 +280,7 @@ class TestRegisterViewEdgeCases(TestCase):
         self.assertEqual(params[1], '')
         self.assertEqual(params[2], '')
     
-    @patch('DocumentIntelligence.views.cur')
-    @patch('DocumentIntelligence.views.con')
+    @patch_db
     def test_post_with_special_characters(self, mock_con, mock_cur):
         """Test POST request with special characters in input"""
         from DocumentIntelligence.views import register
@@ -0,0 +1,51 @@
+from django.test import SimpleTestCase
+
+from DocumentIntelligence.history_writer import HistoryWriter
+from DocumentIntelligence.search import fts5_query, search_documents
+from tests import SQLitePoolMixin
+
+
+class TestSearchDocuments(SQLitePoolMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.writer = HistoryWriter(synchronous=True)
+
+        self.writer.submit("a@example.com", file_name="march_invoice.png", document_type="Invoice",
+                           extracted_text="Tax invoice GSTIN total amount payable", summarized_text="Invoice for March")
+        self.writer.submit("a@example.com", file_name="scan.png", document_type="PAN Card",
+                           extracted_text="Income tax department permanent account number, attached to invoice")
+        self.writer.submit("b@example.com", file_name="other_invoice.png", document_type="Invoice",
+                           extracted_text="Tax invoice for someone else")
+
+    def names(self, *args, **kwargs):
+        results, _ = search_documents(*args, **kwargs)
+        return [doc.file_name for doc in results]
+
+    def test_rows_are_searchable_as_soon_as_they_are_saved(self):
+        self.assertEqual(self.names("a@example.com", "permanent account"), ["scan.png"])
+
+    def test_results_are_limited_to_the_owner(self):
+        self.assertEqual(self.names("b@example.com", "invoice"), ["other_invoice.png"])
+
+    def test_file_name_and_summary_matches_rank_first(self):
+        self.assertEqual(self.names("a@example.com", "invoice"), ["march_invoice.png", "scan.png"])
+
+    def test_document_type_filter(self):
+        self.assertEqual(self.names("a@example.com", "tax", document_type="PAN Card"), ["scan.png"])
+
+    def test_pagination(self):
+        first, has_more = search_documents("a@example.com", "tax", limit=1)
+        second, has_more_after = search_documents("a@example.com", "tax", page=2, limit=1)
+        self.assertTrue(has_more)
+        self.assertFalse(has_more_after)
+        self.assertNotEqual(first[0].id, second[0].id)
+
+    def test_snippet_highlights_matches(self):
+        results, _ = search_documents("a@example.com", "permanent")
+        self.assertIn("«permanent»", results[0].snippet.lower())
+
+    def test_user_input_cannot_break_the_fts_query(self):
+        self.assertEqual(fts5_query('tax" OR (x'), '"tax" "OR" "x"*')
+        self.assertEqual(self.names("a@example.com", '"; DROP'), [])
+        self.assertEqual(self.names("a@example.com", "***"), [])
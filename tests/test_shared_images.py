@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from DocumentIntelligence import shared_images
+from DocumentIntelligence.shared_images import free, release, share_image
+
+
+class TestSharedImages(SimpleTestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "scan.png")
+        self.pixels = np.random.default_rng(0).integers(0, 255, (30, 40, 3), dtype=np.uint8)
+        cv2.imwrite(self.path, self.pixels)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_worker_maps_the_same_pixels(self):
+        block, shared = share_image(self.path)
+        try:
+            worker_block, image = shared.attach()
+            np.testing.assert_array_equal(image, self.pixels)
+            del image
+            release(worker_block)
+        finally:
+            free(block)
+
+        # The block is gone once the owner frees it
+        with self.assertRaises(FileNotFoundError):
+            shared.attach()
+
+    def test_falls_back_to_the_path(self):
+        broken = os.path.join(self.folder, "broken.png")
+        with open(broken, "wb") as f:
+            f.write(b"broken")
+        self.assertEqual(share_image(broken), (None, None))
+
+        # Not enough room in /dev/shm: never write into a block that could SIGBUS
+        with patch.object(shared_images, "_fits", return_value=False):
+            self.assertEqual(share_image(self.path), (None, None))
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from DocumentIntelligence.history_writer import HistoryWriter
+from DocumentIntelligence.stats import get_document_stats, rebuild_document_stats
+from tests import SQLitePoolMixin
+
+
+class TestDocumentStats(SQLitePoolMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.writer = HistoryWriter(synchronous=True)
+
+    def test_counters_follow_saved_documents(self):
+        self.writer.submit("a@example.com", document_type="Invoice", operation="ocr")
+        self.writer.submit("a@example.com", document_type="Invoice", operation="classification")
+        self.writer.submit("a@example.com", document_type="PAN Card", operation="classification")
+        self.writer.submit("b@example.com", document_type="Invoice", operation="ocr")
+
+        stats = get_document_stats("a@example.com")
+
+        self.assertEqual(stats["total"], 3)
+        self.assertEqual(stats["by_type"], {"Invoice": 2, "PAN Card": 1})
+        self.assertEqual(list(stats["by_operation"]), ["classification", "ocr"])
+        self.assertEqual(sum(count for _, count in stats["by_day"]), 3)
+
+    def test_batched_rows_are_counted_once(self):
+        writer = HistoryWriter(batch_size=10, flush_interval=0.05)
+        for _ in range(4):
+            writer.submit("a@example.com", document_type="Voter ID", operation="ocr")
+        writer.close()
+
+        self.assertEqual(get_document_stats("a@example.com")["by_type"], {"Voter ID": 4})
+
+    def test_old_days_fall_out_of_the_window(self):
+        with patch("DocumentIntelligence.history_writer.today", return_value="2020-01-01"):
+            self.writer.submit("a@example.com", operation="ocr")
+        self.writer.submit("a@example.com", operation="ocr")
+
+        stats = get_document_stats("a@example.com", days=7)
+
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(len(stats["by_day"]), 1)
+
+    def test_rebuild_matches_incremental_counters(self):
+        self.writer.submit("a@example.com", document_type="Invoice", operation="ocr")
+        self.writer.submit("a@example.com", operation="convert")
+        before = get_document_stats("a@example.com")
+
+        rebuild_document_stats()
+
+        self.assertEqual(get_document_stats("a@example.com"), before)
+
+    def test_user_without_history(self):
+        self.assertEqual(get_document_stats("nobody@example.com")["total"], 0)
@@ -0,0 +1,133 @@
+import datetime
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from DocumentIntelligence.models import Blob, DocumentFile
+from DocumentIntelligence.processing import save_conversion
+from DocumentIntelligence.storage import (
+    acquire_blob,
+    blob_path,
+    get_cached_result,
+    release_blob,
+    save_cached_result,
+    store_upload,
+    sweep_unreferenced_blobs,
+)
+
+
+class TestContentAddressedStorage(TestCase):
+    """Deduplicated uploads, reference counting and result reuse"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.user = get_user_model().objects.create_user("owner", password="pw")
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_same_content_is_stored_once(self):
+        first = store_upload(SimpleUploadedFile("scan.png", b"same bytes"))
+        second = store_upload(SimpleUploadedFile("copy of scan.PNG", b"same bytes"))
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Blob.objects.count(), 1)
+        self.assertTrue(first.name.endswith(".png"))
+        with open(blob_path(first), "rb") as f:
+            self.assertEqual(f.read(), b"same bytes")
+        # No temp files are left behind
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "blobs", "tmp")), [])
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        blob = store_upload(SimpleUploadedFile("scan.png", b"content"))
+        a = DocumentFile.objects.create(owner=self.user, name="a.png", blob=blob)
+        b = DocumentFile.objects.create(owner=self.user, name="b.png", blob=blob)
+        self.assertEqual(Blob.objects.get(pk=blob.pk).ref_count, 2)
+        self.assertEqual(a.file.name, blob.name)
+
+        a.delete()
+        self.assertTrue(os.path.exists(blob_path(blob)))
+
+        b.delete()
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(blob_path(blob)))
+
+    def test_history_reference_keeps_blob_alive(self):
+        blob = store_upload(SimpleUploadedFile("scan.png", b"content"))
+        acquire_blob(blob.digest)
+        document = DocumentFile.objects.create(owner=self.user, name="a.png", blob=blob)
+
+        document.delete()
+        self.assertTrue(Blob.objects.filter(pk=blob.pk).exists())
+
+        release_blob(blob.digest)
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+
+    def test_results_are_reused_per_operation(self):
+        blob = store_upload(SimpleUploadedFile("scan.png", b"content"))
+        self.assertIsNone(get_cached_result(blob, "ocr"))
+
+        save_cached_result(blob, "ocr", {"corrected_text": "hello"})
+        again = store_upload(SimpleUploadedFile("other.png", b"content"))
+
+        self.assertEqual(get_cached_result(again, "ocr"), {"corrected_text": "hello"})
+        self.assertIsNone(get_cached_result(again, "classification"))
+
+    def test_acquire_after_delete_is_reported(self):
+        blob = store_upload(SimpleUploadedFile("scan.png", b"content"))
+        release_blob(blob.digest)
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(acquire_blob(blob.digest))
+
+    def test_sweep_deletes_old_unreferenced_blobs_only(self):
+        anonymous = store_upload(SimpleUploadedFile("anon.png", b"anonymous"))
+        recent = store_upload(SimpleUploadedFile("recent.png", b"recent"))
+        referenced = store_upload(SimpleUploadedFile("kept.png", b"kept"))
+        acquire_blob(referenced.digest)
+        owned = store_upload(SimpleUploadedFile("owned.png", b"owned"))
+        DocumentFile.objects.create(owner=self.user, name="owned.png", blob=owned)
+        # A derived output next to the blob goes with it
+        derived = os.path.join(os.path.dirname(blob_path(anonymous)), f"{anonymous.digest}_redacted.jpg")
+        open(derived, "wb").close()
+
+        old = timezone.now() - datetime.timedelta(hours=25)
+        Blob.objects.exclude(pk=recent.pk).update(created_at=old)
+
+        self.assertEqual(sweep_unreferenced_blobs(grace_hours=24), 1)
+        self.assertEqual(set(Blob.objects.values_list("pk", flat=True)), {recent.pk, referenced.pk, owned.pk})
+        self.assertFalse(os.path.exists(blob_path(anonymous)))
+        self.assertFalse(os.path.exists(derived))
+
+    def test_swept_conversion_input_releases_its_output(self):
+        source = store_upload(SimpleUploadedFile("anon.png", b"anonymous"))
+        output_path = os.path.join(self.media_root, "anon.pdf")
+        with open(output_path, "wb") as f:
+            f.write(b"%PDF converted")
+        output, _ = save_conversion(source, "pdf", None, output_path)
+        self.assertEqual(Blob.objects.get(pk=output.pk).ref_count, 1)
+
+        Blob.objects.filter(pk=source.pk).update(created_at=timezone.now() - datetime.timedelta(days=2))
+        sweep_unreferenced_blobs(grace_hours=24)
+
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(blob_path(output)))
+
+    def test_sweep_command(self):
+        blob = store_upload(SimpleUploadedFile("anon.png", b"anonymous"))
+        Blob.objects.filter(pk=blob.pk).update(created_at=timezone.now() - datetime.timedelta(days=2))
+
+        out = StringIO()
+        call_command("sweep_blobs", "--grace-hours", "24", stdout=out)
+
+        self.assertIn("Deleted 1 unreferenced blobs", out.getvalue())
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
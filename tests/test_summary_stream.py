@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase
+
+from DocumentIntelligence import pipeline
+from DocumentIntelligence.sse import format_event, iterate_in_thread
+from DocumentIntelligence.views import PENDING_SUMMARY_TTL
+from tests import read_streaming_content
+
+LONG_TEXT = "Invoice for the consulting services delivered in March. " * 4
+
+
+class TestSummaryStreamHelpers(SimpleTestCase):
+
+    def test_format_event(self):
+        self.assertEqual(format_event({"token": " the"}), 'data: {"token": " the"}\n\n')
+        self.assertEqual(format_event({"summary": "ok"}, event="done"), 'event: done\ndata: {"summary": "ok"}\n\n')
+
+    def test_closing_the_stream_closes_the_producer(self):
+        closed = threading.Event()
+
+        def producer():
+            try:
+                yield "a"
+                yield "b"
+            finally:
+                closed.set()
+
+        async def first_then_close():
+            stream = iterate_in_thread(producer())
+            first = await stream.__anext__()
+            await stream.aclose()
+            return first
+
+        self.assertEqual(async_to_sync(first_then_close)(), "a")
+        self.assertTrue(closed.is_set())
+
+    def test_disconnect_mid_step_lets_the_step_finish_then_closes(self):
+        closed = threading.Event()
+
+        def producer():
+            try:
+                time.sleep(0.2)
+                yield "slow"
+            finally:
+                closed.set()
+
+        async def cancel_mid_step():
+            task = asyncio.ensure_future(iterate_in_thread(producer()).__anext__())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        async_to_sync(cancel_mid_step)()
+        self.assertTrue(closed.is_set())
+
+    def test_stream_falls_back_to_the_text(self):
+        with patch.object(pipeline, "summarizer", None):
+            self.assertEqual(list(pipeline.summarize_text_stream(LONG_TEXT)), [LONG_TEXT])
+        # Too short to summarize, even with a model
+        self.assertEqual(list(pipeline.summarize_text_stream("short")), ["short"])
+
+
+class TestSummaryStreamEndpoint(TestCase):
+
+    def pend(self, summaries):
+        session = self.client.session
+        session["pending_summaries"] = summaries
+        session.save()
+
+    def stream(self, summary_id):
+        response = self.client.get("/ocr/summary-stream/", {"id": summary_id})
+        if response.status_code != 200:
+            return response, []
+        body = read_streaming_content(response).decode()
+        return response, [chunk for chunk in body.split("\n\n") if chunk]
+
+    def entry(self, file_name):
+        return {"email": "a@example.com", "file_name": file_name, "operation": "ocr"}
+
+    @patch("DocumentIntelligence.views.save_document_entry")
+    @patch("DocumentIntelligence.views.summarize_text_stream", side_effect=lambda text, **kwargs: iter(["Sum", "mary"]))
+    def test_each_upload_streams_its_own_text(self, summarize, save):
+        now = time.time()
+        self.pend({
+            "first": {"entry": self.entry("a.png"), "text": "text of a", "blob": "a" * 64, "created": now},
+            "second": {"entry": self.entry("b.png"), "text": "text of b", "blob": "b" * 64, "created": now},
+        })
+
+        response, events = self.stream("second")
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(events, ['data: {"token": "Sum"}', 'data: {"token": "mary"}',
+                                  'event: done\ndata: {"summary": "Summary"}'])
+        summarize.assert_called_once_with("text of b", max_length=150, min_length=50)
+        save.assert_called_once()
+        self.assertEqual((save.call_args.kwargs["file_name"], save.call_args.kwargs["extracted_text"]),
+                         ("b.png", "text of b"))
+        # Delivered once; the other upload is still pending
+        self.assertEqual(self.stream("second")[0].status_code, 204)
+        self.assertEqual(list(self.client.session["pending_summaries"]), ["first"])
+
+    @patch("DocumentIntelligence.views.release_blob")
+    def test_expired_entries_release_their_blob(self, release_blob):
+        self.pend({"old": {"entry": self.entry("a.png"), "text": "text", "blob": "a" * 64,
+                           "created": time.time() - PENDING_SUMMARY_TTL - 1}})
+
+        self.assertEqual(self.stream("old")[0].status_code, 204)
+        release_blob.assert_called_once_with("a" * 64)
+        self.assertEqual(self.client.session["pending_summaries"], {})